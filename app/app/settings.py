@@ -197,10 +197,83 @@ EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Sistema Escolar <noreply@example.com>')
 
+# Cache partilhada (ex: CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Financeiro
+FINANCEIRO_RESUMO_CACHE_TIMEOUT = int(os.environ.get('FINANCEIRO_RESUMO_CACHE_TIMEOUT', '300'))
+FINANCEIRO_DIA_VENCIMENTO = int(os.environ.get('FINANCEIRO_DIA_VENCIMENTO', '10'))
+FINANCEIRO_DIA_LIMITE = int(os.environ.get('FINANCEIRO_DIA_LIMITE', '15'))
+FINANCEIRO_RECIBO_CABECALHO = os.environ.get('FINANCEIRO_RECIBO_CABECALHO', 'Transporte Escolar')
+FINANCEIRO_RECIBO_FONTE = os.environ.get('FINANCEIRO_RECIBO_FONTE', '')  # caminho de um .ttf (opcional)
+FINANCEIRO_RECIBO_LOGO = os.environ.get('FINANCEIRO_RECIBO_LOGO', '')  # caminho de uma imagem (opcional)
+FINANCEIRO_RECIBOS_PROCESSOS = int(os.environ.get('FINANCEIRO_RECIBOS_PROCESSOS', '0'))  # 0 = numero de CPUs
+FINANCEIRO_RECIBOS_PARTE = int(os.environ.get('FINANCEIRO_RECIBOS_PARTE', '200'))  # recibos por task nos lotes do celery
+FINANCEIRO_EMAILS_POR_SEGUNDO = float(os.environ.get('FINANCEIRO_EMAILS_POR_SEGUNDO', '10'))  # 0 = sem limite
+FINANCEIRO_CONCILIACAO_DIAS = int(os.environ.get('FINANCEIRO_CONCILIACAO_DIAS', '45'))  # distancia maxima ao vencimento
+FINANCEIRO_CALLBACK_TOKEN = os.environ.get('FINANCEIRO_CALLBACK_TOKEN', '')  # X-Callback-Token dos fornecedores
+FINANCEIRO_ALERTA_JANELA_HORAS = int(os.environ.get('FINANCEIRO_ALERTA_JANELA_HORAS', '20'))  # 1 resumo de atraso por encarregado; < periodo do beat (24h)
+FINANCEIRO_PARTICOES_MESES_FUTUROS = int(os.environ.get('FINANCEIRO_PARTICOES_MESES_FUTUROS', '3'))  # particoes criadas com antecedencia
+FINANCEIRO_PARTICOES_RETER_MESES = int(os.environ.get('FINANCEIRO_PARTICOES_RETER_MESES', '0'))  # 0 = nunca desanexar; so alertas
+FINANCEIRO_ALERTAS_RETER_MESES = int(os.environ.get('FINANCEIRO_ALERTAS_RETER_MESES', '12'))  # alertas mais antigos sao arquivados
+FINANCEIRO_DESPACHO_ASSINCRONO = os.environ.get('FINANCEIRO_DESPACHO_ASSINCRONO', 'False') == 'True'  # alertas enviados pelo despachar_alertas
+FINANCEIRO_DESPACHO_CONCORRENCIA = int(os.environ.get('FINANCEIRO_DESPACHO_CONCORRENCIA', '100'))  # envios (ligacoes SMTP) em simultaneo
+FINANCEIRO_DESPACHO_POR_DOMINIO = float(os.environ.get('FINANCEIRO_DESPACHO_POR_DOMINIO', '20'))  # emails/s por dominio, 0 = sem limite
+FINANCEIRO_DESPACHO_RESERVA_MINUTOS = int(os.environ.get('FINANCEIRO_DESPACHO_RESERVA_MINUTOS', '30'))  # alertas A ENVIAR voltam a PENDENTE
+
 # Celery
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')
-CELERY_BEAT_SCHEDULE = {}
+CELERY_BEAT_SCHEDULE = {
+    "gerar-mensalidades-mensais": {
+        "task": "financeiro.tasks.gerar_mensalidades_periodo",
+        "schedule": crontab(day_of_month=1, hour=0, minute=30),
+        # todos os dias 1, as 00h30
+    },
+    "marcar-atrasadas-diario": {
+        "task": "financeiro.tasks.marcar_atrasadas_diario",
+        "schedule": crontab(hour=0, minute=5),
+        # todos os dias as 00h05
+    },
+    "enviar-resumos-atraso-diario": {
+        "task": "financeiro.tasks.enviar_resumos_atraso",
+        "schedule": crontab(hour=8, minute=0),
+        # todos os dias as 08h, um email por encarregado
+    },
+    "despachar-outbox": {
+        "task": "financeiro.tasks.despachar_eventos_outbox",
+        "schedule": 10.0,
+        # a cada 10 segundos
+    },
+    "processar-callbacks-pagamento": {
+        "task": "financeiro.tasks.processar_callbacks_pagamento",
+        "schedule": 5.0,
+        # a cada 5 segundos
+    },
+    "limpar-outbox": {
+        "task": "financeiro.tasks.limpar_eventos_outbox",
+        "schedule": crontab(hour=3, minute=0),
+    },
+    "fechar-saldos-diario": {
+        "task": "financeiro.tasks.fechar_saldos_diario",
+        "schedule": crontab(hour=2, minute=0),
+    },
+    "manter-particoes-mensais": {
+        "task": "financeiro.tasks.manter_particoes",
+        "schedule": crontab(day_of_month=25, hour=1, minute=0),
+        # todos os dias 25, as 01h (so atua nas tabelas particionadas)
+    },
+    "arquivar-alertas": {
+        "task": "financeiro.tasks.arquivar_alertas_antigos",
+        "schedule": crontab(hour=3, minute=30),
+        # todos os dias as 03h30, fora do horario de expediente
+    },
+}
 
 
 # CELERY_BEAT_SCHEDULE = {
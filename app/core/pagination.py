@@ -0,0 +1,16 @@
+"""Paginacoes partilhadas pelas APIs"""
+from rest_framework.pagination import CursorPagination
+
+
+class CursorPaginacao(CursorPagination):
+    """Paginacao por cursor (keyset): cada pagina e um WHERE sobre a coluna de ordenacao mais
+    LIMIT, sem COUNT(*) nem OFFSET, por isso custa o mesmo na primeira e na milesima pagina.
+
+    Opt-in por viewset: `pagination_class = CursorPaginacao` e `ordering` com a coluna do cursor
+    primeiro e a chave primaria a desempatar (ex: ["-data_pagamento", "-id"]), apoiada num indice
+    com as mesmas colunas. `ordering_fields` so deve ter a coluna do cursor: o cursor guarda a
+    posicao na primeira coluna e uma coluna sem indice ou com muitos empates (ex: valor) volta
+    a ler e saltar linhas. A resposta tem `next`/`previous` mas nao `count`.
+    """
+    page_size_query_param = "page_size"
+    max_page_size = 500
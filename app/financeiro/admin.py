@@ -1,5 +1,7 @@
 from django.contrib import admin
-from financeiro.models import Mensalidade, Pagamento, Salario, Fatura, AlertaEnviado
+from dateutil.relativedelta import relativedelta
+from financeiro.services import pagar_salarios, emitir_faturas, liquidar_faturas
+from financeiro.models import Mensalidade, Pagamento, Salario, Fatura, AlertaEnviado, ResumoMensal, EventoOutbox, CallbackPagamento, MovimentoConta, SaldoConta
 
 
 @admin.register(Mensalidade)
@@ -48,6 +50,12 @@ class SalarioAdmin(admin.ModelAdmin):
     )
     list_filter = ("status", "mes_referente")
     search_fields = ("funcionario__username", "funcionario__email")
+    actions = ["marcar_pagos"]
+
+    @admin.action(description="Marcar como pagos (recibos em lote)")
+    def marcar_pagos(self, request, queryset):
+        pagos = pagar_salarios(queryset)
+        self.message_user(request, f"{len(pagos)} salarios marcados como pagos")
 
 
 @admin.register(Fatura)
@@ -63,6 +71,26 @@ class FaturaAdmin(admin.ModelAdmin):
     )
     list_filter = ("status", "data_emissao", "data_vencimento")
     search_fields = ("descricao", "email_destinatario")
+    actions = ["marcar_pagas", "reemitir_mes_seguinte"]
+
+    @admin.action(description="Marcar como pagas (recibos em lote)")
+    def marcar_pagas(self, request, queryset):
+        pagas = liquidar_faturas(list(queryset.values_list("id", flat=True)))
+        self.message_user(request, f"{len(pagas)} faturas marcadas como pagas")
+
+    @admin.action(description="Emitir de novo para o mes seguinte")
+    def reemitir_mes_seguinte(self, request, queryset):
+        faturas = emitir_faturas(
+            dict(
+                descricao=descricao, valor=valor, obs=obs, email_destinatario=email,
+                data_emissao=data_emissao + relativedelta(months=1),
+                data_vencimento=data_vencimento + relativedelta(months=1),
+            )
+            for descricao, valor, obs, email, data_emissao, data_vencimento in queryset.values_list(
+                "descricao", "valor", "obs", "email_destinatario", "data_emissao", "data_vencimento",
+            )
+        )
+        self.message_user(request, f"{len(faturas)} faturas emitidas")
 
 
 @admin.register(AlertaEnviado)
@@ -81,3 +109,59 @@ class AlertaEnviadoAdmin(admin.ModelAdmin):
     def alunos_count(self, obj):
         return obj.alunos.count()
     alunos_count.short_description = "Qtd Alunos"
+
+
+@admin.register(ResumoMensal)
+class ResumoMensalAdmin(admin.ModelAdmin):
+    list_display = (
+        "mes_referente",
+        "rota",
+        "escola",
+        "quantidade",
+        "faturado",
+        "recebido",
+        "em_aberto",
+        "atrasado",
+    )
+    list_filter = ("mes_referente", "rota")
+    search_fields = ("escola",)
+    readonly_fields = [f.name for f in ResumoMensal._meta.fields]
+
+
+@admin.register(EventoOutbox)
+class EventoOutboxAdmin(admin.ModelAdmin):
+    list_display = ("id", "tarefa", "args", "criado_em", "processado_em", "tentativas", "erro")
+    list_filter = ("tarefa", "processado_em")
+    search_fields = ("tarefa", "chave")
+    readonly_fields = [f.name for f in EventoOutbox._meta.fields]
+
+
+@admin.register(CallbackPagamento)
+class CallbackPagamentoAdmin(admin.ModelAdmin):
+    list_display = ("fornecedor", "transacao_id", "estado", "recebido_em", "processado_em", "erro")
+    list_filter = ("fornecedor", "estado", "recebido_em")
+    search_fields = ("transacao_id",)
+    readonly_fields = [f.name for f in CallbackPagamento._meta.fields]
+
+
+@admin.register(MovimentoConta)
+class MovimentoContaAdmin(admin.ModelAdmin):
+    list_display = ("id", "data", "tipo", "natureza", "valor", "aluno", "encarregado", "mensalidade", "pagamento", "criado_em")
+    list_filter = ("tipo", "natureza", "data")
+    search_fields = ("aluno__nome", "encarregado__user__nome")
+    readonly_fields = [f.name for f in MovimentoConta._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SaldoConta)
+class SaldoContaAdmin(admin.ModelAdmin):
+    list_display = ("aluno", "encarregado", "saldo", "ultimo_movimento", "criado_em")
+    readonly_fields = [f.name for f in SaldoConta._meta.fields]
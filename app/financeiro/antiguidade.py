@@ -0,0 +1,55 @@
+"""Antiguidade dos saldos em divida (aging) por encarregado ou aluno, numa query agrupada"""
+from datetime import date
+from decimal import Decimal
+from django.db import models
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from financeiro.models import Mensalidade
+
+# (coluna, dias minimos, dias maximos)
+FAIXAS = (
+    ("dias_0_30", 0, 30),
+    ("dias_31_60", 31, 60),
+    ("dias_61_90", 61, 90),
+    ("dias_90_mais", 91, None),
+)
+_ENCARREGADO = {"encarregado_id": F("aluno__encarregado_id"), "nome_encarregado": F("aluno__encarregado__user__nome")}
+# (campos da mensalidade, expressoes nomeadas) de cada agrupamento
+GRUPOS = {
+    "encarregado": ((), _ENCARREGADO),
+    "aluno": (("aluno_id",), {**_ENCARREGADO, "nome_aluno": F("aluno__nome")}),
+}
+
+
+def colunas(agrupar_por="encarregado"):
+    campos, expressoes = GRUPOS[agrupar_por]
+    return [*expressoes, *campos, *(faixa for faixa, _, _ in FAIXAS), "total", "quantidade"]
+
+
+def antiguidade_saldos(agrupar_por="encarregado", encarregado=None, aluno=None, hoje=None):
+    """Saldo em divida (valor_atualizado - total_pago) das mensalidades vencidas, por faixa de
+    dias de atraso. Devolve um queryset de dicts ordenado pelo grupo (usar .iterator())."""
+    hoje = hoje or date.today()
+    decimal = models.DecimalField(max_digits=14, decimal_places=2)
+    mensalidades = (
+        Mensalidade.objects.exclude(status="PAGO").filter(data_vencimento__lte=hoje)
+        .com_calculos(hoje).select_related(None).prefetch_related(None)
+        .annotate(em_divida=F("_valor_atualizado") - F("total_pago"))
+        .filter(em_divida__gt=0)
+    )
+    if encarregado:
+        mensalidades = mensalidades.filter(aluno__encarregado_id=encarregado)
+    if aluno:
+        mensalidades = mensalidades.filter(aluno_id=aluno)
+
+    faixas = {}
+    for nome, minimo, maximo in FAIXAS:
+        condicao = Q(_dias_atraso__gte=minimo) if maximo is None else Q(_dias_atraso__range=(minimo, maximo))
+        faixas[nome] = Coalesce(Sum("em_divida", filter=condicao), Value(Decimal("0.00")), output_field=decimal)
+
+    campos, expressoes = GRUPOS[agrupar_por]
+    return (
+        mensalidades.order_by().values(*campos, **expressoes)
+        .annotate(**faixas, total=Sum("em_divida", output_field=decimal), quantidade=Count("id"))
+        .order_by("nome_encarregado", "encarregado_id", *campos)
+    )
@@ -0,0 +1,105 @@
+"""Arquivo e purga do historico de AlertaEnviado.
+
+Os alertas mais antigos que a retencao sao lidos por lotes pequenos, em ordem de chave
+(enviado_em, id) sobre o indice do cursor, gravados num ficheiro JSONL comprimido em
+MEDIA_ROOT e so depois apagados (com as ligacoes aos alunos), cada lote na sua transacao
+curta. Cada lote e um membro gzip completo, fechado e descarregado para o disco antes do
+DELETE: uma interrupcao deixa, no maximo, um ultimo membro truncado com alertas que nao
+chegaram a ser apagados, que ler_arquivo ignora.
+"""
+import os
+import gzip
+import json
+import time
+import zlib
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from financeiro.models import AlertaEnviado
+
+
+def caminho_arquivo(limite):
+    """Caminho relativo (a MEDIA_ROOT) do ficheiro de um arquivo"""
+    return os.path.join("arquivo", "alertas", f"alertas-ate-{limite:%Y%m%d}-{timezone.now():%Y%m%d%H%M%S%f}.jsonl.gz")
+
+
+def _lote(limite, cursor, batch_size):
+    """Proximo lote de alertas anteriores a `limite`, a seguir ao cursor (enviado_em, id)"""
+    alertas = AlertaEnviado.objects.filter(enviado_em__lt=limite)
+    if cursor:
+        enviado_em, pk = cursor
+        alertas = alertas.filter(Q(enviado_em__gt=enviado_em) | Q(enviado_em=enviado_em, id__gt=pk))
+    campos = [campo.attname for campo in AlertaEnviado._meta.concrete_fields]
+    linhas = list(alertas.order_by("enviado_em", "id").values(*campos)[:batch_size])
+
+    ligacoes = AlertaEnviado.alunos.through.objects.filter(alertaenviado_id__in=[linha["id"] for linha in linhas])
+    alunos = {}
+    for alerta_id, aluno_id in ligacoes.order_by("id").values_list("alertaenviado_id", "aluno_id"):
+        alunos.setdefault(alerta_id, []).append(aluno_id)
+    for linha in linhas:
+        linha["alunos"] = alunos.get(linha["id"], [])
+    return linhas
+
+
+def arquivar_alertas(meses=None, batch_size=500, pausa=0.0, max_lotes=None):
+    """Arquiva e apaga os alertas com mais de `meses` meses (por defeito FINANCEIRO_ALERTAS_RETER_MESES).
+    `pausa` (segundos) espaca os lotes; `max_lotes` limita o trabalho de uma execucao.
+    Retorna {"arquivados": n, "ficheiro": caminho relativo ou None}."""
+    meses = settings.FINANCEIRO_ALERTAS_RETER_MESES if meses is None else meses
+    limite = timezone.now() - relativedelta(months=meses)
+    if not AlertaEnviado.objects.filter(enviado_em__lt=limite).exists():
+        return {"arquivados": 0, "ficheiro": None}
+
+    relativo = caminho_arquivo(limite)
+    caminho = os.path.join(settings.MEDIA_ROOT, relativo)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    arquivados, lotes, cursor = 0, 0, None
+    with open(caminho, "xb") as bruto:
+        while max_lotes is None or lotes < max_lotes:
+            linhas = _lote(limite, cursor, batch_size)
+            if not linhas:
+                break
+            with gzip.GzipFile(fileobj=bruto, mode="wb") as membro:
+                for linha in linhas:
+                    membro.write(json.dumps(linha, cls=DjangoJSONEncoder).encode() + b"\n")
+            bruto.flush()
+            os.fsync(bruto.fileno())
+
+            ids = [linha["id"] for linha in linhas]
+            with transaction.atomic():
+                AlertaEnviado.objects.filter(id__in=ids).delete()  # apaga tambem as ligacoes aos alunos
+            arquivados += len(ids)
+            lotes += 1
+            cursor = (linhas[-1]["enviado_em"], linhas[-1]["id"])
+            if len(linhas) < batch_size:
+                break
+            if pausa:
+                time.sleep(pausa)
+    return {"arquivados": arquivados, "ficheiro": relativo}
+
+
+def _membros(caminho, tamanho=64 * 1024):
+    """Conteudo de cada membro gzip completo do ficheiro; um ultimo membro truncado e ignorado"""
+    with open(caminho, "rb") as bruto:
+        dados = b""
+        while True:
+            descompressor, partes = zlib.decompressobj(zlib.MAX_WBITS | 16), []
+            while not descompressor.eof:
+                if not dados:
+                    dados = bruto.read(tamanho)
+                    if not dados:
+                        return
+                partes.append(descompressor.decompress(dados))
+                dados = descompressor.unused_data
+            yield b"".join(partes)
+
+
+def ler_arquivo(caminho):
+    """Le os alertas de um ficheiro de arquivo, lote a lote. Os de um lote interrompido a meio
+    da escrita (e por isso nao apagado) nao sao devolvidos."""
+    for membro in _membros(caminho):
+        for linha in membro.splitlines():
+            yield json.loads(linha)
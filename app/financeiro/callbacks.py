@@ -0,0 +1,76 @@
+"""Processamento em lote dos callbacks de pagamento por carteira movel (M-Pesa, e-Mola).
+
+Cada lote de callbacks pendentes e bloqueado (skip_locked), convertido num "extrato" e
+conciliado com as mensalidades em aberto (financeiro.conciliacao); os pagamentos e o
+estado dos callbacks sao gravados na mesma transacao.
+"""
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+from financeiro.conciliacao import conciliar, centimos, normalizar_telefone
+from financeiro.models import CallbackPagamento
+
+# nomes dos campos no payload de cada fornecedor (o primeiro presente e usado)
+CAMPOS = {
+    "transacao": ("transaction_id", "input_TransactionID", "transactionId", "transacao_id"),
+    "valor": ("amount", "input_Amount", "valor"),
+    "telefone": ("msisdn", "input_CustomerMSISDN", "phone", "telefone"),
+    "referencia": ("reference", "input_ThirdPartyReference", "input_TransactionReference", "referencia"),
+}
+
+
+def extrair(payload, campo):
+    """Primeiro valor presente no payload para o campo normalizado (ou None)"""
+    for nome in CAMPOS[campo]:
+        if payload.get(nome) not in (None, ""):
+            return payload[nome]
+    return None
+
+
+def _extrato(callbacks):
+    extrato = pd.DataFrame({
+        "transacao": [c.transacao_id for c in callbacks],
+        "data": pd.to_datetime([timezone.localtime(c.recebido_em).date() for c in callbacks]),
+        "valor": centimos(pd.Series([extrair(c.payload, "valor") for c in callbacks], dtype=object)),
+        "referencia": [str(extrair(c.payload, "referencia") or "").upper() for c in callbacks],
+        "telefone": normalizar_telefone(pd.Series([extrair(c.payload, "telefone") for c in callbacks], dtype=object)),
+    })
+    validos = extrato["valor"].fillna(0) > 0
+    return extrato[validos], extrato.loc[~validos, "transacao"]
+
+
+def processar_callbacks(batch_size=500, max_lotes=None):
+    """Cria os pagamentos dos callbacks pendentes, em lotes. Retorna {"processados": n, "rejeitados": n}."""
+    total = {"processados": 0, "rejeitados": 0}
+    lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        lotes += 1
+        with transaction.atomic():
+            callbacks = list(
+                CallbackPagamento.objects.pendentes().select_for_update(skip_locked=True).order_by("pk")[:batch_size]
+            )
+            if not callbacks:
+                break
+
+            erros = {}
+            for fornecedor in {c.fornecedor for c in callbacks}:
+                extrato, invalidos = _extrato([c for c in callbacks if c.fornecedor == fornecedor])
+                erros.update({(fornecedor, t): "Valor invalido" for t in invalidos})
+                if not extrato.empty:
+                    resultado = conciliar(extrato, metodo_pagamento=fornecedor)
+                    excecoes = resultado["excecoes"]
+                    erros.update({(fornecedor, t): m for t, m in zip(excecoes["transacao"], excecoes["motivo"])})
+
+            agora = timezone.now()
+            processados = [c.pk for c in callbacks if (c.fornecedor, c.transacao_id) not in erros]
+            CallbackPagamento.objects.filter(pk__in=processados).update(estado="PROCESSADO", processado_em=agora)
+            rejeitados = [c for c in callbacks if (c.fornecedor, c.transacao_id) in erros]
+            for c in rejeitados:
+                c.estado, c.processado_em, c.erro = "REJEITADO", agora, erros[(c.fornecedor, c.transacao_id)]
+            CallbackPagamento.objects.bulk_update(rejeitados, ["estado", "processado_em", "erro"], batch_size=500)
+
+        total["processados"] += len(processados)
+        total["rejeitados"] += len(rejeitados)
+        if len(callbacks) < batch_size:
+            break
+    return total
@@ -0,0 +1,287 @@
+"""Conciliacao de extratos (banco, M-Pesa, e-Mola) com as mensalidades em aberto.
+
+O extrato e lido para um DataFrame e cruzado com as mensalidades em aberto em passagens
+vetorizadas (merge), da correspondencia mais forte para a mais fraca:
+
+0. codigo: referencia de pagamento da mensalidade (financeiro.referencias) citada no movimento;
+   familia: referencia de familia, aceite se o valor liquidar todas as mensalidades do
+   encarregado nesse mes;
+1. referencia: um token da referencia/descricao igual ao BI do aluno (valor <= em divida);
+2. telefone: telefone do pagador igual ao do encarregado e valor igual ao em divida;
+3. valor: valor igual ao em divida, aceite apenas se houver um unico candidato.
+
+Nas passagens 2 e 3 so sao considerados candidatos com vencimento a menos de
+FINANCEIRO_CONCILIACAO_DIAS dias da data do movimento; o mais proximo ganha.
+"""
+import os
+import re
+import hashlib
+import unicodedata
+from decimal import Decimal
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.services import registar_pagamentos
+from financeiro.referencias import descodificar, FAMILIA
+
+PREFIXO_OBSERVACAO = "Movimento "
+COLUNAS = {
+    "data": ["data", "data movimento", "data valor", "date", "transaction date", "completion time"],
+    "valor": ["valor", "montante", "credito", "credit", "paid in", "amount"],
+    "referencia": ["referencia", "ref", "descricao", "description", "details", "detalhes"],
+    "telefone": ["telefone", "msisdn", "numero", "phone", "contacto", "other party"],
+    "transacao": ["id transacao", "transacao", "transaction id", "receipt no", "receipt", "id"],
+}
+
+
+def _normalizar_nome(nome):
+    nome = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode()
+    return " ".join(nome.lower().replace(".", " ").replace("_", " ").split())
+
+
+def normalizar_telefone(serie):
+    """Ultimos 9 digitos (numero nacional de Mocambique) ou vazio"""
+    return serie.fillna("").astype(str).str.replace(r"\D", "", regex=True).str[-9:]
+
+
+def centimos(serie):
+    return (pd.to_numeric(serie, errors="coerce") * 100).round().astype("Int64")
+
+
+def ler_datas(serie):
+    """Datas ISO (2026-10-01, com ou sem hora) primeiro; as restantes como dia/mes/ano"""
+    texto = serie.astype(str).str.strip()
+    iso = texto.str.match(r"^\d{4}-\d{2}-\d{2}")
+    datas = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    if iso.any():
+        datas[iso] = pd.to_datetime(texto[iso].str[:10], format="%Y-%m-%d", errors="coerce")
+    if (~iso).any():
+        datas[~iso] = pd.to_datetime(texto[~iso], dayfirst=True, format="mixed", errors="coerce")
+    return datas.dt.normalize()
+
+
+def _normalizar_numero(texto):
+    """O ultimo separador (, ou .) e o decimal e os outros sao de milhares: 1.234,56 e 1,234.56
+    dao 1234.56. Um separador repetido (1,200,000) e sempre de milhares."""
+    texto = re.sub(r"[^\d,.\-]", "", str(texto))
+    separadores = re.findall(r"[,.]", texto)
+    if not separadores:
+        return texto
+    decimal = separadores[-1]
+    if separadores.count(decimal) > 1:
+        return re.sub(r"[,.]", "", texto)
+    inteiro, _, fracao = texto.rpartition(decimal)
+    return f"{re.sub(r'[,.]', '', inteiro)}.{fracao}"
+
+
+def _transacoes_sem_id(extrato):
+    """Id estavel para movimentos sem id de transacao: hash de (data, valor, referencia) mais o
+    numero da ocorrencia no ficheiro, para que reimportar o mesmo extrato seja detetado sem
+    confundir movimentos diferentes de outros extratos"""
+    chaves = extrato["data"].dt.strftime("%Y-%m-%d").fillna("") + "|" + extrato["valor"].astype(str) + "|" + extrato["referencia"]
+    ocorrencia = chaves.groupby(chaves).cumcount()
+    hashes = chaves.map(lambda chave: hashlib.sha1(chave.encode()).hexdigest()[:12].upper())
+    return "H" + hashes + "-" + (ocorrencia + 1).astype(str)
+
+
+def ler_extrato(ficheiro, nome=None):
+    """Le um extrato CSV ou XLSX e devolve os creditos com as colunas
+    transacao, data, valor (centimos), referencia, telefone."""
+    nome = nome or getattr(ficheiro, "name", str(ficheiro))
+    if str(nome).lower().endswith((".xlsx", ".xls")):
+        bruto = pd.read_excel(ficheiro, dtype=str)
+    else:
+        bruto = pd.read_csv(ficheiro, dtype=str, sep=None, engine="python")
+
+    cabecalhos = {_normalizar_nome(c): c for c in bruto.columns}
+    extrato = pd.DataFrame(index=bruto.index)
+    for coluna, aliases in COLUNAS.items():
+        origem = next((cabecalhos[a] for a in aliases if a in cabecalhos), None)
+        extrato[coluna] = bruto[origem] if origem is not None else None
+    if extrato["data"].isna().all() or extrato["valor"].isna().all():
+        raise ValueError("O extrato tem de ter colunas de data e valor")
+
+    extrato["data"] = ler_datas(extrato["data"])
+    extrato["valor"] = centimos(extrato["valor"].map(_normalizar_numero))
+    extrato["referencia"] = extrato["referencia"].fillna("").astype(str).str.upper()
+    extrato["telefone"] = normalizar_telefone(extrato["telefone"])
+    extrato["transacao"] = extrato["transacao"].fillna(_transacoes_sem_id(extrato))
+    return extrato[(extrato["valor"] > 0) & extrato["data"].notna()].reset_index(drop=True)
+
+
+def mensalidades_em_aberto():
+    """Uma query: mensalidades nao pagas com o valor em divida (com multa) em centimos"""
+    linhas = (
+        Mensalidade.objects.exclude(status="PAGO").com_calculos().prefetch_related(None)
+        .values("id", "referencia", "mes_referente", "data_vencimento", "total_pago", "_valor_atualizado",
+                "aluno__nrBI", "aluno__encarregado_id", "aluno__encarregado__telefone")
+    )
+    abertas = pd.DataFrame.from_records(list(linhas), columns=[
+        "id", "referencia", "mes_referente", "data_vencimento", "total_pago", "_valor_atualizado",
+        "aluno__nrBI", "aluno__encarregado_id", "aluno__encarregado__telefone",
+    ])
+    abertas = abertas.rename(columns={"id": "mensalidade", "aluno__encarregado_id": "encarregado"})
+    abertas["em_divida"] = centimos(abertas["_valor_atualizado"].astype(float) - abertas["total_pago"].astype(float))
+    abertas["bi"] = abertas["aluno__nrBI"].fillna("").astype(str).str.upper().str.replace(r"[^A-Z0-9]", "", regex=True)
+    abertas["telefone"] = normalizar_telefone(abertas["aluno__encarregado__telefone"])
+    abertas["data_vencimento"] = pd.to_datetime(abertas["data_vencimento"])
+    abertas["mes_referente"] = pd.to_datetime(abertas["mes_referente"])
+    colunas = ["mensalidade", "referencia", "encarregado", "mes_referente", "data_vencimento", "em_divida", "bi", "telefone"]
+    return abertas[abertas["em_divida"] > 0][colunas]
+
+
+def _tokens(extrato, padrao, nome):
+    """(linha, token) para cada token da referencia do movimento que casa com o padrao"""
+    tokens = (
+        extrato["referencia"].str.findall(padrao).explode().dropna()
+        .rename(nome).reset_index().rename(columns={"index": "linha"})
+    )
+    return tokens[tokens[nome] != ""].drop_duplicates()
+
+
+def _por_codigo(extrato, abertas):
+    tokens = _tokens(extrato, r"\d{7,}", "codigo")
+    candidatos = tokens.merge(abertas, left_on="codigo", right_on="referencia").merge(
+        extrato[["valor"]], left_on="linha", right_index=True,
+    )
+    return candidatos[candidatos["valor"] <= candidatos["em_divida"]].drop_duplicates("linha")
+
+
+def _por_familia(extrato, abertas):
+    tokens = _tokens(extrato, r"\d{7,}", "codigo")
+    tokens["dados"] = tokens["codigo"].map(descodificar)
+    tokens = tokens[tokens["dados"].map(lambda d: d is not None and d[0] == FAMILIA)].drop_duplicates("linha")
+    if tokens.empty:
+        return tokens
+    tokens["encarregado"] = tokens["dados"].str[1]
+    tokens["mes_referente"] = pd.to_datetime(tokens["dados"].str[2])
+    candidatos = tokens[["linha", "encarregado", "mes_referente"]].merge(
+        abertas, on=["encarregado", "mes_referente"],
+    ).merge(extrato[["valor"]], left_on="linha", right_index=True)
+    # o valor tem de liquidar exatamente todas as mensalidades da familia nesse mes
+    total = candidatos.groupby("linha")["em_divida"].transform("sum")
+    candidatos = candidatos[total == candidatos["valor"]]
+    return candidatos.assign(valor_pago=candidatos["em_divida"])
+
+
+def _por_referencia(extrato, abertas):
+    tokens = _tokens(extrato, r"[A-Z0-9]+", "bi")
+    candidatos = tokens.merge(abertas, on="bi").merge(
+        extrato[["valor"]], left_on="linha", right_index=True,
+    )
+    candidatos = candidatos[candidatos["valor"] <= candidatos["em_divida"]]
+    # a divida mais antiga do aluno primeiro
+    return candidatos.sort_values(["linha", "mes_referente"]).drop_duplicates("linha")
+
+
+def _por_proximidade(extrato, abertas, chaves, dias, unico):
+    candidatos = extrato.reset_index().rename(columns={"index": "linha"}).merge(
+        abertas, left_on=["valor", *chaves], right_on=["em_divida", *chaves], suffixes=("", "_m"),
+    )
+    if "telefone" in chaves:
+        candidatos = candidatos[candidatos["telefone"] != ""]
+    candidatos["distancia"] = (candidatos["data"] - candidatos["data_vencimento"]).abs().dt.days
+    candidatos = candidatos[candidatos["distancia"] <= dias]
+    if unico:
+        quantos = candidatos.groupby("linha")["mensalidade"].transform("size")
+        ambiguas = candidatos.loc[quantos > 1, "linha"].unique()
+        candidatos = candidatos[quantos == 1]
+    else:
+        ambiguas = []
+        candidatos = candidatos.sort_values(["linha", "distancia", "mes_referente"]).drop_duplicates("linha")
+    # uma mensalidade so pode ser liquidada por um movimento em cada passagem
+    return candidatos.sort_values(["mensalidade", "distancia"]).drop_duplicates("mensalidade"), ambiguas
+
+
+def transacoes_importadas(extrato):
+    """Ids de movimentos deste extrato que ja deram origem a pagamentos (importacao repetida)"""
+    if extrato.empty:
+        return set()
+    observacoes = Pagamento.objects.filter(
+        observacao__startswith=PREFIXO_OBSERVACAO,
+        data_pagamento__date__range=(extrato["data"].min().date(), extrato["data"].max().date()),
+    ).values_list("observacao", flat=True)
+    return {o[len(PREFIXO_OBSERVACAO):].split(":", 1)[0] for o in observacoes}
+
+
+def conciliar(extrato, dias=None, metodo_pagamento="TRANSFERENCIA", simular=False):
+    """Cruza o extrato com as mensalidades em aberto e cria os pagamentos em lote.
+    Retorna {"conciliadas": DataFrame, "excecoes": DataFrame, "criados": n}."""
+    dias = settings.FINANCEIRO_CONCILIACAO_DIAS if dias is None else dias
+    abertas = mensalidades_em_aberto()
+    importadas = extrato["transacao"].isin(transacoes_importadas(extrato))
+    pendente = extrato[~importadas]
+    correspondencias, ambiguas = [], set()
+
+    passagens = [
+        ("codigo", lambda e, a: (_por_codigo(e, a), [])),
+        ("familia", lambda e, a: (_por_familia(e, a), [])),
+        ("referencia", lambda e, a: (_por_referencia(e, a), [])),
+        ("telefone", lambda e, a: _por_proximidade(e, a, ["telefone"], dias, unico=False)),
+        ("valor", lambda e, a: _por_proximidade(e, a, [], dias, unico=True)),
+    ]
+    for criterio, passagem in passagens:
+        if pendente.empty or abertas.empty:
+            break
+        encontradas, sem_decisao = passagem(pendente, abertas)
+        ambiguas.update(sem_decisao)
+        if encontradas.empty:
+            continue
+        if "valor_pago" not in encontradas:
+            encontradas = encontradas.assign(valor_pago=encontradas["valor"])
+        correspondencias.append(encontradas.assign(criterio=criterio)[["linha", "mensalidade", "valor_pago", "criterio"]])
+        pendente = pendente.drop(index=encontradas["linha"].unique())
+        # as passagens seguintes veem o valor em divida ja descontado do que foi atribuido
+        atribuido = encontradas.groupby("mensalidade")["valor_pago"].sum()
+        abertas = abertas.assign(
+            em_divida=abertas["em_divida"] - abertas["mensalidade"].map(atribuido).fillna(0).astype("Int64")
+        )
+        abertas = abertas[abertas["em_divida"] > 0]
+
+    colunas = ["linha", "mensalidade", "valor_pago", "criterio"]
+    conciliadas = pd.concat(correspondencias) if correspondencias else pd.DataFrame(columns=colunas)
+    conciliadas = (
+        conciliadas.merge(extrato, left_on="linha", right_index=True)
+        .sort_values("linha").reset_index(drop=True)
+    )
+
+    excecoes = extrato.drop(index=conciliadas["linha"].unique()).assign(motivo="Sem correspondencia")
+    excecoes.loc[excecoes.index.isin(ambiguas), "motivo"] = "Varias mensalidades possiveis"
+    excecoes.loc[importadas[importadas].index, "motivo"] = "Movimento ja importado"
+
+    criados = 0
+    if not simular and not conciliadas.empty:
+        itens = [
+            {
+                "mensalidade": int(linha.mensalidade),
+                "valor": Decimal(int(linha.valor_pago)) / 100,
+                "data_pagamento": timezone.make_aware(linha.data.to_pydatetime()),
+                "metodo_pagamento": metodo_pagamento,
+                "observacao": f"{PREFIXO_OBSERVACAO}{linha.transacao}: {linha.referencia}",
+            }
+            for linha in conciliadas.itertuples()
+        ]
+        resultados = registar_pagamentos(itens)
+        rejeitadas = [i for i, r in enumerate(resultados) if r["status"] != "criado"]
+        criados = len(resultados) - len(rejeitadas)
+        if rejeitadas:
+            recusadas = conciliadas.iloc[rejeitadas]
+            motivos = [str(resultados[i]["erros"]) for i in rejeitadas]
+            excecoes = pd.concat([
+                excecoes,
+                extrato.loc[recusadas["linha"]].assign(motivo=motivos),
+            ]).drop_duplicates("transacao")
+            conciliadas = conciliadas.drop(index=recusadas.index)
+
+    return {"conciliadas": conciliadas, "excecoes": excecoes.sort_index(), "criados": criados}
+
+
+def gravar_excecoes(excecoes, nome="conciliacao"):
+    """Grava o relatorio de excecoes em MEDIA_ROOT/conciliacao/ e devolve o caminho"""
+    pasta = os.path.join(settings.MEDIA_ROOT, "conciliacao")
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"{nome}-{timezone.localtime():%Y%m%d%H%M%S}-excecoes.csv")
+    relatorio = excecoes.assign(valor=excecoes["valor"].astype(float) / 100)
+    relatorio.to_csv(caminho, index=False, date_format="%Y-%m-%d")
+    return caminho
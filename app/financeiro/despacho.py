@@ -0,0 +1,152 @@
+"""Despacho assincrono (asyncio) dos alertas por email, para grandes volumes.
+
+Um produtor reserva os alertas PENDENTE por lotes (ordem de id) para uma fila limitada e
+`concorrencia` trabalhadores enviam-nos, cada um pela sua ligacao SMTP (aiosmtplib), com
+limite de taxa por dominio do destinatario. Os resultados sao gravados em bloco (um UPDATE
+por cada `concorrencia` envios). O ORM corre em sync_to_async e o envio nunca bloqueia o loop,
+por isso um processo mantem centenas de envios em curso.
+
+Cada lote e reservado com select_for_update(skip_locked) e marcado A ENVIAR antes de ser
+enviado, por isso podem correr varios despachantes em paralelo sem enviar o mesmo alerta duas
+vezes. Os alertas de um despachante interrompido ficam A ENVIAR e voltam a PENDENTE ao fim de
+FINANCEIRO_DESPACHO_RESERVA_MINUTOS (os que ja tinham sido enviados sao reenviados).
+"""
+import asyncio
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from financeiro.models import AlertaEnviado
+from financeiro.notificacoes import mensagem_alerta, registar_resultado
+
+
+class LimiteTaxaDominio:
+    """Espaca os envios para o mesmo dominio em `por_segundo` mensagens por segundo (0 = sem limite)"""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo else 0
+        self.proximo = {}
+
+    async def aguardar(self, dominio):
+        if not self.intervalo:
+            return
+        agora = asyncio.get_running_loop().time()
+        vez = max(self.proximo.get(dominio, agora), agora)
+        # reserva a vez antes de esperar: os outros trabalhadores ficam com as seguintes
+        self.proximo[dominio] = vez + self.intervalo
+        if vez > agora:
+            await asyncio.sleep(vez - agora)
+
+
+def dominio(email):
+    return email.rpartition("@")[2].lower()
+
+
+def _reservar(batch_size):
+    """Proximo lote de alertas PENDENTE, bloqueados (os de outros despachantes sao saltados) e
+    marcados A ENVIAR na mesma transacao curta"""
+    with transaction.atomic():
+        alertas = list(
+            AlertaEnviado.objects.filter(status="PENDENTE").select_for_update(skip_locked=True)
+            .order_by("id").only("pk", "tipo", "email", "mensagem")[:batch_size]
+        )
+        if alertas:
+            AlertaEnviado.objects.filter(pk__in=[alerta.pk for alerta in alertas]).update(
+                status="A ENVIAR", data_atualizacao=timezone.now(),
+            )
+    return alertas
+
+
+def libertar_reservas(minutos=None):
+    """Devolve a PENDENTE os alertas reservados (A ENVIAR) ha mais de `minutos`, por defeito
+    FINANCEIRO_DESPACHO_RESERVA_MINUTOS. Retorna quantos."""
+    minutos = settings.FINANCEIRO_DESPACHO_RESERVA_MINUTOS if minutos is None else minutos
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return AlertaEnviado.objects.filter(status="A ENVIAR", data_atualizacao__lt=limite).update(
+        status="PENDENTE", data_atualizacao=timezone.now(),
+    )
+
+
+def ligacao_smtp():
+    """Cliente SMTP assincrono configurado com as definicoes EMAIL_* do Django"""
+    import aiosmtplib
+
+    return aiosmtplib.SMTP(
+        hostname=settings.EMAIL_HOST,
+        port=settings.EMAIL_PORT,
+        username=settings.EMAIL_HOST_USER or None,
+        password=settings.EMAIL_HOST_PASSWORD or None,
+        use_tls=getattr(settings, "EMAIL_USE_SSL", False),
+        start_tls=settings.EMAIL_USE_TLS or None,
+        timeout=getattr(settings, "EMAIL_TIMEOUT", None) or 60,
+    )
+
+
+async def despachar(batch_size=500, concorrencia=None, por_dominio=None, max_alertas=None, fabrica_smtp=ligacao_smtp):
+    """Envia os alertas PENDENTE (e os de reservas expiradas). Retorna {"enviados": n, "falhas": n}."""
+    concorrencia = concorrencia or settings.FINANCEIRO_DESPACHO_CONCORRENCIA
+    if por_dominio is None:
+        por_dominio = settings.FINANCEIRO_DESPACHO_POR_DOMINIO
+    limite = LimiteTaxaDominio(por_dominio)
+    fila = asyncio.Queue(maxsize=max(batch_size, concorrencia) * 2)
+    enviados, falhas = [], []
+    total = {"enviados": 0, "falhas": 0}
+
+    async def gravar(minimo):
+        nonlocal enviados, falhas
+        if len(enviados) + len(falhas) < max(minimo, 1):
+            return
+        # troca as listas antes do await: os trabalhadores continuam a acumular nas novas
+        lote_enviados, lote_falhas, enviados, falhas = enviados, falhas, [], []
+        await sync_to_async(registar_resultado)(lote_enviados, lote_falhas)
+        total["enviados"] += len(lote_enviados)
+        total["falhas"] += len(lote_falhas)
+
+    async def produtor():
+        lidos = 0
+        while max_alertas is None or lidos < max_alertas:
+            quantidade = batch_size if max_alertas is None else min(batch_size, max_alertas - lidos)
+            lote = await sync_to_async(_reservar)(quantidade)
+            for alerta in lote:
+                await fila.put(alerta)
+            lidos += len(lote)
+            if len(lote) < quantidade:
+                break
+        for _ in range(concorrencia):
+            await fila.put(None)
+
+    async def trabalhador():
+        smtp = None
+        try:
+            while (alerta := await fila.get()) is not None:
+                if not alerta.email:
+                    falhas.append(alerta.pk)
+                    continue
+                await limite.aguardar(dominio(alerta.email))
+                try:
+                    if smtp is None:
+                        smtp = fabrica_smtp()
+                        await smtp.connect()
+                    await smtp.send_message(mensagem_alerta(alerta).message())
+                except Exception:
+                    falhas.append(alerta.pk)
+                    # a ligacao pode ter ficado num estado invalido apos o erro
+                    if smtp is not None:
+                        smtp.close()
+                        smtp = None
+                else:
+                    enviados.append(alerta.pk)
+                # gravar cedo limita os reenvios se o processo morrer com alertas ja enviados
+                await gravar(min(batch_size, concorrencia))
+        finally:
+            if smtp is not None and smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except Exception:
+                    smtp.close()
+
+    await sync_to_async(libertar_reservas)()
+    await asyncio.gather(produtor(), *(trabalhador() for _ in range(concorrencia)))
+    await gravar(0)
+    return total
@@ -0,0 +1,68 @@
+"""Extrato de conta de um encarregado (todos os alunos): debitos e creditos do livro razao por
+data, com saldo corrente.
+
+Uma pagina e uma unica query: os movimentos a seguir ao cursor (data, id), com o saldo
+corrente calculado por uma window function (SUM ... OVER) sobre esses movimentos mais, numa
+subquery escalar nao correlacionada (avaliada uma vez), o total dos movimentos ate ao cursor. O custo nao depende do numero de
+alunos nem da pagina pedida (indice movimento_extrato_idx). O nome do aluno e o mes sao
+subqueries e nao JOINs: os movimentos de mensalidades ou alunos apagados continuam no extrato.
+"""
+import base64
+import binascii
+from datetime import date
+from decimal import Decimal
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce
+from alunos.models import Aluno
+from financeiro.models import Mensalidade, MovimentoConta
+
+ZERO = Decimal("0.00")
+
+
+def codificar_cursor(data, pk):
+    return base64.urlsafe_b64encode(f"{data.isoformat()},{pk}".encode()).decode()
+
+
+def descodificar_cursor(cursor):
+    """(data, id) de um cursor; ValueError se for invalido"""
+    try:
+        data, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split(",")
+        return date.fromisoformat(data), int(pk)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as erro:
+        raise ValueError("Cursor invalido") from erro
+
+
+def extrato(encarregado, cursor=None, limite=50):
+    """Pagina do extrato do encarregado a seguir ao cursor (data, id). Retorna (linhas, proximo
+    cursor ou None); cada linha tem o movimento, o aluno, o mes da mensalidade e o saldo apos o movimento."""
+    valor = DecimalField(max_digits=14, decimal_places=2)
+    movimentos = MovimentoConta.objects.filter(encarregado_id=encarregado)
+    anterior = Value(ZERO, output_field=valor)
+    if cursor:
+        data, pk = cursor
+        ate_cursor = Q(data__lt=data) | Q(data=data, id__lte=pk)
+        # filtro constante (sem OuterRef): o PostgreSQL calcula a soma uma vez por pagina (InitPlan),
+        # e nao uma vez por linha
+        total = (
+            MovimentoConta.objects.filter(ate_cursor, encarregado_id=encarregado).order_by()
+            .values("encarregado_id").annotate(total=Sum("valor")).values("total")
+        )
+        anterior = Coalesce(Subquery(total, output_field=valor), anterior)
+        movimentos = movimentos.exclude(ate_cursor)
+
+    linhas = list(
+        movimentos.annotate(
+            saldo_corrente=Window(Sum("valor"), order_by=[F("data").asc(), F("id").asc()], output_field=valor) + anterior,
+        )
+        .order_by("data", "id")
+        .values(
+            "id", "data", "tipo", "natureza", "valor", "aluno_id", "mensalidade_id", "pagamento_id", "saldo_corrente",
+            aluno_nome=Subquery(Aluno.objects.filter(pk=OuterRef("aluno_id")).values("nome")[:1]),
+            mes_referente=Subquery(Mensalidade.objects.filter(pk=OuterRef("mensalidade_id")).values("mes_referente")[:1]),
+        )[:limite + 1]
+    )
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo = codificar_cursor(linhas[-1]["data"], linhas[-1]["id"])
+    return linhas, proximo
@@ -0,0 +1,30 @@
+"""comando django que exporta a antiguidade dos saldos em divida"""
+from django.core.management.base import BaseCommand
+from financeiro.antiguidade import antiguidade_saldos, colunas
+from financeiro.exportacao import gerar_csv, gerar_json
+
+
+class Command(BaseCommand):
+    """Escreve o relatorio (CSV ou JSON) linha a linha, sem o carregar em memoria"""
+    help = "Exporta os saldos em divida por faixa de dias de atraso (0-30, 31-60, 61-90, 90+)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--agrupar-por", choices=["encarregado", "aluno"], default="encarregado")
+        parser.add_argument("--formato", choices=["csv", "json"], default="csv")
+        parser.add_argument("--saida", help="Ficheiro de saida (por defeito stdout)")
+
+    def handle(self, *args, **options):
+        agrupar_por = options["agrupar_por"]
+        linhas = antiguidade_saldos(agrupar_por).iterator(chunk_size=2000)
+        if options["formato"] == "csv":
+            partes = gerar_csv(linhas, colunas(agrupar_por))
+        else:
+            partes = gerar_json(linhas)
+
+        if not options["saida"]:
+            for parte in partes:
+                self.stdout.write(parte, ending="")
+            return
+        with open(options["saida"], "w", newline="") as ficheiro:
+            ficheiro.writelines(partes)
+        self.stdout.write(self.style.SUCCESS(f"Relatorio gravado em {options['saida']}"))
@@ -0,0 +1,21 @@
+"""comando django que arquiva e apaga os alertas antigos"""
+from django.core.management.base import BaseCommand, CommandError
+from financeiro.arquivo import arquivar_alertas
+
+
+class Command(BaseCommand):
+    """Exporta para JSONL comprimido (MEDIA_ROOT/arquivo/alertas) e apaga por lotes"""
+    help = "Arquiva e apaga os alertas enviados ha mais de N meses"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--meses", type=int, default=None, help="Por defeito FINANCEIRO_ALERTAS_RETER_MESES")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--pausa", type=float, default=0.0, help="Segundos entre lotes")
+        parser.add_argument("--max-lotes", type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options["meses"] is not None and options["meses"] < 1:
+            raise CommandError("--meses deve ser pelo menos 1")
+        resultado = arquivar_alertas(options["meses"], options["batch_size"], options["pausa"], options["max_lotes"])
+        destino = f" em {resultado['ficheiro']}" if resultado["ficheiro"] else ""
+        self.stdout.write(self.style.SUCCESS(f"{resultado['arquivados']} alertas arquivados{destino}"))
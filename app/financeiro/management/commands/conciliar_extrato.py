@@ -0,0 +1,34 @@
+"""comando django para conciliar um extrato bancario ou de carteira movel"""
+from django.core.management.base import BaseCommand, CommandError
+from financeiro.conciliacao import ler_extrato, conciliar, gravar_excecoes
+from financeiro.models import M_PAGAMENTO
+
+
+class Command(BaseCommand):
+    """Cria os pagamentos das mensalidades encontradas no extrato e grava as excecoes"""
+    help = "Concilia um extrato (CSV/XLSX do banco, M-Pesa ou e-Mola) com as mensalidades em aberto"
+
+    def add_arguments(self, parser):
+        parser.add_argument("ficheiro")
+        parser.add_argument("--metodo", choices=[m for m, _ in M_PAGAMENTO], default="TRANSFERENCIA")
+        parser.add_argument("--dias", type=int, help="Distancia maxima (dias) entre o movimento e o vencimento")
+        parser.add_argument("--simular", action="store_true", help="Mostra o resultado sem criar pagamentos")
+
+    def handle(self, *args, **options):
+        try:
+            extrato = ler_extrato(options["ficheiro"])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Nao foi possivel ler o extrato: {e}")
+
+        resultado = conciliar(
+            extrato, dias=options["dias"], metodo_pagamento=options["metodo"], simular=options["simular"],
+        )
+        conciliadas, excecoes = resultado["conciliadas"], resultado["excecoes"]
+        for criterio, quantidade in conciliadas["criterio"].value_counts().items():
+            self.stdout.write(f"  {criterio}: {quantidade}")
+        if not excecoes.empty:
+            self.stdout.write(f"Excecoes gravadas em {gravar_excecoes(excecoes)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(extrato)} movimentos, {len(conciliadas)} conciliados, "
+            f"{resultado['criados']} pagamentos criados, {len(excecoes)} excecoes"
+        ))
@@ -0,0 +1,34 @@
+"""comando django que envia os alertas pendentes com o despacho assincrono"""
+import time
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from financeiro.despacho import despachar
+
+
+class Command(BaseCommand):
+    """Uma passagem pelos alertas PENDENTE ou, com --continuo, worker dedicado"""
+    help = "Envia os alertas pendentes em paralelo (asyncio), com limite de taxa por dominio"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--concorrencia", type=int, default=None, help="Por defeito FINANCEIRO_DESPACHO_CONCORRENCIA")
+        parser.add_argument("--por-dominio", type=float, default=None, help="Emails/s por dominio; por defeito FINANCEIRO_DESPACHO_POR_DOMINIO")
+        parser.add_argument("--max-alertas", type=int, default=None)
+        parser.add_argument("--continuo", action="store_true", help="Continua a correr, a procura de novos alertas")
+        parser.add_argument("--intervalo", type=float, default=5.0, help="Segundos de espera quando nao ha alertas (--continuo)")
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.perf_counter()
+            total = async_to_sync(despachar)(
+                options["batch_size"], options["concorrencia"], options["por_dominio"], options["max_alertas"],
+            )
+            if total["enviados"] or total["falhas"] or not options["continuo"]:
+                duracao = time.perf_counter() - inicio
+                self.stdout.write(self.style.SUCCESS(
+                    f"{total['enviados']} enviados, {total['falhas']} falhas em {duracao:.2f}s"
+                ))
+            if not options["continuo"]:
+                break
+            if not total["enviados"] and not total["falhas"]:
+                time.sleep(options["intervalo"])
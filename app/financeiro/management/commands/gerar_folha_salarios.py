@@ -0,0 +1,28 @@
+"""comando django para gerar em lote os salarios de um mes"""
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from financeiro.services import gerar_folha_salarios
+
+
+class Command(BaseCommand):
+    """Gera os salarios do mes de todos os funcionarios ativos (idempotente)"""
+    help = "Gera a folha de salarios (FUNCIONARIO, MOTORISTA, ADMINISTRADOR) de um mes"
+
+    def add_arguments(self, parser):
+        hoje = date.today()
+        parser.add_argument("--ano", type=int, default=hoje.year)
+        parser.add_argument("--mes", type=int, default=hoje.month)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not 1 <= options["mes"] <= 12:
+            raise CommandError("O mes deve estar entre 1 e 12")
+
+        resultado = gerar_folha_salarios(options["ano"], options["mes"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['criados']} salarios criados, {resultado['ignorados']} ja existentes"
+        ))
+        if resultado["sem_valor"]:
+            self.stdout.write(self.style.WARNING(
+                f"Sem salario definido (nem no cargo): {', '.join(map(str, resultado['sem_valor']))}"
+            ))
@@ -0,0 +1,28 @@
+"""comando django para gerar em lote as mensalidades de um mes ou ano"""
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from financeiro.services import gerar_mensalidades
+
+
+class Command(BaseCommand):
+    """Gera as mensalidades de todos os alunos ativos (idempotente)"""
+    help = "Gera em lote as mensalidades dos alunos ativos para um mes ou para o ano inteiro"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ano", type=int, default=date.today().year)
+        parser.add_argument("--mes", type=int, help="Mes (1-12). Se omitido gera o ano inteiro")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        mes = options["mes"]
+        if mes is not None and not 1 <= mes <= 12:
+            raise CommandError("O mes deve estar entre 1 e 12")
+
+        resultado = gerar_mensalidades(
+            options["ano"],
+            [mes] if mes else None,
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['criadas']} mensalidades criadas, {resultado['ignoradas']} ja existentes"
+        ))
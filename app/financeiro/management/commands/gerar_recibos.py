@@ -0,0 +1,38 @@
+"""comando django para gerar em lote os recibos em PDF"""
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from financeiro.models import Pagamento, Salario, Fatura
+from financeiro.recibos import TIPOS, gerar_recibos
+
+
+class Command(BaseCommand):
+    """Gera os recibos de um mes (ou de ids concretos) usando um pool de processos"""
+    help = "Gera em lote os recibos em PDF de pagamentos, salarios ou faturas pagos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("tipo", choices=TIPOS)
+        parser.add_argument("--ids", type=int, nargs="+")
+        parser.add_argument("--mes", help="Mes no formato AAAA-MM (pagamentos/salarios pelo mes de referencia)")
+        parser.add_argument("--processos", type=int, help="Numero de processos (por defeito FINANCEIRO_RECIBOS_PROCESSOS)")
+
+    def handle(self, *args, **options):
+        tipo = options["tipo"]
+        ids = options["ids"]
+        if ids is None:
+            if not options["mes"]:
+                raise CommandError("Indique --ids ou --mes")
+            try:
+                mes = datetime.strptime(options["mes"], "%Y-%m").date()
+            except ValueError:
+                raise CommandError("O mes deve estar no formato AAAA-MM")
+
+            if tipo == "pagamento":
+                queryset = Pagamento.objects.filter(mensalidade__mes_referente=mes)
+            elif tipo == "salario":
+                queryset = Salario.objects.pagos().filter(mes_referente__year=mes.year, mes_referente__month=mes.month)
+            else:
+                queryset = Fatura.objects.pagas().filter(data_emissao__year=mes.year, data_emissao__month=mes.month)
+            ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+
+        caminhos = gerar_recibos(tipo, ids, processos=options["processos"])
+        self.stdout.write(self.style.SUCCESS(f"{len(caminhos)} recibos gerados"))
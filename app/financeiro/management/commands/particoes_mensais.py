@@ -0,0 +1,37 @@
+"""comando django que gere as particoes mensais (PostgreSQL) de pagamentos e alertas"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from financeiro import particoes
+
+
+class Command(BaseCommand):
+    """Conversao (uma vez, em manutencao) e manutencao das particoes por mes"""
+    help = "Cria as particoes dos proximos meses de pagamentos e alertas e desanexa as antigas dos alertas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--converter", nargs="+", choices=sorted(particoes.TABELAS),
+            help="Converte as tabelas indicadas em tabelas particionadas (copia os dados; bloqueia a tabela)",
+        )
+        parser.add_argument("--meses-futuros", type=int, default=settings.FINANCEIRO_PARTICOES_MESES_FUTUROS)
+        parser.add_argument(
+            "--reter-meses", type=int, default=settings.FINANCEIRO_PARTICOES_RETER_MESES,
+            help="Desanexa as particoes de alertas com mais de N meses (0 = nenhuma; as de pagamentos nunca)",
+        )
+        parser.add_argument("--apagar", action="store_true", help="Apaga as particoes desanexadas")
+
+    def handle(self, *args, **options):
+        if not particoes.disponivel():
+            raise CommandError("O particionamento so e suportado em PostgreSQL")
+        for nome in options["converter"] or []:
+            criadas = particoes.converter(nome, options["meses_futuros"])
+            self.stdout.write(f"{nome}: convertida ({criadas} particoes)")
+
+        resultado = particoes.manter(options["meses_futuros"], options["reter_meses"], options["apagar"])
+        if not resultado:
+            self.stdout.write(self.style.WARNING("Nenhuma tabela particionada (use --converter)"))
+        for tabela, alteracoes in resultado.items():
+            acao = "apagadas" if options["apagar"] else "desanexadas"
+            self.stdout.write(self.style.SUCCESS(
+                f"{tabela}: {len(alteracoes['criadas'])} criadas, {len(alteracoes['desanexadas'])} {acao}"
+            ))
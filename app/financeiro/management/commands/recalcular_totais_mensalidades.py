@@ -0,0 +1,28 @@
+"""comando django para reconstruir total_pago/valor_devido das mensalidades"""
+from django.db import transaction
+from django.db.models import Max
+from django.core.management.base import BaseCommand
+from financeiro.models import Mensalidade
+from financeiro.resumo import invalidar_resumo
+from financeiro.relatorios import reconstruir_resumo_mensal
+
+
+class Command(BaseCommand):
+    """Recalcula os totais denormalizados a partir dos pagamentos, em blocos de ids"""
+    help = "Reconstroi total_pago e valor_devido de todas as mensalidades a partir dos pagamentos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        ultimo_id = Mensalidade.objects.aggregate(ultimo=Max("id"))["ultimo"] or 0
+        atualizadas = 0
+        for inicio in range(0, ultimo_id + 1, batch_size):
+            with transaction.atomic():
+                atualizadas += Mensalidade.objects.filter(
+                    id__gte=inicio, id__lt=inicio + batch_size
+                ).recalcular_totais()
+        invalidar_resumo()
+        reconstruir_resumo_mensal()
+        self.stdout.write(self.style.SUCCESS(f"{atualizadas} mensalidades recalculadas"))
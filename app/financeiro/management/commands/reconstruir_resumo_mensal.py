@@ -0,0 +1,22 @@
+"""comando django para reconstruir a tabela ResumoMensal"""
+from django.core.management.base import BaseCommand
+from financeiro.models import Mensalidade
+from financeiro.relatorios import reconstruir_resumo_mensal
+
+
+class Command(BaseCommand):
+    """Back-fill dos resumos mensais a partir das mensalidades"""
+    help = "Reconstroi ResumoMensal para todos os meses, ou apenas para um ano"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ano", type=int, help="Reconstroi apenas os meses deste ano")
+
+    def handle(self, *args, **options):
+        meses = None
+        if options["ano"]:
+            meses = list(
+                Mensalidade.objects.filter(mes_referente__year=options["ano"])
+                .order_by().values_list("mes_referente", flat=True).distinct()
+            )
+        linhas = reconstruir_resumo_mensal(meses)
+        self.stdout.write(self.style.SUCCESS(f"{linhas} linhas de resumo mensal reconstruidas"))
@@ -0,0 +1,90 @@
+"""comando django que simula (ou repete) callbacks de carteira movel para testes de carga"""
+import json
+import time
+import uuid
+import http.client
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from financeiro.models import Mensalidade
+
+
+class Command(BaseCommand):
+    """Envia callbacks em paralelo (uma ligacao keep-alive por thread) e mostra o debito"""
+    help = "Simula callbacks de pagamento M-Pesa/e-Mola contra o endpoint de ingestao"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://localhost:8000/api/financeiro/callbacks/mpesa/")
+        parser.add_argument("--token", default=None, help="Por defeito FINANCEIRO_CALLBACK_TOKEN")
+        parser.add_argument("--quantidade", type=int, default=5000)
+        parser.add_argument("--concorrencia", type=int, default=32)
+        parser.add_argument("--duplicados", type=float, default=0.0, help="Fracao de callbacks reenviados (0-1)")
+        parser.add_argument("--ficheiro", help="JSONL com payloads gravados a repetir")
+        parser.add_argument("--mensalidades", action="store_true", help="Gera payloads que liquidam mensalidades em aberto")
+
+    def payloads(self, options):
+        if options["ficheiro"]:
+            with open(options["ficheiro"]) as ficheiro:
+                return [json.loads(linha) for linha in ficheiro if linha.strip()][:options["quantidade"]]
+        if options["mensalidades"]:
+            abertas = Mensalidade.objects.exclude(status="PAGO").values_list(
+                "aluno__nrBI", "valor_devido", "aluno__encarregado__telefone",
+            )[:options["quantidade"]]
+            return [
+                {"transaction_id": f"SIM{uuid.uuid4().hex[:16]}", "amount": str(valor), "msisdn": str(telefone), "reference": bi}
+                for bi, valor, telefone in abertas
+            ]
+        return [
+            {"transaction_id": f"SIM{uuid.uuid4().hex[:16]}", "amount": "1500.00", "msisdn": f"25884{n:07d}", "reference": f"SIM{n}"}
+            for n in range(options["quantidade"])
+        ]
+
+    def handle(self, *args, **options):
+        destino = urlsplit(options["url"])
+        if destino.scheme not in ("http", "https"):
+            raise CommandError("URL invalida")
+        token = options["token"] if options["token"] is not None else settings.FINANCEIRO_CALLBACK_TOKEN
+        payloads = self.payloads(options)
+        repetidos = int(len(payloads) * options["duplicados"])
+        payloads += payloads[:repetidos]
+        if not payloads:
+            raise CommandError("Nada para enviar")
+
+        classe = http.client.HTTPSConnection if destino.scheme == "https" else http.client.HTTPConnection
+        cabecalhos = {"Content-Type": "application/json", "X-Callback-Token": token}
+        concorrencia = max(1, min(options["concorrencia"], len(payloads)))
+
+        def enviar(parte):
+            ligacao = classe(destino.netloc, timeout=30)
+            estados, latencias = Counter(), []
+            for payload in parte:
+                inicio = time.perf_counter()
+                try:
+                    ligacao.request("POST", destino.path, body=json.dumps(payload), headers=cabecalhos)
+                    resposta = ligacao.getresponse()
+                    resposta.read()
+                    estados[resposta.status] += 1
+                except (OSError, http.client.HTTPException):
+                    estados["erro"] += 1
+                    ligacao.close()
+                    ligacao = classe(destino.netloc, timeout=30)
+                latencias.append(time.perf_counter() - inicio)
+            ligacao.close()
+            return estados, latencias
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            partes = list(executor.map(enviar, [payloads[i::concorrencia] for i in range(concorrencia)]))
+        duracao = time.perf_counter() - inicio
+
+        estados = sum((p[0] for p in partes), Counter())
+        latencias = sorted(latencia for p in partes for latencia in p[1])
+        p50 = latencias[len(latencias) // 2] * 1000
+        p95 = latencias[int(len(latencias) * 0.95) - 1] * 1000
+        self.stdout.write(f"Estados: {dict(estados)}")
+        self.stdout.write(f"Latencia p50={p50:.1f}ms p95={p95:.1f}ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(payloads)} callbacks em {duracao:.2f}s ({len(payloads) / duracao:.0f}/s, {repetidos} duplicados)"
+        ))
@@ -0,0 +1,23 @@
+"""comando django que lanca no livro razao as mensalidades, multas e pagamentos existentes"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.razao import lancar_em_lotes, lancar_mensalidades, lancar_multas, lancar_pagamentos, fechar_saldos
+
+
+class Command(BaseCommand):
+    """Back-fill (idempotente) do livro razao e fecho dos saldos"""
+    help = "Sincroniza o livro razao com as mensalidades e pagamentos e grava os snapshots de saldo"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        mensalidades = lancar_em_lotes(lancar_mensalidades, Mensalidade.objects.all(), batch_size)
+        lancar_em_lotes(lancar_multas, Mensalidade.objects.all(), batch_size)
+        pagamentos = lancar_em_lotes(lancar_pagamentos, Pagamento.objects.all(), batch_size)
+        snapshots = fechar_saldos(margem=timedelta(0), batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"{mensalidades} mensalidades e {pagamentos} pagamentos sincronizados, {snapshots} saldos fechados"
+        ))
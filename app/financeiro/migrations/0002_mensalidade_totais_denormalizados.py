@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:13
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def preencher_totais(apps, schema_editor):
+    Mensalidade = apps.get_model('financeiro', 'Mensalidade')
+    Pagamento = apps.get_model('financeiro', 'Pagamento')
+    decimal = models.DecimalField(max_digits=10, decimal_places=2)
+    soma = (
+        Pagamento.objects.filter(mensalidade=OuterRef('pk'))
+        .order_by().values('mensalidade').annotate(total=Sum('valor')).values('total')
+    )
+    total = Coalesce(Subquery(soma, output_field=decimal), Value(Decimal('0.00')), output_field=decimal)
+    Mensalidade.objects.update(total_pago=total, valor_devido=F('valor') - total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mensalidade',
+            name='total_pago',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text='Soma dos pagamentos (mantido por deltas)', max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='mensalidade',
+            name='valor_devido',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text='Valor menos total pago, sem multa', max_digits=10),
+        ),
+        migrations.RunPython(preencher_totais, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:17
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transporte', '0001_initial'),
+        ('financeiro', '0002_mensalidade_totais_denormalizados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes_referente', models.DateField(db_index=True)),
+                ('escola', models.CharField(blank=True, default='', max_length=255)),
+                ('quantidade', models.PositiveIntegerField(default=0)),
+                ('quantidade_pagas', models.PositiveIntegerField(default=0)),
+                ('quantidade_atrasadas', models.PositiveIntegerField(default=0)),
+                ('faturado', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('recebido', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('em_aberto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('atrasado', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('rota', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumos_mensais', to='transporte.rota')),
+            ],
+            options={
+                'verbose_name': 'Resumo mensal',
+                'verbose_name_plural': 'Resumos mensais',
+                'ordering': ['-mes_referente'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumomensal',
+            constraint=models.UniqueConstraint(condition=models.Q(('rota__isnull', False)), fields=('mes_referente', 'rota', 'escola'), name='resumo_mensal_unico_por_rota'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumomensal',
+            constraint=models.UniqueConstraint(condition=models.Q(('rota__isnull', True)), fields=('mes_referente', 'escola'), name='resumo_mensal_unico_sem_rota'),
+        ),
+    ]
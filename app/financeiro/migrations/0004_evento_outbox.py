@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0003_resumo_mensal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tarefa', models.CharField(help_text='Nome da task celery', max_length=200)),
+                ('args', models.JSONField(blank=True, default=list)),
+                ('chave', models.CharField(blank=True, help_text='Chave de idempotencia', max_length=200, null=True, unique=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('processado_em', models.DateTimeField(blank=True, null=True)),
+                ('tentativas', models.PositiveIntegerField(default=0)),
+                ('erro', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name': 'Evento do outbox',
+                'verbose_name_plural': 'Eventos do outbox',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='eventooutbox',
+            index=models.Index(condition=models.Q(('processado_em__isnull', True)), fields=['id'], name='outbox_pendentes_idx'),
+        ),
+    ]
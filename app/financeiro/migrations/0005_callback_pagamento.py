@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0004_evento_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallbackPagamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fornecedor', models.CharField(choices=[('MPESA', 'M-Pesa'), ('EMOLA', 'e-Mola')], max_length=10)),
+                ('transacao_id', models.CharField(help_text='Id da transacao no fornecedor', max_length=100)),
+                ('payload', models.JSONField()),
+                ('recebido_em', models.DateTimeField(auto_now_add=True)),
+                ('estado', models.CharField(choices=[('PENDENTE', 'Pendente'), ('PROCESSADO', 'Processado'), ('REJEITADO', 'Rejeitado')], default='PENDENTE', max_length=10)),
+                ('processado_em', models.DateTimeField(blank=True, null=True)),
+                ('erro', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name': 'Callback de pagamento',
+                'verbose_name_plural': 'Callbacks de pagamento',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='pagamento',
+            name='metodo_pagamento',
+            field=models.CharField(choices=[('DINHEIRO', 'Dinheiro'), ('TRANSFERENCIA', 'Transferência'), ('CARTAO', 'Cartão'), ('MPESA', 'M-Pesa'), ('EMOLA', 'e-Mola')], default='DINHEIRO', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='callbackpagamento',
+            index=models.Index(condition=models.Q(('estado', 'PENDENTE')), fields=['id'], name='callback_pendentes_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='callbackpagamento',
+            constraint=models.UniqueConstraint(fields=('fornecedor', 'transacao_id'), name='callback_transacao_unica'),
+        ),
+    ]
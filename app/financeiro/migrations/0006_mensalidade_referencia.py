@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:28
+
+from django.db import migrations, models
+
+
+def preencher_referencias(apps, schema_editor):
+    from financeiro.referencias import referencia_mensalidade
+    Mensalidade = apps.get_model('financeiro', 'Mensalidade')
+    sem_referencia = Mensalidade.objects.filter(referencia__isnull=True).only('id', 'aluno_id', 'mes_referente')
+    lote = []
+    for mensalidade in sem_referencia.iterator(chunk_size=2000):
+        mensalidade.referencia = referencia_mensalidade(mensalidade.aluno_id, mensalidade.mes_referente)
+        lote.append(mensalidade)
+        if len(lote) == 2000:
+            Mensalidade.objects.bulk_update(lote, ['referencia'])
+            lote = []
+    Mensalidade.objects.bulk_update(lote, ['referencia'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0005_callback_pagamento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mensalidade',
+            name='referencia',
+            field=models.CharField(blank=True, editable=False, help_text='Referencia de pagamento com digito de controlo', max_length=16, null=True, unique=True),
+        ),
+        migrations.RunPython(preencher_referencias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alunos', '0003_zz_local_sync'),
+        ('financeiro', '0006_mensalidade_referencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoConta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_movimento', models.BigIntegerField()),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('aluno', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='alunos.aluno')),
+                ('encarregado', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='alunos.encarregado')),
+            ],
+            options={
+                'verbose_name': 'Saldo da conta',
+                'verbose_name_plural': 'Saldos das contas',
+                'ordering': ['-ultimo_movimento'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimentoConta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('MENSALIDADE', 'Mensalidade'), ('MULTA', 'Multa'), ('PAGAMENTO', 'Pagamento')], max_length=12)),
+                ('natureza', models.CharField(choices=[('LANCAMENTO', 'Lancamento'), ('AJUSTE', 'Ajuste'), ('ESTORNO', 'Estorno')], default='LANCAMENTO', max_length=10)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('data', models.DateField(help_text='Data efetiva (vencimento ou data do pagamento)')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('aluno', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='alunos.aluno')),
+                ('encarregado', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='alunos.encarregado')),
+                ('mensalidade', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='financeiro.mensalidade')),
+                ('pagamento', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='financeiro.pagamento')),
+            ],
+            options={
+                'verbose_name': 'Movimento da conta',
+                'verbose_name_plural': 'Movimentos da conta',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='saldoconta',
+            index=models.Index(fields=['aluno', '-ultimo_movimento'], name='saldo_aluno_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saldoconta',
+            index=models.Index(fields=['encarregado', '-ultimo_movimento'], name='saldo_encarregado_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='saldoconta',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('aluno__isnull', True), ('encarregado__isnull', False)), models.Q(('aluno__isnull', False), ('encarregado__isnull', True)), _connector='OR'), name='saldo_conta_aluno_ou_encarregado'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentoconta',
+            index=models.Index(fields=['aluno', 'id'], name='movimento_aluno_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentoconta',
+            index=models.Index(fields=['encarregado', 'id'], name='movimento_encarregado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentoconta',
+            index=models.Index(fields=['mensalidade', 'tipo'], name='movimento_mensalidade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentoconta',
+            index=models.Index(fields=['pagamento'], name='movimento_pagamento_idx'),
+        ),
+    ]
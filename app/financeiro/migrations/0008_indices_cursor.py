@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0007_razao_contas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alertaenviado',
+            index=models.Index(fields=['-enviado_em', '-id'], name='alerta_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagamento',
+            index=models.Index(fields=['-data_pagamento', '-id'], name='pagamento_cursor_idx'),
+        ),
+    ]
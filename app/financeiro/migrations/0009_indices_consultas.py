@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0008_indices_cursor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(fields=['status', 'data_vencimento'], name='fatura_status_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(condition=models.Q(('status', 'PAGO'), _negated=True), fields=['data_vencimento'], name='fatura_aberta_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(fields=['data_emissao'], name='fatura_emissao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['status', 'data_vencimento'], name='mensalidade_status_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(condition=models.Q(('status', 'PAGO'), _negated=True), fields=['data_vencimento'], name='mensalidade_aberta_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['mes_referente'], name='mensalidade_mes_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0009_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimentoconta',
+            index=models.Index(fields=['encarregado', 'data', 'id'], name='movimento_extrato_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0010_indice_extrato'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alertaenviado',
+            index=models.Index(condition=models.Q(('status', 'PENDENTE')), fields=['id'], name='alerta_pendentes_idx'),
+        ),
+    ]
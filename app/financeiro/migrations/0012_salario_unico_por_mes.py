@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0011_alerta_pendentes'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='salario',
+            constraint=models.UniqueConstraint(fields=('funcionario', 'mes_referente'), name='salario_unico_por_mes'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0012_salario_unico_por_mes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alertaenviado',
+            name='status',
+            field=models.CharField(choices=[('ENVIADO', 'Enviado'), ('FALHA NO ENVIO', 'Falha no envio'), ('PENDENTE', 'Pendente'), ('A ENVIAR', 'A enviar')], default='ENVIADO', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='alertaenviado',
+            index=models.Index(condition=models.Q(('status', 'A ENVIAR')), fields=['data_atualizacao'], name='alerta_a_enviar_idx'),
+        ),
+    ]
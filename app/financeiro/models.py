@@ -3,7 +3,8 @@
 from datetime import date
 from decimal import Decimal
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Sum, F, OuterRef, Subquery, Value, Case, When
+from django.db.models.functions import Coalesce, Cast, Greatest
 from django.conf import settings
 from django.utils import timezone
 from transporte.models import Rota, Veiculo
@@ -14,7 +15,8 @@ from django.core.validators import MinValueValidator
 # from financeiro.tasks import enviar_alerta_email
 
 CHOICES = [("PAGO", "Pago"), ("PENDENTE", "Pendente"), ("ATRASADO", "Atrasado"), ("PAGO PARCIAL", "Pago Parcial")]
-M_PAGAMENTO = [ ("DINHEIRO", "Dinheiro"), ("TRANSFERENCIA", "Transferência"), ("CARTAO", "Cartão"),]
+M_PAGAMENTO = [ ("DINHEIRO", "Dinheiro"), ("TRANSFERENCIA", "Transferência"), ("CARTAO", "Cartão"), ("MPESA", "M-Pesa"), ("EMOLA", "e-Mola"),]
+FORNECEDORES_CARTEIRA = [("MPESA", "M-Pesa"), ("EMOLA", "e-Mola")]
 
 
 class TimestampMixin(models.Model):
@@ -38,14 +40,34 @@ class StatusMixin(models.Model):
         elif hasattr(self, "data_limite") and hoje > self.data_limite:
             self.status = "ATRASADO"
 
-# Manager
-class MensalidadeManager(models.Manager):
+# Expressoes
+class DiasDesde(models.Func):
+    """Dias inteiros entre uma data fixa e uma coluna de data (data - coluna)"""
+    template = "(%(expressions)s)"
+    arg_joiner = " - "
+    output_field = models.IntegerField()
+
+    def __init__(self, data, expression, **extra):
+        super().__init__(Value(data, output_field=models.DateField()), expression, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context
+        )
+
+
+# QuerySets
+class MensalidadeQuerySet(models.QuerySet):
     def atrasadas(self):
         """Mensalidade vencidas ou com status atrasado"""
         hoje = date.today()
         return self.filter(
             models.Q(status="ATRASADO") | (models.Q(status="PENDENTE") & models.Q(data_vencimento__lt=hoje))
         )
+
     def pagas(self):
         """Mensalidade pagas"""
         return self.filter(status="PAGO")
@@ -65,11 +87,66 @@ class MensalidadeManager(models.Manager):
 
     def de_mes(self, ano, mes):
         """Mensalidade do um determinado mes/ano"""
-        return self.filter(mes_referente__year=ano, mes_referente__month=mes)
+        # intervalo em vez de __year/__month, para poder usar o indice de mes_referente
+        inicio = date(ano, mes, 1)
+        return self.filter(mes_referente__gte=inicio, mes_referente__lt=date(ano + mes // 12, mes % 12 + 1, 1))
+
+    def com_calculos(self, hoje=None):
+        """Calcula dias_atraso e valor_atualizado em SQL (mesmas regras das properties)
+        e pre-carrega aluno e pagamentos, para listar sem queries por linha."""
+        hoje = hoje or date.today()
+        decimal = models.DecimalField(max_digits=12, decimal_places=2)
+        periodos = Cast(F("_dias_atraso") / Value(5), decimal)
+        return self.select_related("aluno").prefetch_related("pagamentos").annotate(
+            _dias_atraso=Case(
+                When(status="PAGO", then=Value(0)),
+                default=Greatest(DiasDesde(hoje, F("data_vencimento")), Value(0)),
+                output_field=models.IntegerField(),
+            ),
+        ).annotate(
+            _valor_atualizado=Case(
+                When(status="ATRASADO", then=F("valor") + F("valor") * F("taxa_atraso") * periodos),
+                default=F("valor"),
+                output_field=decimal,
+            ),
+        )
 
+    def da_referencia(self, referencia):
+        """Mensalidades de uma referencia de pagamento (de mensalidade ou de familia)"""
+        from financeiro.referencias import descodificar, FAMILIA
+        dados = descodificar(referencia)
+        if dados is None:
+            return self.none()
+        tipo, pk, mes_referente = dados
+        if tipo == FAMILIA:
+            return self.filter(aluno__encarregado_id=pk, mes_referente=mes_referente)
+        return self.filter(referencia=referencia)
+
+    def recalcular_totais(self):
+        """Recalcula total_pago/valor_devido a partir dos pagamentos (um UPDATE com subquery)"""
+        decimal = models.DecimalField(max_digits=10, decimal_places=2)
+        soma = (
+            Pagamento.objects.filter(mensalidade=OuterRef("pk"))
+            .order_by().values("mensalidade").annotate(total=Sum("valor")).values("total")
+        )
+        total = Coalesce(Subquery(soma, output_field=decimal), Value(Decimal("0.00")), output_field=decimal)
+        return self.update(total_pago=total, valor_devido=F("valor") - total)
+
+
+# Manager
+class MensalidadeManager(models.Manager.from_queryset(MensalidadeQuerySet)):
     def total_recebido(self):
         """Soma de todos os pagamentos realizados."""
-        return self.model.objects.filter(pagamento__isnull=False).aggregate(total=Sum("pagamento__valor")["total"]or Decimal("0.00"))
+        return self.aggregate(total=Sum("total_pago"))["total"] or Decimal("0.00")
+
+    def aplicar_pagamento(self, mensalidade_id, delta):
+        """Soma (ou subtrai) delta a total_pago/valor_devido num unico UPDATE atomico"""
+        if not delta:
+            return 0
+        return self.filter(pk=mensalidade_id).update(
+            total_pago=F("total_pago") + delta,
+            valor_devido=F("valor") - F("total_pago") - delta,
+        )
 
 
 class PagamentoManager(models.Manager):
@@ -154,6 +231,33 @@ class FaturaManager(models.Manager):
         return self.filter(status="PAGO").aggregate(total=Sum("valor"))["total"] or Decimal("0.00")
 
 
+class EventoOutboxManager(models.Manager):
+    def pendentes(self):
+        return self.filter(processado_em__isnull=True)
+
+    def registar(self, tarefa, *args, chave=None):
+        """Grava o evento na transacao atual (sem tocar no broker). Com chave, repeticoes sao ignoradas."""
+        return self.bulk_create([self.model(tarefa=tarefa, args=list(args), chave=chave)], ignore_conflicts=chave is not None)
+
+class CallbackPagamentoManager(models.Manager):
+    def pendentes(self):
+        return self.filter(estado="PENDENTE")
+
+class MovimentoContaQuerySet(models.QuerySet):
+    """Os movimentos sao so de insercao: correcoes entram como novos movimentos (ajuste/estorno)"""
+
+    def update(self, **kwargs):
+        raise ValidationError("Os movimentos da conta nao podem ser alterados.")
+
+    def delete(self):
+        raise ValidationError("Os movimentos da conta nao podem ser apagados.")
+
+    def do_encarregado(self, encarregado_id):
+        return self.filter(encarregado_id=encarregado_id)
+
+    def do_aluno(self, aluno_id):
+        return self.filter(aluno_id=aluno_id)
+
 class AlertaManager(models.Manager):
     def enviados(self):
         return self.filter(status="ENVIADO")
@@ -177,36 +281,84 @@ class Mensalidade(TimestampMixin, StatusMixin):
     taxa_atraso = models.DecimalField(max_digits=5, decimal_places=2, default=0.10, help_text="A taxa de juros incrementa a cada 5 dias(ex:0.10 = 10%)")
     obs = models.TextField(blank=True, null=True)
     recibo_gerado = models.BooleanField(default=False)
+    total_pago = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"), editable=False, help_text="Soma dos pagamentos (mantido por deltas)")
+    valor_devido = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"), editable=False, help_text="Valor menos total pago, sem multa")
+    referencia = models.CharField(max_length=16, unique=True, null=True, blank=True, editable=False, help_text="Referencia de pagamento com digito de controlo")
+
+    CAMPOS_DENORMALIZADOS = ("total_pago", "valor_devido")
 
     objects = MensalidadeManager()
 
     class Meta:
         unique_together = ("aluno", "mes_referente")
         ordering = ["-mes_referente"]
+        indexes = [
+            # atrasadas/pendentes: status + vencimento
+            models.Index(fields=["status", "data_vencimento"], name="mensalidade_status_venc_idx"),
+            # mensalidades em aberto por vencimento (marcar_atrasadas, antiguidade de saldos)
+            models.Index(fields=["data_vencimento"], condition=~models.Q(status="PAGO"), name="mensalidade_aberta_venc_idx"),
+            models.Index(fields=["mes_referente"], name="mensalidade_mes_idx"),
+        ]
 
-    @property
-    def total_pago(self):
-        """Soma todos os pagamentos parciais feitos para esta mensalidade."""
-        total = self.pagamentos.aggregate(total=Sum('valor'))['total']
-        return total or Decimal('0.00')
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Guarda o mes/aluno lidos da base para atualizar tambem o grupo antigo do ResumoMensal"""
+        instance = super().from_db(db, field_names, values)
+        instance._valores_db = dict(zip(field_names, values))
+        return instance
 
-    @property
-    def valor_devido(self):
-        """Retorna o valor restante a ser pago."""
-        return self.valor_atualizado - self.total_pago
+    def valores_originais(self):
+        """(mes_referente, aluno_id) tal como estavam na base, ou (None, None) se novo"""
+        originais = getattr(self, "_valores_db", {})
+        return originais.get("mes_referente"), originais.get("aluno_id")
+
+    def save(self, *args, **kwargs):
+        """total_pago/valor_devido so mudam por deltas (ver MensalidadeManager.aplicar_pagamento),
+        por isso um save completo nunca os regrava com valores possivelmente desatualizados."""
+        # os valores anotados por com_calculos() deixam de ser validos depois de gravar
+        self.__dict__.pop("_dias_atraso", None)
+        self.__dict__.pop("_valor_atualizado", None)
+        if self._state.adding:
+            self.valor_devido = self.valor - self.total_pago
+            if not self.referencia and self.aluno_id and self.mes_referente:
+                from financeiro.referencias import referencia_mensalidade
+                self.referencia = referencia_mensalidade(self.aluno_id, self.mes_referente)
+            return super().save(*args, **kwargs)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.CAMPOS_DENORMALIZADOS
+            ]
+        # a referencia codifica o aluno e o mes: se mudaram, e gerada de novo
+        mes_original, aluno_original = self.valores_originais()
+        if (mes_original, aluno_original) != (None, None) and (mes_original, aluno_original) != (self.mes_referente, self.aluno_id):
+            from financeiro.referencias import referencia_mensalidade
+            self.referencia = referencia_mensalidade(self.aluno_id, self.mes_referente)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "referencia"}
+        super().save(*args, **kwargs)
+        if update_fields is None or "valor" in update_fields:
+            Mensalidade.objects.filter(pk=self.pk).update(valor_devido=F("valor") - F("total_pago"))
+            self.valor_devido = self.valor - self.total_pago
+
+    def calcular_status(self):
+        """Status que a mensalidade deve ter com base nos pagamentos e datas"""
+        total_pago = self.total_pago
+        if total_pago >= self.valor_atualizado:
+            return "PAGO"
+        if total_pago > 0:
+            return "PAGO PARCIAL"
+        if date.today() > self.data_vencimento:
+            return "ATRASADO"
+        return "PENDENTE"
 
     def atualizar_status(self):
         """ Calcula e atualiza o status da mensalidade com base nos pagamentos e datas."""
         if not self.pk:
             return
-        new_status = "PENDENTE"
-        total_pago = self.total_pago
-        if total_pago >= self.valor_atualizado:
-            new_status = "PAGO"
-        elif total_pago > 0:
-            new_status = "PAGO PARCIAL"
-        elif date.today() > self.data_vencimento:
-            new_status = "ATRASADO"
+        new_status = self.calcular_status()
         if self.status != new_status:
             self.status = new_status
             fields_to_update = ['status']
@@ -216,10 +368,14 @@ class Mensalidade(TimestampMixin, StatusMixin):
             self.save(update_fields=fields_to_update)
 
     def preencher_datas(self, ano: int, mes: int):
-       """chama services gerar_calendario_anual pata preencher datas"""
+        """chama services calcular_datas para preencher datas"""
+        from financeiro.services import calcular_datas
+        self.mes_referente, self.data_vencimento, self.data_limite = calcular_datas(ano, mes)
 
     @property
     def dias_atraso(self):
+        if hasattr(self, "_dias_atraso"):
+            return self._dias_atraso
         if self.status == "PAGO":
             return 0
         return max((date.today() - self.data_vencimento).days, 0)
@@ -227,6 +383,8 @@ class Mensalidade(TimestampMixin, StatusMixin):
     @property
     def valor_atualizado(self):
         """valor atualizado com a multa (pucha do service)"""
+        if hasattr(self, "_valor_atualizado"):
+            return self._valor_atualizado
         if self.status == "ATRASADO":
             dias = self.dias_atraso
             periodos = dias // 5
@@ -256,10 +414,30 @@ class Pagamento(TimestampMixin):
 
     class Meta:
         ordering = ['-data_pagamento']
+        indexes = [
+            # cursor da listagem de pagamentos (CursorPaginacao)
+            models.Index(fields=["-data_pagamento", "-id"], name="pagamento_cursor_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Guarda o valor/mensalidade lidos da base para calcular deltas ao editar"""
+        instance = super().from_db(db, field_names, values)
+        instance._valores_db = dict(zip(field_names, values))
+        return instance
+
+    def valores_originais(self):
+        """(mensalidade_id, valor) tal como estavam na base, ou (None, 0) se novo"""
+        originais = getattr(self, "_valores_db", {})
+        return originais.get("mensalidade_id"), originais.get("valor") or Decimal("0.00")
 
     def clean(self):
         super().clean()
-        if self.valor > self.mensalidade.valor_devido:
+        mensalidade_id, valor_original = self.valores_originais()
+        em_divida = self.mensalidade.valor_atualizado - self.mensalidade.total_pago
+        if mensalidade_id == self.mensalidade_id:
+            em_divida += valor_original
+        if self.valor > em_divida:
             raise ValidationError("Valor do pagamento excede o valor devido")
 
     def __str__(self):
@@ -285,6 +463,9 @@ class Salario(TimestampMixin, StatusMixin):
         ordering = ["-mes_referente"]
         verbose_name = "Salario"
         verbose_name_plural = "Salarios"
+        constraints = [
+            models.UniqueConstraint(fields=["funcionario", "mes_referente"], name="salario_unico_por_mes"),
+        ]
 
     @classmethod
     def total_pago_funcionarios(cls, funcionario):
@@ -304,8 +485,10 @@ class Salario(TimestampMixin, StatusMixin):
         """Gera recibo e envia email para o funcionario."""
         if not self.recibo_gerado and self.status == "PAGO":
             self.recibo_gerado = True
-            self.save(update_fields=["recibo_gereado"])
-            enviar_alerta_email.delay("salario", self.pk)
+            self.save(update_fields=["recibo_gerado"])
+            EventoOutbox.objects.registar(
+                "financeiro.tasks.enviar_recibos_individual", "salario", self.pk, chave=f"recibo:salario:{self.pk}"
+            )
 
     def clean(self):
         """Validacoes antes de salvar"""
@@ -315,13 +498,9 @@ class Salario(TimestampMixin, StatusMixin):
             raise ValidationError("O valor do salario nao pode ser negativo")
 
     def save(self, *args, **kwargs):
-        status_ant = None
-        if self.pk:
-            status_ant = Salario.objects.get(pk=self.pk).status
-
         super().save(*args, **kwargs)
 
-        if self.status == "PAGO" and not self.recibo_gerado and self.recibo_gerado != "PAGO":
+        if self.status == "PAGO" and not self.recibo_gerado:
             self.gerar_recibo_automatico()
 
     def __str__(self):
@@ -338,9 +517,17 @@ class Fatura(StatusMixin):
     recibo_gerado = models.BooleanField(default=False)
     email_destinatario = models.EmailField(help_text=" Email do destinatario da fatura")
 
+    objects = FaturaManager()
+
     class Meta:
         ordering = ["-data_emissao"]
         verbose_name_plural = "Faturas"
+        indexes = [
+            models.Index(fields=["status", "data_vencimento"], name="fatura_status_venc_idx"),
+            # vencidas: em aberto por vencimento
+            models.Index(fields=["data_vencimento"], condition=~models.Q(status="PAGO"), name="fatura_aberta_venc_idx"),
+            models.Index(fields=["data_emissao"], name="fatura_emissao_idx"),
+        ]
 
 
     def gerar_recibo_automatico(self):
@@ -348,7 +535,9 @@ class Fatura(StatusMixin):
         if not self.recibo_gerado and self.status =="PAGO" and self.email_destinatario:
             self.recibo_gerado = True
             self.save(update_fields=["recibo_gerado"])
-            enviar_alerta_email.delay("fatura", self.pk)
+            EventoOutbox.objects.registar(
+                "financeiro.tasks.enviar_recibos_individual", "fatura", self.pk, chave=f"recibo:fatura:{self.pk}"
+            )
 
     def clean(self):
         if self.data_emissao > date.today():
@@ -358,12 +547,18 @@ class Fatura(StatusMixin):
         if self.valor < 0:
             raise ValidationError("O valor da fatura nao pode ser negativo")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # guarda o status lido para o save comparar sem voltar a base
+        fatura = super().from_db(db, field_names, values)
+        fatura._status_original = fatura.__dict__.get("status")
+        return fatura
+
     def save(self, *args, **kwargs):
-        status_ant = None
-        if self.pk:
-            status_ant = Fatura.objects.get(pk=self.pk).status
+        status_ant = getattr(self, "_status_original", None)
 
         super().save(*args, **kwargs)
+        self._status_original = self.status
 
         if self.status == "PAGO" and not self.recibo_gerado and status_ant != "PAGO":
             self.gerar_recibo_automatico()
@@ -384,7 +579,8 @@ class AlertaEnviado(TimestampMixin, models.Model):
     STATUS_CHOICES = [
         ("ENVIADO", "Enviado"),
         ("FALHA NO ENVIO", "Falha no envio"),
-        ("PENDENTE", "Pendente")
+        ("PENDENTE", "Pendente"),
+        ("A ENVIAR", "A enviar"),  # reservado por um despachante (despachar_alertas)
     ]
 
     encarregado = models.ForeignKey(Encarregado,on_delete=models.CASCADE, related_name='alerta_enviados')
@@ -399,6 +595,14 @@ class AlertaEnviado(TimestampMixin, models.Model):
 
     class Meta:
         ordering = ["-enviado_em"]
+        indexes = [
+            # cursor da listagem de alertas (CursorPaginacao)
+            models.Index(fields=["-enviado_em", "-id"], name="alerta_cursor_idx"),
+            # fila do despacho assincrono (despachar_alertas)
+            models.Index(fields=["id"], condition=models.Q(status="PENDENTE"), name="alerta_pendentes_idx"),
+            # reservas de despachantes interrompidos (libertar_reservas)
+            models.Index(fields=["data_atualizacao"], condition=models.Q(status="A ENVIAR"), name="alerta_a_enviar_idx"),
+        ]
 
     def clean(self):
         if not self.email:
@@ -411,3 +615,172 @@ class AlertaEnviado(TimestampMixin, models.Model):
     def __str__(self):
         # return f"{self.eviado_em.strftime('%d/%m/%Y %H:%M')}"
         return f"Alerta {self.status} - {self.encarregado.user.email} ({self.alunos.count()} alunos)"
+
+
+class ResumoMensal(models.Model):
+    """Totais pre-agregados das mensalidades por mes de referencia, rota e escola"""
+    mes_referente = models.DateField(db_index=True)
+    rota = models.ForeignKey(Rota, on_delete=models.CASCADE, null=True, blank=True, related_name="resumos_mensais")
+    escola = models.CharField(max_length=255, blank=True, default="")
+    quantidade = models.PositiveIntegerField(default=0)
+    quantidade_pagas = models.PositiveIntegerField(default=0)
+    quantidade_atrasadas = models.PositiveIntegerField(default=0)
+    faturado = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    recebido = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    em_aberto = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    atrasado = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-mes_referente"]
+        verbose_name = "Resumo mensal"
+        verbose_name_plural = "Resumos mensais"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["mes_referente", "rota", "escola"], condition=models.Q(rota__isnull=False),
+                name="resumo_mensal_unico_por_rota",
+            ),
+            models.UniqueConstraint(
+                fields=["mes_referente", "escola"], condition=models.Q(rota__isnull=True),
+                name="resumo_mensal_unico_sem_rota",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.mes_referente:%m/%Y} - {self.rota or 'Sem rota'} - {self.escola or 'Sem escola'}"
+
+
+class EventoOutbox(models.Model):
+    """Efeito secundario (task celery) gravado na mesma transacao da escrita que o origina.
+    O relay (financeiro.outbox) envia os pendentes ao broker em lote e marca-os como processados."""
+    tarefa = models.CharField(max_length=200, help_text="Nome da task celery")
+    args = models.JSONField(default=list, blank=True)
+    chave = models.CharField(max_length=200, unique=True, null=True, blank=True, help_text="Chave de idempotencia")
+    criado_em = models.DateTimeField(auto_now_add=True)
+    processado_em = models.DateTimeField(null=True, blank=True)
+    tentativas = models.PositiveIntegerField(default=0)
+    erro = models.TextField(blank=True, default="")
+
+    objects = EventoOutboxManager()
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name = "Evento do outbox"
+        verbose_name_plural = "Eventos do outbox"
+        indexes = [
+            models.Index(fields=["id"], condition=models.Q(processado_em__isnull=True), name="outbox_pendentes_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.tarefa}{tuple(self.args)} - {'processado' if self.processado_em else 'pendente'}"
+
+
+class CallbackPagamento(models.Model):
+    """Callback de pagamento por carteira movel tal como foi recebido (staging).
+    O endpoint so grava aqui; os pagamentos sao criados em lote por financeiro.callbacks."""
+    ESTADO_CHOICES = [("PENDENTE", "Pendente"), ("PROCESSADO", "Processado"), ("REJEITADO", "Rejeitado")]
+
+    fornecedor = models.CharField(max_length=10, choices=FORNECEDORES_CARTEIRA)
+    transacao_id = models.CharField(max_length=100, help_text="Id da transacao no fornecedor")
+    payload = models.JSONField()
+    recebido_em = models.DateTimeField(auto_now_add=True)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default="PENDENTE")
+    processado_em = models.DateTimeField(null=True, blank=True)
+    erro = models.TextField(blank=True, default="")
+
+    objects = CallbackPagamentoManager()
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name = "Callback de pagamento"
+        verbose_name_plural = "Callbacks de pagamento"
+        constraints = [
+            models.UniqueConstraint(fields=["fornecedor", "transacao_id"], name="callback_transacao_unica"),
+        ]
+        indexes = [
+            models.Index(fields=["id"], condition=models.Q(estado="PENDENTE"), name="callback_pendentes_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_fornecedor_display()} {self.transacao_id} ({self.estado})"
+
+
+class MovimentoConta(models.Model):
+    """Livro razao (so de insercao) dos debitos e creditos de cada aluno/encarregado.
+    valor > 0 e debito (mensalidade, multa), valor < 0 e credito (pagamento)."""
+    TIPO_CHOICES = [("MENSALIDADE", "Mensalidade"), ("MULTA", "Multa"), ("PAGAMENTO", "Pagamento")]
+    NATUREZA_CHOICES = [("LANCAMENTO", "Lancamento"), ("AJUSTE", "Ajuste"), ("ESTORNO", "Estorno")]
+
+    # sem FK na base: o historico sobrevive a remocao da origem
+    encarregado = models.ForeignKey(
+        'alunos.Encarregado', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    aluno = models.ForeignKey('alunos.Aluno', on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    mensalidade = models.ForeignKey(Mensalidade, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    pagamento = models.ForeignKey(
+        Pagamento, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    tipo = models.CharField(max_length=12, choices=TIPO_CHOICES)
+    natureza = models.CharField(max_length=10, choices=NATUREZA_CHOICES, default="LANCAMENTO")
+    valor = models.DecimalField(max_digits=12, decimal_places=2)
+    data = models.DateField(help_text="Data efetiva (vencimento ou data do pagamento)")
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    objects = MovimentoContaQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name = "Movimento da conta"
+        verbose_name_plural = "Movimentos da conta"
+        indexes = [
+            models.Index(fields=["aluno", "id"], name="movimento_aluno_idx"),
+            models.Index(fields=["encarregado", "id"], name="movimento_encarregado_idx"),
+            # extrato do encarregado: movimentos por (data, id)
+            models.Index(fields=["encarregado", "data", "id"], name="movimento_extrato_idx"),
+            models.Index(fields=["mensalidade", "tipo"], name="movimento_mensalidade_idx"),
+            models.Index(fields=["pagamento"], name="movimento_pagamento_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValidationError("Os movimentos da conta nao podem ser alterados.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError("Os movimentos da conta nao podem ser apagados.")
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.valor:.2f} ({self.data:%d/%m/%Y})"
+
+
+class SaldoConta(models.Model):
+    """Saldo de uma conta (aluno ou encarregado) ate ao movimento ultimo_movimento, inclusive.
+    O saldo atual e o ultimo snapshot mais os movimentos posteriores."""
+    encarregado = models.ForeignKey(
+        'alunos.Encarregado', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    aluno = models.ForeignKey(
+        'alunos.Aluno', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    ultimo_movimento = models.BigIntegerField()
+    saldo = models.DecimalField(max_digits=14, decimal_places=2)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-ultimo_movimento"]
+        verbose_name = "Saldo da conta"
+        verbose_name_plural = "Saldos das contas"
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(aluno__isnull=True, encarregado__isnull=False) | models.Q(aluno__isnull=False, encarregado__isnull=True),
+                name="saldo_conta_aluno_ou_encarregado",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["aluno", "-ultimo_movimento"], name="saldo_aluno_idx"),
+            models.Index(fields=["encarregado", "-ultimo_movimento"], name="saldo_encarregado_idx"),
+        ]
+
+    def __str__(self):
+        conta = f"aluno {self.aluno_id}" if self.aluno_id else f"encarregado {self.encarregado_id}"
+        return f"Saldo {conta}: {self.saldo:.2f} (ate #{self.ultimo_movimento})"
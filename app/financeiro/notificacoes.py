@@ -0,0 +1,165 @@
+"""Criacao e envio em lote dos alertas por email"""
+import time
+from collections import Counter
+from datetime import timedelta
+from itertools import groupby
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import Case, When, Value
+from django.utils import timezone
+from financeiro.models import AlertaEnviado, Mensalidade
+from financeiro.referencias import referencia_familia
+
+
+class LimiteTaxa:
+    """Espaca os envios para nao ultrapassar `por_segundo` mensagens por segundo (0 = sem limite)"""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo else 0
+        self.proximo = time.monotonic()
+
+    def aguardar(self):
+        if not self.intervalo:
+            return
+        agora = time.monotonic()
+        if self.proximo > agora:
+            time.sleep(self.proximo - agora)
+            agora = self.proximo
+        self.proximo = agora + self.intervalo
+
+
+def mensagem_alerta(alerta, connection=None):
+    return EmailMessage(
+        f"Alerta de {alerta.get_tipo_display()}",
+        alerta.mensagem,
+        settings.DEFAULT_FROM_EMAIL,
+        [alerta.email],
+        connection=connection,
+    )
+
+
+def registar_resultado(enviados, falhas):
+    """Um unico UPDATE para os estados ENVIADO / FALHA NO ENVIO de um lote"""
+    if not enviados and not falhas:
+        return 0
+    return AlertaEnviado.objects.filter(pk__in=[*enviados, *falhas]).update(
+        status=Case(
+            When(pk__in=falhas, then=Value("FALHA NO ENVIO")),
+            default=Value("ENVIADO"),
+        )
+    )
+
+
+def enviar_alertas(alerta_ids, batch_size=200, por_segundo=None):
+    """Envia os alertas por uma unica ligacao ao backend de email, respeitando o limite de taxa.
+    Retorna {"enviados": n, "falhas": n}."""
+    if por_segundo is None:
+        por_segundo = settings.FINANCEIRO_EMAILS_POR_SEGUNDO
+    limite = LimiteTaxa(por_segundo)
+    alerta_ids = sorted(set(alerta_ids))
+    total = {"enviados": 0, "falhas": 0}
+
+    connection = get_connection(fail_silently=False)
+    connection.open()
+    try:
+        for inicio in range(0, len(alerta_ids), batch_size):
+            lote = alerta_ids[inicio:inicio + batch_size]
+            # os que um despachante (despachar_alertas) tem reservados sao enviados por ele
+            alertas = AlertaEnviado.objects.filter(pk__in=lote).exclude(status="A ENVIAR").only("pk", "tipo", "email", "mensagem")
+            enviados, falhas = [], []
+            for alerta in alertas:
+                if not alerta.email:
+                    falhas.append(alerta.pk)
+                    continue
+                limite.aguardar()
+                try:
+                    connection.send_messages([mensagem_alerta(alerta, connection)])
+                except Exception:
+                    falhas.append(alerta.pk)
+                    # a ligacao pode ter ficado num estado invalido apos o erro
+                    connection.close()
+                    connection.open()
+                else:
+                    enviados.append(alerta.pk)
+            registar_resultado(enviados, falhas)
+            total["enviados"] += len(enviados)
+            total["falhas"] += len(falhas)
+    finally:
+        connection.close()
+    return total
+
+
+def _mensagem_resumo(nome, itens):
+    linhas = [f"Ola {nome},", "", "As seguintes mensalidades estao em atraso:"]
+    for m in itens:
+        linhas.append(
+            f"- {m.aluno.nome} ({m.mes_referente:%m/%Y}): {m.valor_atualizado - m.total_pago:.2f} MZN"
+            f" - referencia {m.referencia}"
+        )
+    total = sum(m.valor_atualizado - m.total_pago for m in itens)
+    linhas += ["", f"Total em divida: {total:.2f} MZN"]
+
+    # com varios alunos no mesmo mes, uma unica referencia paga todas as mensalidades desse mes
+    por_mes = Counter(m.mes_referente for m in itens)
+    encarregado_id = itens[0].aluno.encarregado_id
+    for mes in sorted(m for m, quantidade in por_mes.items() if quantidade > 1):
+        em_divida = sum(m.valor_atualizado - m.total_pago for m in itens if m.mes_referente == mes)
+        linhas.append(
+            f"Para pagar todas as mensalidades de {mes:%m/%Y} ({em_divida:.2f} MZN) use a referencia "
+            f"{referencia_familia(encarregado_id, mes)}"
+        )
+    linhas += ["", "Indique a referencia na descricao da transferencia ou do pagamento M-Pesa/e-Mola."]
+    return "\n".join(linhas)
+
+
+def criar_resumos_atraso(janela=None):
+    """Agrupa as mensalidades em atraso por encarregado e cria um unico alerta ATRASO (resumo)
+    por encarregado, com todos os alunos afetados. Encarregados que ja receberam um alerta de
+    atraso dentro da janela sao ignorados. Retorna os ids dos alertas criados."""
+    if janela is None:
+        janela = timedelta(hours=settings.FINANCEIRO_ALERTA_JANELA_HORAS)
+    recentes = AlertaEnviado.objects.filter(
+        tipo="ATRASO", enviado_em__gte=timezone.now() - janela,
+    ).values("encarregado_id")
+
+    atrasadas = (
+        Mensalidade.objects.atrasadas().com_calculos()
+        .prefetch_related(None).select_related("aluno__encarregado__user")
+        .filter(aluno__encarregado__isnull=False)
+        .exclude(aluno__encarregado_id__in=recentes)
+        .order_by("aluno__encarregado_id", "aluno__nome", "mes_referente")
+    )
+
+    grupos = [(encarregado_id, list(itens)) for encarregado_id, itens in groupby(atrasadas, key=lambda m: m.aluno.encarregado_id)]
+    if not grupos:
+        return []
+    alertas = [
+        AlertaEnviado(
+            encarregado_id=encarregado_id,
+            email=itens[0].aluno.encarregado.user.email,
+            mensagem=_mensagem_resumo(itens[0].aluno.encarregado.user.nome, itens),
+            tipo="ATRASO",
+            status="PENDENTE",
+        )
+        for encarregado_id, itens in grupos
+    ]
+    Relacao = AlertaEnviado.alunos.through
+    with transaction.atomic():
+        inicio = timezone.now()
+        AlertaEnviado.objects.bulk_create(alertas, batch_size=1000)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # sem RETURNING (ex: SQLite) os ids sao lidos de volta: um alerta novo por encarregado
+            ids = dict(
+                AlertaEnviado.objects.filter(
+                    tipo="ATRASO", status="PENDENTE", enviado_em__gte=inicio, encarregado_id__in=[a.encarregado_id for a in alertas],
+                ).values_list("encarregado_id", "pk")
+            )
+            for alerta in alertas:
+                alerta.pk = ids[alerta.encarregado_id]
+        Relacao.objects.bulk_create([
+            Relacao(alertaenviado_id=alerta.pk, aluno_id=aluno_id)
+            for alerta, (_, itens) in zip(alertas, grupos)
+            for aluno_id in {m.aluno_id for m in itens}
+        ], batch_size=1000)
+    return [alerta.pk for alerta in alertas]
@@ -0,0 +1,72 @@
+"""Relay do outbox: envia ao broker, em lote, as tasks gravadas por EventoOutbox"""
+from contextlib import nullcontext
+from datetime import timedelta
+from celery import current_app
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from financeiro.models import EventoOutbox
+
+
+def _produtor(app):
+    """Um unico produtor (uma ligacao ao broker) para todo o lote; em modo eager nao ha broker"""
+    if app.conf.task_always_eager:
+        return nullcontext(None)
+    return app.producer_or_acquire()
+
+
+def despachar_outbox(batch_size=500, max_lotes=None):
+    """Drena o outbox em lotes. As linhas sao bloqueadas com skip_locked (varios relays podem
+    correr em paralelo) e marcadas como processadas na mesma transacao do envio. Se o broker
+    falhar, o evento fica pendente com o erro registado e o lote termina.
+    Retorna {"enviados": n, "falhas": n}."""
+    app = current_app
+    total = {"enviados": 0, "falhas": 0}
+    lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        lotes += 1
+        with transaction.atomic():
+            eventos = list(
+                EventoOutbox.objects.pendentes().select_for_update(skip_locked=True).order_by("pk")[:batch_size]
+            )
+            if not eventos:
+                break
+
+            enviados, desconhecidos, falha = [], [], None
+            with _produtor(app) as produtor:
+                for evento in eventos:
+                    tarefa = app.tasks.get(evento.tarefa)
+                    if tarefa is None:
+                        desconhecidos.append(evento.pk)
+                        continue
+                    try:
+                        tarefa.apply_async(args=evento.args, producer=produtor)
+                    except Exception as e:
+                        falha = (evento.pk, str(e))
+                        break
+                    enviados.append(evento.pk)
+
+            agora = timezone.now()
+            EventoOutbox.objects.filter(pk__in=enviados).update(
+                processado_em=agora, tentativas=F("tentativas") + 1, erro="",
+            )
+            # uma task inexistente nunca sera enviada: fecha o evento com o erro para nao bloquear a fila
+            EventoOutbox.objects.filter(pk__in=desconhecidos).update(
+                processado_em=agora, tentativas=F("tentativas") + 1, erro="Task desconhecida",
+            )
+            if falha:
+                EventoOutbox.objects.filter(pk=falha[0]).update(tentativas=F("tentativas") + 1, erro=falha[1])
+
+        total["enviados"] += len(enviados)
+        if falha:
+            total["falhas"] += 1
+            break
+        if len(eventos) < batch_size:
+            break
+    return total
+
+
+def limpar_outbox(dias=7):
+    """Remove os eventos processados ha mais de `dias` dias"""
+    limite = timezone.now() - timedelta(days=dias)
+    return EventoOutbox.objects.filter(processado_em__lt=limite).delete()[0]
@@ -0,0 +1,209 @@
+"""Particionamento mensal (PostgreSQL, opcional) das tabelas que so crescem: Pagamento e AlertaEnviado.
+
+A conversao e explicita (comando particoes_mensais --converter) e mantem o nome da tabela, por
+isso os models continuam a funcionar sem alteracoes. A chave primaria passa a (id, coluna da
+particao) e as FKs de outras tabelas para a tabela convertida sao removidas, porque o
+PostgreSQL so as aceita com uma chave unica que inclua a coluna da particao (as remocoes em
+cascata continuam a ser feitas pelo ORM). Depois, manter() cria as particoes dos meses
+seguintes e desanexa as antigas, que podem ser arquivadas ou apagadas com um DROP TABLE.
+So os alertas sao desanexados: os totais das mensalidades sao somas dos pagamentos
+(recalcular_totais), que perderiam os das particoes desanexadas.
+"""
+import re
+from datetime import date, datetime
+from dateutil.relativedelta import relativedelta
+from django.db import connection, transaction
+from django.utils import timezone
+from financeiro.models import Pagamento, AlertaEnviado
+
+# nome curto -> (model, coluna da particao)
+TABELAS = {
+    "pagamento": (Pagamento, "data_pagamento"),
+    "alerta": (AlertaEnviado, "enviado_em"),
+}
+# tabelas cujas particoes antigas podem sair da tabela (os pagamentos entram nos totais)
+DESANEXAVEIS = ("alerta",)
+
+
+def _q(nome):
+    return connection.ops.quote_name(nome)
+
+
+def disponivel():
+    return connection.vendor == "postgresql"
+
+
+def inicio_mes(valor):
+    """Primeiro instante do mes (no fuso horario do projeto) de uma data ou datetime"""
+    if isinstance(valor, datetime):
+        valor = timezone.localtime(valor).date()
+    return timezone.make_aware(datetime(valor.year, valor.month, 1))
+
+
+def nome_particao(tabela, mes):
+    return f"{tabela}_p{mes:%Y%m}"
+
+
+def particionada(tabela):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_class WHERE relname = %s AND relkind = 'p'", [tabela])
+        return cursor.fetchone() is not None
+
+
+def particoes(tabela):
+    """Particoes mensais anexadas: [(nome, primeiro dia do mes)], por ordem"""
+    padrao = re.compile(rf"^{re.escape(tabela)}_p(\d{{4}})(\d{{2}})$")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s",
+            [tabela],
+        )
+        nomes = [linha[0] for linha in cursor.fetchall()]
+    encontradas = []
+    for nome in nomes:
+        correspondencia = padrao.match(nome)
+        if correspondencia:
+            encontradas.append((nome, inicio_mes(date(int(correspondencia[1]), int(correspondencia[2]), 1))))
+    return sorted(encontradas, key=lambda particao: particao[1])
+
+
+def _existe(nome):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_class WHERE relname = %s", [nome])
+        return cursor.fetchone() is not None
+
+
+def criar_particoes(tabela, desde, ate):
+    """Cria (se nao existirem) as particoes mensais de `desde` ate `ate`, inclusive. As linhas do
+    mes que estejam na particao DEFAULT passam para a particao nova (o PostgreSQL recusa criar
+    a particao se a DEFAULT tiver linhas do mesmo intervalo). Retorna os nomes criados.
+    Chamar dentro de uma transacao."""
+    existentes = {nome for nome, _ in particoes(tabela)}
+    padrao = tabela + "_default"
+    coluna = next((coluna for modelo, coluna in TABELAS.values() if modelo._meta.db_table == tabela), None)
+    mover = coluna is not None and _existe(padrao)
+    criadas = []
+    mes, ultimo = inicio_mes(desde), inicio_mes(ate)
+    with connection.cursor() as cursor:
+        while mes <= ultimo:
+            nome = nome_particao(tabela, mes)
+            if nome not in existentes:
+                intervalo = [mes, mes + relativedelta(months=1)]
+                movidas = False
+                if mover:
+                    cursor.execute(
+                        f"SELECT EXISTS (SELECT 1 FROM {_q(padrao)} WHERE {_q(coluna)} >= %s AND {_q(coluna)} < %s)", intervalo,
+                    )
+                    movidas = cursor.fetchone()[0]
+                if movidas:
+                    temporaria = f"{nome}_mover"
+                    cursor.execute(
+                        f"CREATE TEMPORARY TABLE {_q(temporaria)} AS WITH linhas AS ("
+                        f"DELETE FROM {_q(padrao)} WHERE {_q(coluna)} >= %s AND {_q(coluna)} < %s RETURNING *"
+                        f") SELECT * FROM linhas",
+                        intervalo,
+                    )
+                cursor.execute(
+                    f"CREATE TABLE {_q(nome)} PARTITION OF {_q(tabela)} FOR VALUES FROM (%s) TO (%s)", intervalo,
+                )
+                if movidas:
+                    cursor.execute(f"INSERT INTO {_q(tabela)} SELECT * FROM {_q(temporaria)}")
+                    cursor.execute(f"DROP TABLE {_q(temporaria)}")
+                criadas.append(nome)
+            mes += relativedelta(months=1)
+    return criadas
+
+
+def desanexar_particoes(tabela, antes_de, apagar=False):
+    """Desanexa as particoes de meses anteriores a `antes_de` (e apaga-as se `apagar`). Retorna os nomes."""
+    limite = inicio_mes(antes_de)
+    antigas = [nome for nome, mes in particoes(tabela) if mes < limite]
+    with connection.cursor() as cursor:
+        for nome in antigas:
+            cursor.execute(f"ALTER TABLE {_q(tabela)} DETACH PARTITION {_q(nome)}")
+            if apagar:
+                cursor.execute(f"DROP TABLE {_q(nome)}")
+    return antigas
+
+
+@transaction.atomic
+def converter(nome, meses_futuros=3):
+    """Converte a tabela numa tabela particionada por mes, copiando os dados (bloqueia a tabela
+    durante a copia: correr numa janela de manutencao). Retorna o numero de particoes criadas."""
+    modelo, coluna = TABELAS[nome]
+    tabela, antiga = modelo._meta.db_table, f"{modelo._meta.db_table}_antiga"
+    if particionada(tabela):
+        return 0
+
+    with connection.cursor() as cursor:
+        # verificacoes de FK adiadas na transacao impediriam o DROP da tabela antiga
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f"LOCK TABLE {_q(tabela)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"SELECT min({_q(coluna)}) FROM {_q(tabela)}")
+        primeiro = cursor.fetchone()[0] or timezone.now()
+
+        # FKs de outras tabelas para esta (ex: alertas <-> alunos) nao sao suportadas
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE contype = 'f' AND confrelid = %s::regclass",
+            [tabela],
+        )
+        for referente, restricao in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {referente} DROP CONSTRAINT {_q(restricao)}")
+        # FKs e indices proprios sao recriados na tabela nova
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE contype = 'f' AND conrelid = %s::regclass",
+            [tabela],
+        )
+        chaves_estrangeiras = cursor.fetchall()
+        cursor.execute(
+            "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = %s::regclass AND NOT x.indisprimary",
+            [tabela],
+        )
+        indices = cursor.fetchall()
+
+        cursor.execute(f"ALTER TABLE {_q(tabela)} RENAME TO {_q(antiga)}")
+        for indice, _ in indices:
+            cursor.execute(f"DROP INDEX {_q(indice)}")
+        cursor.execute(
+            f"CREATE TABLE {_q(tabela)} (LIKE {_q(antiga)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE ({_q(coluna)})"
+        )
+        cursor.execute(f"ALTER TABLE {_q(tabela)} ADD PRIMARY KEY (id, {_q(coluna)})")
+        # a sequencia do id passa a pertencer a tabela nova (senao o DROP da antiga apaga-a)
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [antiga])
+        sequencia = cursor.fetchone()[0]
+        if sequencia:
+            cursor.execute(f"ALTER SEQUENCE {sequencia} OWNED BY {_q(tabela)}.id")
+
+        criadas = criar_particoes(tabela, primeiro, timezone.now() + relativedelta(months=meses_futuros))
+        cursor.execute(f"CREATE TABLE {_q(tabela + '_default')} PARTITION OF {_q(tabela)} DEFAULT")
+        cursor.execute(f"INSERT INTO {_q(tabela)} SELECT * FROM {_q(antiga)}")
+        for restricao, definicao in chaves_estrangeiras:
+            cursor.execute(f"ALTER TABLE {_q(tabela)} ADD CONSTRAINT {_q(restricao)} {definicao}")
+        for _, definicao in indices:
+            cursor.execute(definicao)
+        cursor.execute(f"DROP TABLE {_q(antiga)}")
+    return len(criadas)
+
+
+def manter(meses_futuros=3, reter_meses=None, apagar=False):
+    """Cria as particoes dos proximos meses e, com reter_meses, desanexa as mais antigas das
+    tabelas em DESANEXAVEIS. Ignora as tabelas que nao estao particionadas.
+    Retorna {tabela: {"criadas": [...], "desanexadas": [...]}}."""
+    resultado = {}
+    if not disponivel():
+        return resultado
+    agora = timezone.now()
+    for nome, (modelo, _) in TABELAS.items():
+        tabela = modelo._meta.db_table
+        if not particionada(tabela):
+            continue
+        with transaction.atomic():
+            criadas = criar_particoes(tabela, agora, agora + relativedelta(months=meses_futuros))
+            desanexadas = []
+            if reter_meses and nome in DESANEXAVEIS:
+                desanexadas = desanexar_particoes(tabela, agora - relativedelta(months=reter_meses), apagar=apagar)
+        resultado[tabela] = {"criadas": criadas, "desanexadas": desanexadas}
+    return resultado
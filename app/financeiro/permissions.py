@@ -0,0 +1,14 @@
+import hmac
+from django.conf import settings
+from rest_framework import permissions
+
+
+class TokenCallback(permissions.BasePermission):
+    """
+    Autentica os callbacks dos fornecedores de carteira movel pelo token partilhado
+    (cabecalho X-Callback-Token). Sem token configurado os callbacks sao recusados.
+    """
+    def has_permission(self, request, view):
+        token = settings.FINANCEIRO_CALLBACK_TOKEN
+        recebido = request.headers.get("X-Callback-Token", "")
+        return bool(token) and hmac.compare_digest(recebido.encode(), token.encode())
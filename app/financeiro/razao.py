@@ -0,0 +1,180 @@
+"""Livro razao das contas de alunos e encarregados.
+
+Cada origem (mensalidade, multa, pagamento) e sincronizada por diferenca: compara-se o valor
+esperado com o total ja lancado para a mesma origem e conta e grava-se so o delta, como
+lancamento, ajuste ou estorno. As funcoes sao idempotentes e nunca alteram movimentos antigos.
+O saldo atual de uma conta e o ultimo SaldoConta mais os movimentos posteriores.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Max, Sum, OuterRef, Subquery
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from alunos.models import Aluno, Encarregado
+from financeiro.models import Mensalidade, Pagamento, MovimentoConta, SaldoConta
+
+ZERO = Decimal("0.00")
+# chave de uma conta/origem nos movimentos
+CAMPOS_CHAVE = ("mensalidade_id", "pagamento_id", "aluno_id", "encarregado_id")
+
+
+def _lancados(tipo, **filtro):
+    """Total ja lancado por origem e conta"""
+    linhas = (
+        MovimentoConta.objects.filter(tipo=tipo, **filtro).order_by()
+        .values(*CAMPOS_CHAVE).annotate(total=Sum("valor")).values_list(*CAMPOS_CHAVE, "total")
+    )
+    return {linha[:-1]: linha[-1] for linha in linhas}
+
+
+def _movimentos(tipo, esperados, lancados, datas):
+    """Movimentos (por gravar) que levam o total lancado de cada chave ao valor esperado"""
+    novos = []
+    for chave in esperados.keys() | lancados.keys():
+        esperado, lancado = esperados.get(chave, ZERO), lancados.get(chave, ZERO)
+        delta = esperado - lancado
+        if not delta:
+            continue
+        if not lancado:
+            natureza = "LANCAMENTO"
+        elif not esperado:
+            natureza = "ESTORNO"
+        else:
+            natureza = "AJUSTE"
+        mensalidade_id, pagamento_id, aluno_id, encarregado_id = chave
+        novos.append(MovimentoConta(
+            tipo=tipo, natureza=natureza, valor=delta, data=datas.get(chave[:2], timezone.localdate()),
+            mensalidade_id=mensalidade_id, pagamento_id=pagamento_id, aluno_id=aluno_id, encarregado_id=encarregado_id,
+        ))
+    return novos
+
+
+def lancar_mensalidades(ids):
+    """Debito do valor de cada mensalidade (estorno se foi removida, ajuste se o valor mudou)"""
+    ids = list(ids)
+    esperados, datas = {}, {}
+    for pk, aluno_id, encarregado_id, valor, vencimento in Mensalidade.objects.filter(pk__in=ids).values_list(
+        "id", "aluno_id", "aluno__encarregado_id", "valor", "data_vencimento",
+    ):
+        esperados[(pk, None, aluno_id, encarregado_id)] = valor
+        datas[(pk, None)] = vencimento
+    novos = _movimentos("MENSALIDADE", esperados, _lancados("MENSALIDADE", mensalidade_id__in=ids), datas)
+    return MovimentoConta.objects.bulk_create(novos)
+
+
+def lancar_multas(ids=None, hoje=None):
+    """Debito da multa segundo as regras da mensalidade: nas atrasadas, valor_atualizado - valor;
+    nas pagas, o que foi pago acima do valor; nas restantes nada (a multa lancada e estornada).
+    Sem ids, percorre as mensalidades atrasadas (varredura diaria)."""
+    hoje = hoje or timezone.localdate()
+    mensalidades = Mensalidade.objects.filter(pk__in=ids) if ids is not None else Mensalidade.objects.atrasadas()
+    linhas = mensalidades.com_calculos(hoje).select_related(None).prefetch_related(None).values_list(
+        "id", "aluno_id", "aluno__encarregado_id", "status", "valor", "total_pago", "_valor_atualizado",
+    )
+    esperados = {}
+    for pk, aluno_id, encarregado_id, status, valor, total_pago, valor_atualizado in linhas:
+        if status == "ATRASADO":
+            multa = valor_atualizado - valor
+        elif status == "PAGO":
+            multa = max(total_pago - valor, ZERO)
+        else:
+            multa = ZERO
+        esperados[(pk, None, aluno_id, encarregado_id)] = multa.quantize(ZERO)
+    lancados = _lancados("MULTA", mensalidade_id__in=ids if ids is not None else mensalidades.values("id"))
+    novos = _movimentos("MULTA", esperados, lancados, {})
+    return MovimentoConta.objects.bulk_create(novos)
+
+
+def lancar_pagamentos(ids):
+    """Credito de cada pagamento na conta da mensalidade atual; se foi editado ou removido, o
+    lancamento antigo e estornado/ajustado com novos movimentos"""
+    ids = list(ids)
+    esperados, datas = {}, {}
+    for pk, mensalidade_id, aluno_id, encarregado_id, valor, data in (
+        Pagamento.objects.filter(pk__in=ids)
+        .annotate(dia=TruncDate("data_pagamento"))
+        .values_list("id", "mensalidade_id", "mensalidade__aluno_id", "mensalidade__aluno__encarregado_id", "valor", "dia")
+    ):
+        esperados[(mensalidade_id, pk, aluno_id, encarregado_id)] = -valor
+        datas[(mensalidade_id, pk)] = data
+    novos = _movimentos("PAGAMENTO", esperados, _lancados("PAGAMENTO", pagamento_id__in=ids), datas)
+    return MovimentoConta.objects.bulk_create(novos)
+
+
+def lancar_em_lotes(lancar, queryset, batch_size=1000):
+    """Aplica uma funcao do livro razao (lancar_mensalidades, ...) aos ids do queryset, por lotes"""
+    ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+    for inicio in range(0, len(ids), batch_size):
+        lancar(ids[inicio:inicio + batch_size])
+    return len(ids)
+
+
+def saldo(encarregado=None, aluno=None):
+    """Saldo atual (positivo = em divida) de um aluno ou encarregado: ultimo snapshot mais os
+    movimentos posteriores. Custa duas queries indexadas, qualquer que seja a idade da conta."""
+    if (encarregado is None) == (aluno is None):
+        raise ValueError("Indique o aluno ou o encarregado")
+    conta = {"aluno_id": aluno} if aluno is not None else {"encarregado_id": encarregado}
+    snapshot = SaldoConta.objects.filter(**conta).order_by("-ultimo_movimento").values_list("saldo", "ultimo_movimento").first()
+    base, ultimo = snapshot or (ZERO, 0)
+    cauda = MovimentoConta.objects.filter(id__gt=ultimo, **conta).aggregate(total=Sum("valor"))["total"]
+    return base + (cauda or ZERO)
+
+
+def _saldos_anteriores(modelo, campo, ids):
+    ultimo = SaldoConta.objects.filter(**{campo: OuterRef("pk")}).order_by("-ultimo_movimento").values("saldo")[:1]
+    return dict(modelo.objects.filter(pk__in=ids).annotate(anterior=Subquery(ultimo)).values_list("pk", "anterior"))
+
+
+def _transacoes_terminadas(espera, intervalo=0.5):
+    """Em PostgreSQL, espera ate `espera` segundos que terminem as transacoes abertas neste momento.
+    Um movimento com id abaixo do limite pode ser de uma delas e so ficar visivel depois do fecho,
+    que o saltaria para sempre. Retorna False se alguma continuar aberta."""
+    if connection.vendor != "postgresql":
+        return True
+    fim = time.monotonic() + espera
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_current_snapshot()::text")
+        instantaneo = cursor.fetchone()[0]
+        while True:
+            cursor.execute(
+                "SELECT count(*) FROM pg_snapshot_xip(%s::pg_snapshot) AS xid WHERE pg_xact_status(xid) = 'in progress'",
+                [instantaneo],
+            )
+            if not cursor.fetchone()[0]:
+                return True
+            if time.monotonic() >= fim:
+                return False
+            time.sleep(intervalo)
+
+
+def fechar_saldos(margem=timedelta(minutes=5), batch_size=1000, espera=60):
+    """Grava um snapshot para cada conta com movimentos desde o ultimo fecho. O limite e o ultimo
+    movimento com mais de `margem` e so e usado depois de terminarem as transacoes que podiam ter
+    ids abaixo dele ainda por confirmar; se nao terminarem em `espera` segundos, nao fecha (o
+    fecho seguinte apanha o periodo). Retorna o numero de snapshots criados."""
+    limite = MovimentoConta.objects.filter(criado_em__lte=timezone.now() - margem).aggregate(m=Max("id"))["m"]
+    anterior = SaldoConta.objects.aggregate(m=Max("ultimo_movimento"))["m"] or 0
+    if not limite or limite <= anterior or not _transacoes_terminadas(espera):
+        return 0
+
+    periodo = MovimentoConta.objects.filter(id__gt=anterior, id__lte=limite).order_by()
+    criados = 0
+    # tudo ou nada: um fecho parcial faria o seguinte saltar as contas em falta
+    with transaction.atomic():
+        for campo, modelo in (("aluno_id", Aluno), ("encarregado_id", Encarregado)):
+            caudas = dict(
+                periodo.exclude(**{f"{campo}__isnull": True}).values(campo).annotate(total=Sum("valor")).values_list(campo, "total")
+            )
+            contas = list(caudas)
+            for inicio in range(0, len(contas), batch_size):
+                lote = contas[inicio:inicio + batch_size]
+                anteriores = _saldos_anteriores(modelo, campo.replace("_id", ""), lote)
+                SaldoConta.objects.bulk_create([
+                    SaldoConta(**{campo: conta}, ultimo_movimento=limite, saldo=(anteriores.get(conta) or ZERO) + caudas[conta])
+                    for conta in lote
+                ])
+                criados += len(lote)
+    return criados
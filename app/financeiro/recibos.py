@@ -0,0 +1,211 @@
+"""Geracao de recibos em PDF (reportlab) para Pagamento, Salario e Fatura.
+
+Os dados sao lidos da base em lote no processo principal e convertidos em dicts simples;
+a renderizacao nao toca na base e pode correr num pool de processos. Fontes e logotipo
+sao carregados uma unica vez por processo.
+"""
+import os
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+TIPOS = ("pagamento", "salario", "fatura")
+LOTE_MINIMO_PARALELO = 50
+
+
+def caminho_recibo(tipo, pk):
+    """Caminho relativo (a MEDIA_ROOT) e deterministico do recibo"""
+    return os.path.join("recibos", tipo, f"{pk // 1000:05d}", f"{tipo}-{pk}.pdf")
+
+
+@lru_cache(maxsize=None)
+def _recursos(fonte=None, logo=None):
+    """Regista a fonte TTF e le o logotipo uma vez por processo"""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.lib.utils import ImageReader
+
+    nome_fonte, nome_negrito = "Helvetica", "Helvetica-Bold"
+    if fonte:
+        pdfmetrics.registerFont(TTFont("ReciboFonte", fonte))
+        nome_fonte = nome_negrito = "ReciboFonte"
+    return {
+        "fonte": nome_fonte,
+        "negrito": nome_negrito,
+        "logo": ImageReader(logo) if logo else None,
+    }
+
+
+def _iniciar_processo(fonte, logo):
+    _recursos(fonte, logo)
+
+
+def renderizar_recibo(dados, fonte=None, logo=None):
+    """Desenha o recibo e grava-o em dados["caminho"] (escrita atomica). Retorna o caminho."""
+    from reportlab.lib.pagesizes import A5
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas
+
+    recursos = _recursos(fonte, logo)
+    largura, altura = A5
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A5, pageCompression=1)
+    pdf.setTitle(dados["titulo"])
+
+    y = altura - 20 * mm
+    if recursos["logo"]:
+        pdf.drawImage(recursos["logo"], 15 * mm, y - 8 * mm, width=25 * mm, height=15 * mm, preserveAspectRatio=True, mask="auto")
+    pdf.setFont(recursos["negrito"], 14)
+    pdf.drawRightString(largura - 15 * mm, y, dados["cabecalho"])
+    y -= 15 * mm
+    pdf.setFont(recursos["negrito"], 12)
+    pdf.drawString(15 * mm, y, dados["titulo"])
+    pdf.setFont(recursos["fonte"], 9)
+    pdf.drawRightString(largura - 15 * mm, y, f"N.o {dados['numero']}")
+    y -= 4 * mm
+    pdf.line(15 * mm, y, largura - 15 * mm, y)
+
+    y -= 10 * mm
+    for rotulo, valor in dados["linhas"]:
+        pdf.setFont(recursos["negrito"], 10)
+        pdf.drawString(15 * mm, y, f"{rotulo}:")
+        pdf.setFont(recursos["fonte"], 10)
+        pdf.drawString(55 * mm, y, str(valor))
+        y -= 7 * mm
+
+    y -= 5 * mm
+    pdf.setFont(recursos["negrito"], 13)
+    pdf.drawString(15 * mm, y, "Total:")
+    pdf.drawRightString(largura - 15 * mm, y, f"{dados['valor']} MZN")
+    pdf.setFont(recursos["fonte"], 8)
+    pdf.drawString(15 * mm, 12 * mm, f"Emitido em {dados['emitido_em']}")
+    pdf.showPage()
+    pdf.save()
+
+    os.makedirs(os.path.dirname(dados["caminho"]), exist_ok=True)
+    temporario = f"{dados['caminho']}.tmp"
+    with open(temporario, "wb") as ficheiro:
+        ficheiro.write(buffer.getvalue())
+    os.replace(temporario, dados["caminho"])
+    return dados["caminho"]
+
+
+def _renderizar(args):
+    return renderizar_recibo(*args)
+
+
+def carregar_dados(tipo, ids):
+    """Le em lote (uma query) os dados necessarios aos recibos e devolve dicts simples"""
+    from django.conf import settings
+    from django.utils import timezone
+    from financeiro.models import Pagamento, Salario, Fatura
+
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de recibo invalido: {tipo}")
+
+    emitido_em = timezone.localtime().strftime("%d/%m/%Y %H:%M")
+
+    def base(pk, titulo, destinatario, email, valor, linhas):
+        return {
+            "tipo": tipo,
+            "pk": pk,
+            "numero": f"{tipo[0].upper()}{pk:08d}",
+            "titulo": titulo,
+            "cabecalho": settings.FINANCEIRO_RECIBO_CABECALHO,
+            "destinatario": destinatario,
+            "email": email,
+            "valor": f"{valor:.2f}",
+            "linhas": linhas,
+            "emitido_em": emitido_em,
+            "caminho": os.path.join(settings.MEDIA_ROOT, caminho_recibo(tipo, pk)),
+        }
+
+    dados = []
+    if tipo == "pagamento":
+        pagamentos = Pagamento.objects.filter(pk__in=ids).select_related("mensalidade__aluno__encarregado__user")
+        for p in pagamentos:
+            aluno = p.mensalidade.aluno
+            encarregado = aluno.encarregado
+            user = encarregado.user if encarregado else None
+            dados.append(base(p.pk, "Recibo de pagamento de mensalidade", getattr(user, "nome", ""), getattr(user, "email", ""), p.valor, [
+                ("Aluno", aluno.nome),
+                ("Encarregado", getattr(user, "nome", "-")),
+                ("Mes de referencia", f"{p.mensalidade.mes_referente:%m/%Y}"),
+                ("Referencia", p.mensalidade.referencia or "-"),
+                ("Data do pagamento", timezone.localtime(p.data_pagamento).strftime("%d/%m/%Y")),
+                ("Metodo", p.get_metodo_pagamento_display()),
+            ]))
+    elif tipo == "salario":
+        for s in Salario.objects.filter(pk__in=ids).select_related("funcionario"):
+            data_pagamento = timezone.localtime(s.data_pagamento).strftime("%d/%m/%Y") if s.data_pagamento else "-"
+            dados.append(base(s.pk, "Recibo de salario", s.funcionario.nome, s.funcionario.email, s.valor, [
+                ("Funcionario", s.funcionario.nome),
+                ("Mes de referencia", f"{s.mes_referente:%m/%Y}"),
+                ("Data do pagamento", data_pagamento),
+            ]))
+    else:
+        for f in Fatura.objects.filter(pk__in=ids):
+            data_pagamento = timezone.localtime(f.data_pagamento).strftime("%d/%m/%Y") if f.data_pagamento else "-"
+            dados.append(base(f.pk, "Recibo de fatura", f.email_destinatario, f.email_destinatario, f.valor, [
+                ("Descricao", f.descricao),
+                ("Data de emissao", f"{f.data_emissao:%d/%m/%Y}"),
+                ("Vencimento", f"{f.data_vencimento:%d/%m/%Y}"),
+                ("Data do pagamento", data_pagamento),
+            ]))
+    return dados
+
+
+def marcar_recibos_gerados(tipo, ids):
+    """Um UPDATE por lote para o campo recibo_gerado"""
+    from financeiro.models import Mensalidade, Salario, Fatura
+
+    if tipo == "pagamento":
+        return Mensalidade.objects.filter(pagamentos__in=ids).update(recibo_gerado=True)
+    modelo = Salario if tipo == "salario" else Fatura
+    return modelo.objects.filter(pk__in=ids).update(recibo_gerado=True)
+
+
+def _opcoes_recursos():
+    from django.conf import settings
+    return settings.FINANCEIRO_RECIBO_FONTE or None, settings.FINANCEIRO_RECIBO_LOGO or None
+
+
+def gerar_recibo(tipo, pk):
+    """Gera um unico recibo no processo atual; retorna os dados (com o caminho) ou None"""
+    dados = carregar_dados(tipo, [pk])
+    if not dados:
+        return None
+    renderizar_recibo(dados[0], *_opcoes_recursos())
+    marcar_recibos_gerados(tipo, [pk])
+    return dados[0]
+
+
+def gerar_recibos(tipo, ids, processos=None, chunk_size=2000):
+    """Gera os recibos de um lote de ids. Lotes grandes sao renderizados num pool de processos
+    (excepto dentro de processos daemon, como os workers prefork do celery: ai as tasks
+    *_recibos_lote dividem o lote por varias tasks). Retorna os caminhos."""
+    from django.conf import settings
+
+    fonte, logo = _opcoes_recursos()
+    processos = processos or settings.FINANCEIRO_RECIBOS_PROCESSOS or os.cpu_count() or 1
+    ids = list(ids)
+    paralelo = processos > 1 and len(ids) >= LOTE_MINIMO_PARALELO and not multiprocessing.current_process().daemon
+
+    caminhos = []
+    executor = None
+    if paralelo:
+        executor = ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo, initargs=(fonte, logo))
+    try:
+        for inicio in range(0, len(ids), chunk_size):
+            lote = ids[inicio:inicio + chunk_size]
+            dados = [(d, fonte, logo) for d in carregar_dados(tipo, lote)]
+            if executor:
+                caminhos.extend(executor.map(_renderizar, dados, chunksize=max(1, len(dados) // (processos * 4))))
+            else:
+                caminhos.extend(_renderizar(d) for d in dados)
+            marcar_recibos_gerados(tipo, lote)
+    finally:
+        if executor:
+            executor.shutdown()
+    return caminhos
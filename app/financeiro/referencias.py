@@ -0,0 +1,55 @@
+"""Referencias numericas de pagamento com digito de controlo (Luhn).
+
+Formato: <tipo><id><AAMM><digito>
+- tipo 1: mensalidade (id do aluno), guardada em Mensalidade.referencia;
+- tipo 2: familia (id do encarregado), cobre todas as mensalidades do encarregado no mes.
+
+Sendo derivada de (aluno, mes), que ja e unico, a referencia pode ser gerada em lote
+antes do INSERT e descodificada sem consultar a base.
+"""
+from datetime import date
+
+MENSALIDADE = "1"
+FAMILIA = "2"
+
+
+def digito_controlo(numero):
+    """Digito que torna `numero` + digito valido pelo algoritmo de Luhn"""
+    soma = 0
+    for i, algarismo in enumerate(reversed(numero)):
+        valor = int(algarismo)
+        if i % 2 == 0:
+            valor *= 2
+            if valor > 9:
+                valor -= 9
+        soma += valor
+    return str((10 - soma % 10) % 10)
+
+
+def _gerar(tipo, pk, mes):
+    base = f"{tipo}{pk}{mes:%y%m}"
+    return base + digito_controlo(base)
+
+
+def referencia_mensalidade(aluno_id, mes_referente):
+    return _gerar(MENSALIDADE, aluno_id, mes_referente)
+
+
+def referencia_familia(encarregado_id, mes_referente):
+    return _gerar(FAMILIA, encarregado_id, mes_referente)
+
+
+def valida(referencia):
+    referencia = str(referencia)
+    return referencia.isdigit() and len(referencia) >= 7 and digito_controlo(referencia[:-1]) == referencia[-1]
+
+
+def descodificar(referencia):
+    """(tipo, id, mes_referente) de uma referencia valida, ou None"""
+    referencia = str(referencia).strip()
+    if not valida(referencia) or referencia[0] not in (MENSALIDADE, FAMILIA):
+        return None
+    ano, mes = int(referencia[-5:-3]), int(referencia[-3:-1])
+    if not 1 <= mes <= 12:
+        return None
+    return referencia[0], int(referencia[1:-5]), date(2000 + ano, mes, 1)
@@ -0,0 +1,143 @@
+"""Relatorios do financeiro lidos de tabelas pre-agregadas"""
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Count, Sum, Q
+from alunos.models import Aluno
+from financeiro.models import Mensalidade, ResumoMensal
+
+CAMPOS_VALORES = ("faturado", "recebido", "em_aberto", "atrasado")
+CAMPOS_QUANTIDADES = ("quantidade", "quantidade_pagas", "quantidade_atrasadas")
+
+
+def _agregar_mensalidades():
+    """Agregacao das mensalidades com os mesmos nomes das colunas de ResumoMensal"""
+    return dict(
+        quantidade=Count("id"),
+        quantidade_pagas=Count("id", filter=Q(status="PAGO")),
+        quantidade_atrasadas=Count("id", filter=Q(status="ATRASADO")),
+        faturado=Sum("valor"),
+        recebido=Sum("total_pago"),
+        em_aberto=Sum("valor_devido"),
+        atrasado=Sum("valor_devido", filter=Q(status="ATRASADO")),
+    )
+
+
+def _linha(mes_referente, rota_id, escola, totais):
+    return ResumoMensal(
+        mes_referente=mes_referente,
+        rota_id=rota_id,
+        escola=escola or "",
+        **{campo: totais[campo] or 0 for campo in CAMPOS_QUANTIDADES},
+        **{campo: totais[campo] or Decimal("0.00") for campo in CAMPOS_VALORES},
+    )
+
+
+def _bloquear_grupo(mes_referente, rota_id, escola):
+    """Serializa as atualizacoes do mesmo grupo ate ao fim da transacao. No PostgreSQL usa um
+    advisory lock (a linha pode ainda nao existir); nas outras bases o DELETE seguinte ja
+    bloqueia a escrita."""
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"resumo_mensal:{mes_referente}:{rota_id}:{escola}"])
+
+
+def atualizar_resumo_mensal(mes_referente, rota_id, escola):
+    """Recalcula uma unica linha (mes, rota, escola) a partir das mensalidades desse grupo.
+    Os totais sao lidos depois do bloqueio do grupo, por isso duas atualizacoes concorrentes
+    nunca colidem nem gravam totais desatualizados."""
+    with transaction.atomic():
+        _bloquear_grupo(mes_referente, rota_id, escola)
+        ResumoMensal.objects.filter(mes_referente=mes_referente, rota_id=rota_id, escola=escola).delete()
+        totais = Mensalidade.objects.filter(
+            mes_referente=mes_referente, aluno__rota_id=rota_id, aluno__escola_dest=escola,
+        ).aggregate(**_agregar_mensalidades())
+        if totais["quantidade"]:
+            _linha(mes_referente, rota_id, escola, totais).save()
+
+
+def _agendar_grupos(grupos):
+    transaction.on_commit(lambda: [atualizar_resumo_mensal(*grupo) for grupo in sorted(grupos, key=str)])
+
+
+def agendar_resumo_mensal(mensalidade):
+    """Agenda (para depois do commit) a atualizacao da linha da mensalidade e, se o mes ou o
+    aluno mudaram, tambem a da linha onde estava antes"""
+    aluno = mensalidade.aluno
+    grupos = {(mensalidade.mes_referente, aluno.rota_id, aluno.escola_dest)}
+    mes_anterior, aluno_anterior = mensalidade.valores_originais()
+    if aluno_anterior and aluno_anterior != mensalidade.aluno_id:
+        rota_escola = Aluno.objects.filter(pk=aluno_anterior).values_list("rota_id", "escola_dest").first()
+        if rota_escola:
+            grupos.add((mes_anterior or mensalidade.mes_referente, *rota_escola))
+    elif mes_anterior and mes_anterior != mensalidade.mes_referente:
+        grupos.add((mes_anterior, aluno.rota_id, aluno.escola_dest))
+    _agendar_grupos(grupos)
+
+
+def agendar_resumo_aluno(aluno, rota_anterior, escola_anterior):
+    """Quando a rota ou a escola de um aluno muda, as suas mensalidades passam de grupo:
+    atualiza as linhas antigas e as novas de todos os meses do aluno"""
+    if (rota_anterior, escola_anterior) == (aluno.rota_id, aluno.escola_dest):
+        return
+    meses = Mensalidade.objects.filter(aluno=aluno).order_by().values_list("mes_referente", flat=True).distinct()
+    _agendar_grupos(
+        {(mes, rota_anterior, escola_anterior) for mes in meses} | {(mes, aluno.rota_id, aluno.escola_dest) for mes in meses}
+    )
+
+
+def _bloquear_tabela():
+    """Serializa a reconstrucao com as atualizacoes por grupo ate ao fim da transacao: no
+    PostgreSQL bloqueia a escrita em ResumoMensal (as leituras continuam), por isso espera pelas
+    atualizacoes em curso e as seguintes esperam por ela"""
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {connection.ops.quote_name(ResumoMensal._meta.db_table)} IN SHARE ROW EXCLUSIVE MODE")
+
+
+def reconstruir_resumo_mensal(meses=None):
+    """Reconstroi as linhas dos meses indicados (ou de todos) com uma query agrupada.
+    Os totais sao lidos depois do bloqueio da tabela, como em atualizar_resumo_mensal."""
+    mensalidades = Mensalidade.objects.all()
+    resumos = ResumoMensal.objects.all()
+    if meses is not None:
+        mensalidades = mensalidades.filter(mes_referente__in=meses)
+        resumos = resumos.filter(mes_referente__in=meses)
+
+    grupos = (
+        mensalidades.order_by()
+        .values("mes_referente", "aluno__rota_id", "aluno__escola_dest")
+        .annotate(**_agregar_mensalidades())
+    )
+    with transaction.atomic():
+        _bloquear_tabela()
+        linhas = [
+            _linha(g["mes_referente"], g["aluno__rota_id"], g["aluno__escola_dest"], g) for g in grupos
+        ]
+        resumos.delete()
+        ResumoMensal.objects.bulk_create(linhas, batch_size=1000)
+    return len(linhas)
+
+
+def relatorio_mensal(inicio=None, fim=None, rota=None, escola=None, agrupar_por=None):
+    """Totais por mes lidos de ResumoMensal (custo proporcional ao numero de meses)"""
+    resumos = ResumoMensal.objects.all()
+    if inicio:
+        resumos = resumos.filter(mes_referente__gte=inicio)
+    if fim:
+        resumos = resumos.filter(mes_referente__lte=fim)
+    if rota:
+        resumos = resumos.filter(rota_id=rota)
+    if escola:
+        resumos = resumos.filter(escola=escola)
+
+    grupo = ["mes_referente"] + ([agrupar_por] if agrupar_por else [])
+    campos = CAMPOS_QUANTIDADES + CAMPOS_VALORES
+    linhas = (
+        resumos.order_by().values(*grupo)
+        .annotate(**{f"soma_{campo}": Sum(campo) for campo in campos})
+        .order_by("-mes_referente", *grupo[1:])
+    )
+    return [
+        {**{chave: linha[chave] for chave in grupo}, **{campo: linha[f"soma_{campo}"] for campo in campos}}
+        for linha in linhas
+    ]
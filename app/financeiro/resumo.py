@@ -0,0 +1,119 @@
+"""Resumo financeiro (dashboard) calculado com agregacoes condicionais e guardado em cache"""
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum, Q
+from django.utils import timezone
+from financeiro.models import Mensalidade, Pagamento, Salario, Fatura
+
+CHAVE_VERSAO = "financeiro:resumo:versao"
+
+
+def invalidar_resumo():
+    """Muda a versao das chaves do resumo; as entradas antigas expiram sozinhas"""
+    cache.set(CHAVE_VERSAO, time.time_ns(), None)
+
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, dtime.min))
+
+
+def _total(valor):
+    return valor or Decimal("0.00")
+
+
+def calcular_resumo(inicio=None, fim=None, aluno=None, encarregado=None):
+    """Uma query por modelo; salarios e faturas so entram quando nao ha filtro por aluno/encarregado"""
+    hoje = date.today()
+    mensalidades = Mensalidade.objects.all()
+    pagamentos = Pagamento.objects.all()
+    salarios = Salario.objects.all()
+    faturas = Fatura.objects.all()
+
+    if inicio:
+        mensalidades = mensalidades.filter(mes_referente__gte=inicio)
+        pagamentos = pagamentos.filter(data_pagamento__gte=_inicio_do_dia(inicio))
+        salarios = salarios.filter(mes_referente__gte=inicio)
+        faturas = faturas.filter(data_emissao__gte=inicio)
+    if fim:
+        mensalidades = mensalidades.filter(mes_referente__lte=fim)
+        pagamentos = pagamentos.filter(data_pagamento__lt=_inicio_do_dia(fim + timedelta(days=1)))
+        salarios = salarios.filter(mes_referente__lte=fim)
+        faturas = faturas.filter(data_emissao__lte=fim)
+    if aluno:
+        mensalidades = mensalidades.filter(aluno_id=aluno)
+        pagamentos = pagamentos.filter(mensalidade__aluno_id=aluno)
+    if encarregado:
+        mensalidades = mensalidades.filter(aluno__encarregado_id=encarregado)
+        pagamentos = pagamentos.filter(mensalidade__aluno__encarregado_id=encarregado)
+
+    m = mensalidades.aggregate(
+        total=Count("id"),
+        pagas=Count("id", filter=Q(status="PAGO")),
+        pendentes=Count("id", filter=Q(status="PENDENTE", data_vencimento__gte=hoje)),
+        atrasadas=Count("id", filter=Q(status="ATRASADO") | Q(status="PENDENTE", data_vencimento__lt=hoje)),
+        parciais=Count("id", filter=Q(status="PAGO PARCIAL")),
+        valor_total=Sum("valor"),
+        valor_devido=Sum("valor_devido"),
+    )
+    p = pagamentos.aggregate(total=Count("id"), valor_recebido=Sum("valor"))
+
+    resumo = {
+        "mensalidade": {
+            "total": m["total"],
+            "pagas": m["pagas"],
+            "pendentes": m["pendentes"],
+            "atrasadas": m["atrasadas"],
+            "parciais": m["parciais"],
+            "valor_total": _total(m["valor_total"]),
+            "valor_devido": _total(m["valor_devido"]),
+        },
+        "pagamento": {
+            "total": p["total"],
+            "valor_recebido": _total(p["valor_recebido"]),
+        },
+    }
+    if aluno or encarregado:
+        return resumo
+
+    s = salarios.aggregate(
+        total=Count("id"),
+        pagos=Count("id", filter=Q(status="PAGO")),
+        pendentes=Count("id", filter=Q(status="PENDENTE")),
+        valor_pago=Sum("valor", filter=Q(status="PAGO")),
+    )
+    f = faturas.aggregate(
+        total=Count("id"),
+        pagas=Count("id", filter=Q(status="PAGO")),
+        vencidas=Count("id", filter=Q(data_vencimento__lt=hoje) & ~Q(status="PAGO")),
+        valor_recebido=Sum("valor", filter=Q(status="PAGO")),
+    )
+    resumo["salarios"] = {
+        "total": s["total"],
+        "pagos": s["pagos"],
+        "pendentes": s["pendentes"],
+        "valor_pago": _total(s["valor_pago"]),
+    }
+    resumo["fatura"] = {
+        "total": f["total"],
+        "pagas": f["pagas"],
+        "vencidas": f["vencidas"],
+        "valor_recebido": _total(f["valor_recebido"]),
+    }
+    return resumo
+
+
+def obter_resumo(inicio=None, fim=None, aluno=None, encarregado=None):
+    """Resumo lido da cache partilhada; recalculado quando a versao muda (escrita no financeiro)"""
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, time.time_ns(), None)
+        versao = cache.get(CHAVE_VERSAO)
+    chave = f"financeiro:resumo:{versao}:{date.today()}:{inicio}:{fim}:{aluno}:{encarregado}"
+    resumo = cache.get(chave)
+    if resumo is None:
+        resumo = calcular_resumo(inicio, fim, aluno, encarregado)
+        cache.set(chave, resumo, settings.FINANCEIRO_RESUMO_CACHE_TIMEOUT)
+    return resumo
@@ -1,11 +1,26 @@
+from datetime import date
+from decimal import Decimal
 from rest_framework import serializers
-from financeiro.models import Mensalidade, Pagamento, Salario, Fatura, AlertaEnviado
+from financeiro.models import Mensalidade, Pagamento, Salario, Fatura, AlertaEnviado, MovimentoConta, M_PAGAMENTO
+from financeiro.extrato import descodificar_cursor
 
 class PagamentoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Pagamento
         fields = ['id', 'mensalidade', 'valor', 'data_pagamento', 'metodo_pagamento', 'observacao']
 
+class PagamentoLoteItemSerializer(serializers.Serializer):
+    """Um pagamento do lote; a mensalidade e validada em lote pelo servico (sem query por item)"""
+    mensalidade = serializers.IntegerField(min_value=1)
+    valor = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.01"))
+    data_pagamento = serializers.DateTimeField(required=False)
+    metodo_pagamento = serializers.ChoiceField(choices=M_PAGAMENTO, default="DINHEIRO")
+    observacao = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+class PagamentoLoteSerializer(serializers.Serializer):
+    pagamentos = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=1000)
+
 class MensalidadeSerializer(serializers.ModelSerializer):
     pagamentos = PagamentoSerializer(many=True, read_only=True)
     total_pago = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
@@ -15,7 +30,7 @@ class MensalidadeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Mensalidade
-        fields = ['id', 'aluno', 'valor', 'mes_referente', 'data_vencimento', 'data_limite', 'taxa_atraso', 'obs', 'recibo_gerado', 'status', 'data_pagamento', 'pagamentos', 'total_pago', 'valor_devido', 'valor_atualizado', 'dias_atraso',]
+        fields = ['id', 'aluno', 'valor', 'mes_referente', 'data_vencimento', 'data_limite', 'taxa_atraso', 'obs', 'recibo_gerado', 'status', 'data_pagamento', 'pagamentos', 'total_pago', 'valor_devido', 'valor_atualizado', 'dias_atraso', 'referencia',]
 
 class SalarioSerializer(serializers.ModelSerializer):
     # funcionario = serializers.PrimaryKeyRelatedField(queryset=Funcionario.objects.all())
@@ -34,3 +49,113 @@ class AlertaEnviadoSerializer(serializers.ModelSerializer):
     class Meta:
         model = AlertaEnviado
         fields = ['id', 'encarregado', 'alunos', 'tipo' ,'email', 'mensagem', 'enviado_em', 'status',]
+
+
+class ResumoFiltroSerializer(serializers.Serializer):
+    """Filtros opcionais do resumo financeiro (query params)"""
+    inicio = serializers.DateField(required=False)
+    fim = serializers.DateField(required=False)
+    aluno = serializers.IntegerField(required=False, min_value=1)
+    encarregado = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, data):
+        if data.get("inicio") and data.get("fim") and data["inicio"] > data["fim"]:
+            raise serializers.ValidationError("inicio nao pode ser posterior a fim")
+        return data
+
+
+class RelatorioMensalFiltroSerializer(serializers.Serializer):
+    """Filtros opcionais do relatorio mensal (query params)"""
+    inicio = serializers.DateField(required=False)
+    fim = serializers.DateField(required=False)
+    rota = serializers.IntegerField(required=False, min_value=1)
+    escola = serializers.CharField(required=False)
+    agrupar_por = serializers.ChoiceField(choices=["rota", "escola"], required=False)
+
+
+class AntiguidadeSaldosFiltroSerializer(serializers.Serializer):
+    """Filtros do relatorio de antiguidade de saldos (query params)"""
+    agrupar_por = serializers.ChoiceField(choices=["encarregado", "aluno"], default="encarregado")
+    formato = serializers.ChoiceField(choices=["json", "csv"], default="json")
+    encarregado = serializers.IntegerField(required=False, min_value=1)
+    aluno = serializers.IntegerField(required=False, min_value=1)
+
+
+class ExportacaoFiltroSerializer(serializers.Serializer):
+    """Formato das exportacoes; os restantes query params sao os filtros da listagem"""
+    formato = serializers.ChoiceField(choices=["csv", "xlsx"], default="csv")
+
+
+class FolhaSalariosSerializer(serializers.Serializer):
+    ano = serializers.IntegerField(min_value=2000, max_value=2100)
+    mes = serializers.IntegerField(min_value=1, max_value=12)
+
+
+class PagarSalariosSerializer(serializers.Serializer):
+    """Salarios a pagar: lista de ids ou todos os pendentes de um mes"""
+    salarios = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False, max_length=5000)
+    ano = serializers.IntegerField(min_value=2000, max_value=2100, required=False)
+    mes = serializers.IntegerField(min_value=1, max_value=12, required=False)
+    data_pagamento = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if "salarios" not in attrs and not ("ano" in attrs and "mes" in attrs):
+            raise serializers.ValidationError("Indique os salarios ou o ano e o mes.")
+        return attrs
+
+
+class FaturaEmissaoSerializer(serializers.ModelSerializer):
+    """Uma fatura do lote de emissao (sempre criada pendente)"""
+    class Meta:
+        model = Fatura
+        fields = ['descricao', 'valor', 'data_emissao', 'data_vencimento', 'obs', 'email_destinatario']
+
+    def validate(self, attrs):
+        data_emissao = attrs.get("data_emissao") or date.today()
+        if attrs["data_vencimento"] < data_emissao:
+            raise serializers.ValidationError("A data de vencimento nao pode ser anterior a data de emissao.")
+        return attrs
+
+
+class FaturaLoteSerializer(serializers.Serializer):
+    faturas = FaturaEmissaoSerializer(many=True, allow_empty=False)
+
+    def validate_faturas(self, faturas):
+        if len(faturas) > 1000:
+            raise serializers.ValidationError("No maximo 1000 faturas por lote.")
+        return faturas
+
+
+class LiquidarFaturasSerializer(serializers.Serializer):
+    faturas = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=5000)
+    data_pagamento = serializers.DateTimeField(required=False)
+
+
+class MovimentoContaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MovimentoConta
+        fields = ['id', 'data', 'tipo', 'natureza', 'valor', 'aluno', 'encarregado', 'mensalidade', 'pagamento', 'criado_em']
+
+
+class SaldoContaFiltroSerializer(serializers.Serializer):
+    """Conta cujo saldo se pede: aluno ou encarregado"""
+    aluno = serializers.IntegerField(required=False, min_value=1)
+    encarregado = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, data):
+        if ("aluno" in data) == ("encarregado" in data):
+            raise serializers.ValidationError("Indique o aluno ou o encarregado.")
+        return data
+
+
+class ExtratoFiltroSerializer(serializers.Serializer):
+    """Pagina do extrato de um encarregado: cursor devolvido em `next` e tamanho da pagina"""
+    encarregado = serializers.IntegerField(min_value=1)
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=500, default=50)
+
+    def validate_cursor(self, valor):
+        try:
+            return descodificar_cursor(valor)
+        except ValueError:
+            raise serializers.ValidationError("Cursor invalido.")
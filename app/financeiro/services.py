@@ -0,0 +1,272 @@
+"""Servicos do financeiro (operacoes em lote sobre a base de dados)"""
+import calendar
+from collections import defaultdict
+from datetime import date
+from django.conf import settings
+from django.db import connection, transaction
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, F, OuterRef, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from alunos.models import Aluno
+from financeiro.models import Mensalidade, Pagamento, Fatura, Salario, EventoOutbox, MovimentoConta
+from financeiro.resumo import invalidar_resumo
+from financeiro.relatorios import reconstruir_resumo_mensal
+from financeiro.referencias import referencia_mensalidade
+from financeiro.razao import lancar_em_lotes, lancar_mensalidades, lancar_multas, lancar_pagamentos
+
+
+def calcular_datas(ano, mes):
+    """Retorna (mes_referente, data_vencimento, data_limite) de um mes"""
+    ultimo_dia = calendar.monthrange(ano, mes)[1]
+    dia_vencimento = min(settings.FINANCEIRO_DIA_VENCIMENTO, ultimo_dia)
+    dia_limite = min(max(settings.FINANCEIRO_DIA_LIMITE, dia_vencimento), ultimo_dia)
+    return date(ano, mes, 1), date(ano, mes, dia_vencimento), date(ano, mes, dia_limite)
+
+
+def gerar_calendario_anual(ano):
+    """Datas de referencia, vencimento e limite dos 12 meses do ano"""
+    return [calcular_datas(ano, mes) for mes in range(1, 13)]
+
+
+def gerar_mensalidades(ano, meses=None, batch_size=1000):
+    """Gera em lote as mensalidades dos alunos ativos para os meses indicados (ou o ano inteiro).
+
+    Usa bulk_create com ON CONFLICT DO NOTHING sobre (aluno, mes_referente), por isso pode
+    ser executado varias vezes sem duplicar linhas. Nao dispara signals por linha.
+    Retorna {"criadas": n, "ignoradas": n}.
+    """
+    calendario = [calcular_datas(ano, mes) for mes in meses] if meses else gerar_calendario_anual(ano)
+    referencias = [datas[0] for datas in calendario]
+    alunos = list(Aluno.objects.filter(ativo=True).values_list("id", "mensalidade"))
+
+    do_periodo = Mensalidade.objects.filter(mes_referente__in=referencias)
+    existentes = set(do_periodo.values_list("aluno_id", "mes_referente"))
+    novas = [
+        Mensalidade(
+            aluno_id=aluno_id,
+            valor=valor,
+            valor_devido=valor,
+            referencia=referencia_mensalidade(aluno_id, mes_referente),
+            mes_referente=mes_referente,
+            data_vencimento=data_vencimento,
+            data_limite=data_limite,
+        )
+        for mes_referente, data_vencimento, data_limite in calendario
+        for aluno_id, valor in alunos
+        if (aluno_id, mes_referente) not in existentes
+    ]
+
+    with transaction.atomic():
+        antes = do_periodo.count()
+        Mensalidade.objects.bulk_create(novas, batch_size=batch_size, ignore_conflicts=True)
+        criadas = do_periodo.count() - antes
+        if criadas:
+            lancar_em_lotes(lancar_mensalidades, do_periodo.exclude(
+                Exists(MovimentoConta.objects.filter(mensalidade_id=OuterRef("pk"), tipo="MENSALIDADE"))
+            ), batch_size)
+            transaction.on_commit(invalidar_resumo)
+            transaction.on_commit(lambda: reconstruir_resumo_mensal(referencias))
+
+    return {"criadas": criadas, "ignoradas": len(alunos) * len(calendario) - criadas}
+
+
+def atualizar_em_lotes(queryset, batch_size=5000, **campos):
+    """Aplica um UPDATE ao queryset em lotes de ids (transacoes curtas, sem signals).
+    O filtro do queryset e reaplicado no UPDATE; retorna a lista de ids alterados."""
+    alterados = []
+    while True:
+        with transaction.atomic():
+            ids = list(
+                queryset.select_for_update(skip_locked=True)
+                .order_by("pk").values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                return alterados
+            queryset.filter(pk__in=ids).update(**campos)
+            transaction.on_commit(invalidar_resumo)
+        alterados.extend(ids)
+
+
+def marcar_atrasadas(hoje=None, batch_size=5000):
+    """Passa a ATRASADO todas as mensalidades e faturas PENDENTE com vencimento ultrapassado.
+    Retorna {"mensalidades": [ids], "faturas": [ids]}."""
+    hoje = hoje or date.today()
+    mensalidades = Mensalidade.objects.filter(status="PENDENTE", data_vencimento__lt=hoje)
+    faturas = Fatura.objects.filter(status="PENDENTE", data_vencimento__lt=hoje)
+    meses = list(mensalidades.order_by().values_list("mes_referente", flat=True).distinct())
+    resultado = {
+        "mensalidades": atualizar_em_lotes(
+            mensalidades, batch_size, status="ATRASADO", data_atualizacao=timezone.now()
+        ),
+        "faturas": atualizar_em_lotes(faturas, batch_size, status="ATRASADO"),
+    }
+    if resultado["mensalidades"]:
+        reconstruir_resumo_mensal(meses)
+    return resultado
+
+
+def atualizar_status_em_lote(mensalidade_ids):
+    """Recalcula o status das mensalidades com um SELECT e no maximo um UPDATE por status novo
+    (mesmas regras de Mensalidade.atualizar_status). Retorna os meses de referencia alterados."""
+    por_status, meses = defaultdict(list), set()
+    for mensalidade in Mensalidade.objects.filter(pk__in=mensalidade_ids).com_calculos().prefetch_related(None):
+        novo = mensalidade.calcular_status()
+        if novo != mensalidade.status:
+            por_status[novo].append(mensalidade.pk)
+            meses.add(mensalidade.mes_referente)
+
+    agora = timezone.now()
+    for status, ids in por_status.items():
+        campos = {"status": status, "data_atualizacao": agora}
+        if status == "PAGO":
+            campos["data_pagamento"] = Coalesce(F("data_pagamento"), Value(agora))
+        Mensalidade.objects.filter(pk__in=ids).update(**campos)
+    return meses
+
+
+def registar_pagamentos(itens, batch_size=500):
+    """Regista um lote de pagamentos numa unica transacao.
+
+    Cada item e validado contra o valor em divida da mensalidade (com multa), descontando os
+    itens aceites antes no mesmo lote. Os validos sao inseridos com bulk_create e os totais e
+    status sao recalculados uma vez por mensalidade, sem signals por linha.
+    Retorna um resultado por item, pela mesma ordem: {"status": "criado", "pagamento": obj}
+    ou {"status": "rejeitado", "erros": {...}}.
+    """
+    resultados, novos = [], []
+    with transaction.atomic():
+        mensalidades = (
+            Mensalidade.objects.filter(pk__in={item["mensalidade"] for item in itens})
+            .select_for_update(of=("self",)).com_calculos().prefetch_related(None).in_bulk()
+        )
+        em_divida = {pk: m.valor_atualizado - m.total_pago for pk, m in mensalidades.items()}
+
+        for item in itens:
+            mensalidade_id = item["mensalidade"]
+            if mensalidade_id not in mensalidades:
+                resultados.append({"status": "rejeitado", "erros": {"mensalidade": ["Mensalidade nao encontrada."]}})
+                continue
+            if item["valor"] > em_divida[mensalidade_id]:
+                resultados.append({"status": "rejeitado", "erros": {"valor": [
+                    f"Valor do pagamento excede o valor devido ({em_divida[mensalidade_id]:.2f})."
+                ]}})
+                continue
+            em_divida[mensalidade_id] -= item["valor"]
+            dados = dict(item, mensalidade_id=mensalidade_id)
+            del dados["mensalidade"]
+            pagamento = Pagamento(**dados)
+            novos.append(pagamento)
+            resultados.append({"status": "criado", "pagamento": pagamento})
+
+        if novos:
+            Pagamento.objects.bulk_create(novos, batch_size=batch_size)
+            afetadas = {p.mensalidade_id for p in novos}
+            Mensalidade.objects.filter(pk__in=afetadas).recalcular_totais()
+            atualizar_status_em_lote(afetadas)
+            lancar_pagamentos(Pagamento.objects.filter(mensalidade_id__in=afetadas).values_list("id", flat=True))
+            lancar_multas(afetadas)
+            meses = {mensalidades[pk].mes_referente for pk in afetadas}
+            transaction.on_commit(invalidar_resumo)
+            transaction.on_commit(lambda: reconstruir_resumo_mensal(meses))
+    return resultados
+
+
+FUNCOES_COM_SALARIO = ("FUNCIONARIO", "MOTORISTA", "ADMINISTRADOR")
+
+
+def gerar_folha_salarios(ano, mes, batch_size=1000):
+    """Gera num bulk_create os salarios do mes de todos os funcionarios ativos com funcao
+    remunerada. O valor e User.salario ou, se vazio, Cargo.salario_padrao. Quem ja tem salario
+    do mes e ignorado, por isso pode ser executado varias vezes; a constraint salario_unico_por_mes
+    com ignore_conflicts garante que duas execucoes em simultaneo nao duplicam salarios (nesse caso
+    "criados" conta tambem os que a outra execucao inseriu primeiro). Nao passa por Salario.save.
+    Retorna {"criados": n, "ignorados": n, "sem_valor": [ids dos funcionarios sem salario]}."""
+    mes_referente = date(ano, mes, 1)
+    do_mes = Salario.objects.filter(mes_referente=mes_referente)
+    funcionarios = (
+        get_user_model().objects
+        .filter(is_active=True, role__nome__in=FUNCOES_COM_SALARIO)
+        .annotate(
+            valor_salario=Coalesce("salario", "role__salario_padrao"),
+            tem_salario=Exists(do_mes.filter(funcionario=OuterRef("pk"))),
+        )
+        .values_list("id", "valor_salario", "tem_salario")
+    )
+
+    novos, ignorados, sem_valor = [], 0, []
+    for funcionario_id, valor, tem_salario in funcionarios:
+        if tem_salario:
+            ignorados += 1
+        elif not valor:
+            sem_valor.append(funcionario_id)
+        else:
+            novos.append(Salario(funcionario_id=funcionario_id, valor=valor, mes_referente=mes_referente))
+
+    with transaction.atomic():
+        Salario.objects.bulk_create(novos, batch_size=batch_size, ignore_conflicts=True)
+        if novos:
+            transaction.on_commit(invalidar_resumo)
+    return {"criados": len(novos), "ignorados": ignorados, "sem_valor": sem_valor}
+
+
+def pagar_salarios(salarios, data_pagamento=None):
+    """Marca como pagos, num UPDATE, os salarios ainda nao pagos do queryset e regista um unico
+    evento no outbox que gera e envia os recibos em lote. Retorna os ids pagos."""
+    data_pagamento = data_pagamento or timezone.now()
+    with transaction.atomic():
+        ids = list(salarios.exclude(status="PAGO").select_for_update().values_list("id", flat=True))
+        if not ids:
+            return []
+        Salario.objects.filter(pk__in=ids).update(
+            status="PAGO", data_pagamento=data_pagamento, data_atualizacao=timezone.now(),
+        )
+        EventoOutbox.objects.registar("financeiro.tasks.enviar_recibos_lote", "salario", ids)
+        transaction.on_commit(invalidar_resumo)
+    return ids
+
+
+def emitir_faturas(dados, batch_size=500):
+    """Emite um lote de faturas (dicts ja validados) num bulk_create, sem Fatura.save por linha.
+    As faturas sao sempre criadas pendentes; a liquidacao faz-se com liquidar_faturas."""
+    faturas = [Fatura(**dict(item, status="PENDENTE", data_pagamento=None)) for item in dados]
+    with transaction.atomic():
+        Fatura.objects.bulk_create(faturas, batch_size=batch_size)
+        if faturas:
+            transaction.on_commit(invalidar_resumo)
+    return faturas
+
+
+def _liquidar_retornando(ids, data_pagamento, batch_size):
+    """UPDATE ... WHERE status <> 'PAGO' RETURNING id: a transicao e decidida e capturada na
+    mesma instrucao (Postgres e SQLite >= 3.35)"""
+    tabela = connection.ops.quote_name(Fatura._meta.db_table)
+    data = connection.ops.adapt_datetimefield_value(data_pagamento)
+    pagas = []
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(ids), batch_size):
+            lote = ids[inicio:inicio + batch_size]
+            cursor.execute(
+                f"UPDATE {tabela} SET status = %s, data_pagamento = %s "
+                f"WHERE id IN ({', '.join(['%s'] * len(lote))}) AND status <> %s RETURNING id",
+                ["PAGO", data, *lote, "PAGO"],
+            )
+            pagas.extend(linha[0] for linha in cursor.fetchall())
+    return pagas
+
+
+def liquidar_faturas(ids, data_pagamento=None, batch_size=1000):
+    """Marca como pagas as faturas indicadas que ainda nao o estavam e regista um unico evento
+    no outbox para gerar e enviar os recibos em lote. Retorna os ids que mudaram de status."""
+    data_pagamento = data_pagamento or timezone.now()
+    ids = sorted(set(ids))
+    with transaction.atomic():
+        if connection.vendor in ("postgresql", "sqlite"):
+            pagas = _liquidar_retornando(ids, data_pagamento, batch_size)
+        else:
+            pagas = list(Fatura.objects.filter(pk__in=ids).exclude(status="PAGO").select_for_update().values_list("id", flat=True))
+            Fatura.objects.filter(pk__in=pagas).update(status="PAGO", data_pagamento=data_pagamento)
+        if pagas:
+            EventoOutbox.objects.registar("financeiro.tasks.enviar_recibos_lote", "fatura", sorted(pagas))
+            transaction.on_commit(invalidar_resumo)
+    return sorted(pagas)
@@ -1,14 +1,94 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 
-from financeiro.models import Pagamento, Mensalidade, Fatura, Salario, AlertaEnviado
+from financeiro.models import Pagamento, Mensalidade, Fatura, Salario, EventoOutbox
+from financeiro.resumo import invalidar_resumo
+from alunos.models import Aluno
+from financeiro.relatorios import agendar_resumo_mensal, agendar_resumo_aluno
+from financeiro.razao import lancar_mensalidades, lancar_multas, lancar_pagamentos
 
-#atualiza o status da mensalidade quando um pagamento e cruado
+
+# qualquer escrita no financeiro invalida o resumo em cache (depois do commit)
+@receiver([post_save, post_delete], sender=Mensalidade)
+@receiver([post_save, post_delete], sender=Pagamento)
+@receiver([post_save, post_delete], sender=Salario)
+@receiver([post_save, post_delete], sender=Fatura)
+def invalidar_cache_resumo(sender, **kwargs):
+    transaction.on_commit(invalidar_resumo)
+
+
+# mantem a linha de ResumoMensal do mes/rota/escola da mensalidade alterada
+@receiver([post_save, post_delete], sender=Mensalidade)
+def atualizar_resumo_mensal_mensalidade(sender, instance, **kwargs):
+    agendar_resumo_mensal(instance)
+    instance._valores_db = {"mes_referente": instance.mes_referente, "aluno_id": instance.aluno_id}
+
+
+@receiver([post_save, post_delete], sender=Pagamento)
+def atualizar_resumo_mensal_pagamento(sender, instance, **kwargs):
+    agendar_resumo_mensal(instance.mensalidade)
+
+
+@receiver(pre_save, sender=Aluno)
+def guardar_grupo_aluno(sender, instance, **kwargs):
+    instance._grupo_resumo = None
+    if instance.pk:
+        instance._grupo_resumo = Aluno.objects.filter(pk=instance.pk).values_list("rota_id", "escola_dest").first()
+
+
+@receiver(post_save, sender=Aluno)
+def atualizar_resumo_mensal_aluno(sender, instance, created, **kwargs):
+    grupo = getattr(instance, "_grupo_resumo", None)
+    if not created and grupo:
+        agendar_resumo_aluno(instance, *grupo)
+
+
+# livro razao: sincroniza os movimentos da origem alterada (so acrescenta movimentos)
+@receiver([post_save, post_delete], sender=Mensalidade)
+def lancar_mensalidade_razao(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {"valor", "aluno"} & set(update_fields):
+        lancar_mensalidades([instance.pk])
+    if update_fields is None or {"valor", "aluno", "status"} & set(update_fields):
+        lancar_multas([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Pagamento)
+def lancar_pagamento_razao(sender, instance, **kwargs):
+    lancar_pagamentos([instance.pk])
+
+
+def _recalcular_mensalidade(mensalidade):
+    """Le os totais atualizados por delta e recalcula o status"""
+    mensalidade.refresh_from_db(fields=list(Mensalidade.CAMPOS_DENORMALIZADOS))
+    mensalidade.atualizar_status()
+
+
+# atualiza os totais e o status da mensalidade quando um pagamento e criado ou editado
 @receiver(post_save, sender=Pagamento)
 def atualizar_status_mensalidade(sender, instance, created, **kwargs):
-    if created:
-        mensalidade = instance.mensalidade
+    mensalidade_id, valor_original = instance.valores_originais()
+    if created or mensalidade_id is None:
+        Mensalidade.objects.aplicar_pagamento(instance.mensalidade_id, instance.valor)
+    elif mensalidade_id != instance.mensalidade_id:
+        Mensalidade.objects.aplicar_pagamento(mensalidade_id, -valor_original)
+        Mensalidade.objects.aplicar_pagamento(instance.mensalidade_id, instance.valor)
+        anterior = Mensalidade.objects.filter(pk=mensalidade_id).first()
+        if anterior:
+            anterior.atualizar_status()
+    else:
+        Mensalidade.objects.aplicar_pagamento(instance.mensalidade_id, instance.valor - valor_original)
+    instance._valores_db = {"mensalidade_id": instance.mensalidade_id, "valor": instance.valor}
+    _recalcular_mensalidade(instance.mensalidade)
+
+
+@receiver(post_delete, sender=Pagamento)
+def remover_pagamento_mensalidade(sender, instance, **kwargs):
+    mensalidade_id, valor_original = instance.valores_originais()
+    mensalidade_id = mensalidade_id or instance.mensalidade_id
+    if Mensalidade.objects.aplicar_pagamento(mensalidade_id, -(valor_original or instance.valor)):
+        mensalidade = Mensalidade.objects.get(pk=mensalidade_id)
         mensalidade.atualizar_status()
 
 @receiver(post_save, sender=Fatura)
@@ -16,24 +96,15 @@ def gerar_recibo_fatura(sender, instance, **kwargs):
     if instance.status == "PAGO" and not instance.recibo_gerado:
         instance.recibo_gerado = True
         instance.save(update_fields=["recibo_gerado"])
-        enviar_recibos_individual.delay("fatura", instance.pk)
+        EventoOutbox.objects.registar(
+            "financeiro.tasks.enviar_recibos_individual", "fatura", instance.pk, chave=f"recibo:fatura:{instance.pk}"
+        )
 
 @receiver(post_save, sender=Salario)
-def gerar_recibos_salarios(post_save, instance, **kwargs):
+def gerar_recibos_salarios(sender, instance, **kwargs):
     if instance.status == "PAGO" and not instance.recibo_gerado:
         instance.recibo_gerado = True
         instance.save(update_fields=["recibo_gerado"])
-        enviar_recibos_individual.delay("salario", instance.pk)
-
-@receiver(post_save, sender=Mensalidade)
-def criar_alerta_mensalidade_atrasado(sender, instance, **kwargs):
-    if instance.status == "ATRASADO":
-        from financeiro.tasks import enviar_alerta_email
-        AlertaEnviado.objects.create(
-            encarregado=instance.aluno.encarregado,
-            email=instance.aluno.encarregado.email,
-            mensagem=f"A mensalidade do aluno {instance.aluno.nome}, esta em atraso",
-            tipo="ATRASO",
-            status="PENDENTE"
+        EventoOutbox.objects.registar(
+            "financeiro.tasks.enviar_recibos_individual", "salario", instance.pk, chave=f"recibo:salario:{instance.pk}"
         )
-        enviar_alerta_email.delay(alerta.pk)
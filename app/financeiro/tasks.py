@@ -1,7 +1,16 @@
-from celery import shared_task
-from django.core.mail import send_mail
+from datetime import date
+from celery import group, shared_task
+from django.core.mail import send_mail, EmailMessage, get_connection
 from django.conf import settings
 from financeiro.models import AlertaEnviado
+from financeiro.services import gerar_mensalidades, marcar_atrasadas
+from financeiro.recibos import gerar_recibo, gerar_recibos, carregar_dados
+from financeiro.notificacoes import enviar_alertas, criar_resumos_atraso
+from financeiro.outbox import despachar_outbox, limpar_outbox
+from financeiro.callbacks import processar_callbacks
+from financeiro.razao import lancar_multas, fechar_saldos
+from financeiro.particoes import manter
+from financeiro.arquivo import arquivar_alertas
 
 
 @shared_task
@@ -38,3 +47,157 @@ def enviar_alerta_email(alerta_id):
         alerta.status = "FALHA NO ENVIO"
         alerta.save(update_fields=["status"])
         return "Nenhum destinatario definido"
+
+
+@shared_task
+def enviar_alertas_lote(alerta_ids):
+    """Envia muitos alertas pela mesma ligacao SMTP, com limite de taxa e um UPDATE de estado por lote"""
+    return enviar_alertas(alerta_ids)
+
+
+@shared_task
+def enviar_resumos_atraso():
+    """Um alerta (e um email) por encarregado com todas as mensalidades em atraso dos seus alunos"""
+    alertas = criar_resumos_atraso()
+    if settings.FINANCEIRO_DESPACHO_ASSINCRONO:
+        # ficam PENDENTE para o despachar_alertas
+        return {"pendentes": len(alertas)}
+    if not alertas:
+        return {"enviados": 0, "falhas": 0}
+    return enviar_alertas(alertas)
+
+
+@shared_task
+def gerar_mensalidades_periodo(ano=None, mes=None):
+    """Gera em lote as mensalidades dos alunos ativos.
+    Sem argumentos gera o mes corrente; com ano e sem mes gera o ano inteiro."""
+    if ano is None:
+        hoje = date.today()
+        ano, mes = hoje.year, hoje.month
+    return gerar_mensalidades(ano, [mes] if mes else None)
+
+
+@shared_task
+def marcar_atrasadas_diario():
+    """Varredura noturna: passa a ATRASADO, em UPDATEs por lote, as mensalidades e faturas vencidas.
+    Retorna os ids alterados para que o trabalho seguinte possa ser agendado em lotes."""
+    alterados = marcar_atrasadas()
+    lancar_multas()
+    return alterados
+
+
+@shared_task
+def enviar_recibos_individual(tipo, pk):
+    """Gera o recibo (pagamento, salario ou fatura) e envia-o em anexo ao destinatario"""
+    dados = gerar_recibo(tipo, pk)
+    if dados is None:
+        return f"{tipo} {pk} nao encontrado."
+    if not dados["email"]:
+        return f"Recibo gerado em {dados['caminho']} (sem destinatario)"
+
+    mensagem = EmailMessage(
+        dados["titulo"],
+        f"Segue em anexo o {dados['titulo'].lower()} n.o {dados['numero']}.",
+        settings.DEFAULT_FROM_EMAIL,
+        [dados["email"]],
+    )
+    mensagem.attach_file(dados["caminho"], "application/pdf")
+    mensagem.send(fail_silently=False)
+    return f"Recibo enviado para {dados['email']}"
+
+
+def _partes(ids):
+    tamanho = settings.FINANCEIRO_RECIBOS_PARTE
+    ids = list(ids)
+    return [ids[inicio:inicio + tamanho] for inicio in range(0, len(ids), tamanho)]
+
+
+@shared_task
+def enviar_recibos_lote(tipo, ids):
+    """Gera e envia os recibos de um lote (ex: folha de salarios). Um worker prefork nao pode
+    abrir um pool de processos, por isso os lotes maiores que FINANCEIRO_RECIBOS_PARTE sao
+    divididos num group de tasks enviar_recibos_parte, que correm em paralelo nos workers."""
+    partes = _partes(ids)
+    if len(partes) > 1:
+        group(enviar_recibos_parte.s(tipo, parte) for parte in partes).apply_async()
+        return f"{len(ids)} recibos distribuidos por {len(partes)} tasks"
+    return enviar_recibos_parte(tipo, ids)
+
+
+@shared_task
+def enviar_recibos_parte(tipo, ids, chunk_size=500):
+    """Gera os recibos de uma parte de um lote e envia-os numa unica ligacao SMTP"""
+    gerar_recibos(tipo, ids, processos=1)
+    enviados = 0
+    with get_connection() as ligacao:
+        for inicio in range(0, len(ids), chunk_size):
+            mensagens = []
+            for dados in carregar_dados(tipo, ids[inicio:inicio + chunk_size]):
+                if not dados["email"]:
+                    continue
+                mensagem = EmailMessage(
+                    dados["titulo"],
+                    f"Segue em anexo o {dados['titulo'].lower()} n.o {dados['numero']}.",
+                    settings.DEFAULT_FROM_EMAIL,
+                    [dados["email"]],
+                    connection=ligacao,
+                )
+                mensagem.attach_file(dados["caminho"], "application/pdf")
+                mensagens.append(mensagem)
+            enviados += ligacao.send_messages(mensagens) or 0
+    return f"{len(ids)} recibos gerados, {enviados} enviados"
+
+
+@shared_task
+def gerar_recibos_lote(tipo, ids):
+    """Gera os recibos de um lote (ex: fecho do mes) sem envio de email; como em
+    enviar_recibos_lote, os lotes grandes sao divididos num group de tasks gerar_recibos_parte.
+    Retorna o numero de partes."""
+    partes = _partes(ids)
+    if len(partes) > 1:
+        group(gerar_recibos_parte.s(tipo, parte) for parte in partes).apply_async()
+        return len(partes)
+    gerar_recibos_parte(tipo, ids)
+    return 1
+
+
+@shared_task
+def gerar_recibos_parte(tipo, ids):
+    """Gera os recibos de uma parte de um lote, em serie no worker"""
+    return len(gerar_recibos(tipo, ids, processos=1))
+
+
+@shared_task
+def despachar_eventos_outbox():
+    """Relay do outbox: envia ao broker, em lote, as tasks gravadas pelas escritas do financeiro"""
+    return despachar_outbox()
+
+
+@shared_task
+def limpar_eventos_outbox():
+    """Apaga os eventos do outbox ja processados ha mais de uma semana"""
+    return limpar_outbox()
+
+
+@shared_task
+def processar_callbacks_pagamento():
+    """Cria em lote os pagamentos dos callbacks de carteira movel recebidos"""
+    return processar_callbacks()
+
+
+@shared_task
+def fechar_saldos_diario():
+    """Grava os snapshots de saldo das contas com movimentos desde o ultimo fecho"""
+    return fechar_saldos()
+
+
+@shared_task
+def manter_particoes():
+    """Cria as particoes mensais seguintes de pagamentos e alertas (e desanexa as antigas, se configurado)"""
+    return manter(settings.FINANCEIRO_PARTICOES_MESES_FUTUROS, settings.FINANCEIRO_PARTICOES_RETER_MESES)
+
+
+@shared_task
+def arquivar_alertas_antigos():
+    """Arquiva em MEDIA_ROOT e apaga, por lotes, os alertas mais antigos que a retencao"""
+    return arquivar_alertas(pausa=0.1)
@@ -0,0 +1,39 @@
+"""Verificacao dos planos de execucao (EXPLAIN) das queries dos managers, em PostgreSQL"""
+import json
+from django.db import connection
+
+
+def plano(queryset):
+    """Plano estimado (EXPLAIN FORMAT JSON) da query do queryset"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        resultado = cursor.fetchone()[0]
+    if isinstance(resultado, str):
+        resultado = json.loads(resultado)
+    return resultado[0]["Plan"]
+
+
+def _nos(no):
+    yield no
+    for filho in no.get("Plans", []):
+        yield from _nos(filho)
+
+
+def linhas_estimadas(tabela):
+    """Numero de linhas da tabela segundo as estatisticas do ANALYZE"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [tabela])
+        linha = cursor.fetchone()
+    return int(linha[0]) if linha else 0
+
+
+def varrimentos_sequenciais(queryset, limiar):
+    """Seq Scans do plano sobre tabelas com mais de `limiar` linhas: [(tabela, linhas), ...]"""
+    encontrados = []
+    for no in _nos(plano(queryset)):
+        if no["Node Type"] == "Seq Scan":
+            linhas = linhas_estimadas(no["Relation Name"])
+            if linhas > limiar:
+                encontrados.append((no["Relation Name"], linhas))
+    return encontrados
@@ -0,0 +1,80 @@
+import csv
+import json
+from io import StringIO
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from financeiro.antiguidade import antiguidade_saldos
+from financeiro.models import Mensalidade
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+HOJE = date(2026, 6, 30)
+
+
+class AntiguidadeSaldosTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.encarregado1 = criar_encarregado(1)
+        cls.encarregado2 = criar_encarregado(2)
+        cls.aluno1 = criar_aluno(cls.encarregado1, 1)
+        cls.aluno2 = criar_aluno(cls.encarregado1, 2)
+        cls.aluno3 = criar_aluno(cls.encarregado2, 3)
+        cls.criar(cls.aluno1, 10, "1000.00")
+        cls.criar(cls.aluno1, 45, "1000.00", status="ATRASADO")  # 9 periodos de 10% -> 1900
+        cls.criar(cls.aluno2, 75, "500.00", total_pago="200.00")
+        cls.criar(cls.aluno3, 120, "800.00")
+        cls.criar(cls.aluno3, 20, "800.00", status="PAGO", total_pago="800.00")
+        cls.criar(cls.aluno3, -5, "800.00")  # ainda nao vencida
+
+    @classmethod
+    def criar(cls, aluno, dias, valor, status="PENDENTE", total_pago="0.00"):
+        vencimento = HOJE - timedelta(days=dias)
+        mensalidade = Mensalidade.objects.create(
+            aluno=aluno, valor=Decimal(valor), mes_referente=vencimento.replace(day=1),
+            data_vencimento=vencimento, data_limite=vencimento,
+        )
+        Mensalidade.objects.filter(pk=mensalidade.pk).update(status=status, total_pago=Decimal(total_pago))
+
+    def test_faixas_por_encarregado(self):
+        with self.assertNumQueries(1):
+            linhas = list(antiguidade_saldos(hoje=HOJE))
+        self.assertEqual([linha["encarregado_id"] for linha in linhas], [self.encarregado1.pk, self.encarregado2.pk])
+        primeiro, segundo = linhas
+        self.assertEqual(primeiro["dias_0_30"], Decimal("1000.00"))
+        self.assertEqual(primeiro["dias_31_60"], Decimal("1900.00"))
+        self.assertEqual(primeiro["dias_61_90"], Decimal("300.00"))
+        self.assertEqual(primeiro["dias_90_mais"], Decimal("0.00"))
+        self.assertEqual(primeiro["total"], Decimal("3200.00"))
+        self.assertEqual(primeiro["quantidade"], 3)
+        self.assertEqual(segundo["dias_90_mais"], Decimal("800.00"))
+        self.assertEqual(segundo["quantidade"], 1)
+
+    def test_por_aluno_e_filtros(self):
+        linhas = list(antiguidade_saldos("aluno", encarregado=self.encarregado1.pk, hoje=HOJE))
+        self.assertEqual([linha["aluno_id"] for linha in linhas], [self.aluno1.pk, self.aluno2.pk])
+        self.assertEqual(linhas[0]["nome_aluno"], "Aluno 1")
+        self.assertEqual(linhas[1]["total"], Decimal("300.00"))
+
+    def test_endpoint_streaming(self):
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.encarregado1.user).access_token}")
+        resposta = cliente.get("/api/financeiro/antiguidade-saldos/", {"agrupar_por": "aluno"})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(json.loads(b"".join(resposta.streaming_content))), 3)
+
+        resposta = cliente.get("/api/financeiro/antiguidade-saldos/", {"formato": "csv"})
+        self.assertEqual(resposta["Content-Type"], "text/csv; charset=utf-8")
+        linhas = list(csv.reader(b"".join(resposta.streaming_content).decode().splitlines()))
+        self.assertEqual(linhas[0][:2], ["encarregado_id", "nome_encarregado"])
+        self.assertEqual(len(linhas), 3)
+
+        resposta = cliente.get("/api/financeiro/antiguidade-saldos/", {"agrupar_por": "escola"})
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_comando(self):
+        saida = StringIO()
+        call_command("antiguidade_saldos", "--formato", "json", stdout=saida)
+        self.assertEqual(len(json.loads(saida.getvalue())), 2)
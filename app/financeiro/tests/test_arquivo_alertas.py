@@ -0,0 +1,54 @@
+import gzip
+import os
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from financeiro.arquivo import arquivar_alertas, ler_arquivo
+from financeiro.models import AlertaEnviado
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), FINANCEIRO_ALERTAS_RETER_MESES=12)
+class ArquivoAlertasTest(TestCase):
+    def setUp(self):
+        self.encarregado = criar_encarregado()
+        self.aluno = criar_aluno(self.encarregado)
+        agora = timezone.now()
+        for dias in (400, 400, 500, 700, 30):
+            alerta = AlertaEnviado.objects.create(encarregado=self.encarregado, email="e@x.com", mensagem=f"{dias} dias")
+            alerta.alunos.add(self.aluno)
+            AlertaEnviado.objects.filter(pk=alerta.pk).update(enviado_em=agora - timedelta(days=dias))
+
+    def test_arquiva_e_apaga_por_lotes(self):
+        # exists + 2 lotes x (alertas, alunos, savepoint, select/delete dos alunos e alertas, release) + lote vazio
+        with self.assertNumQueries(1 + 2 * 7 + 1):
+            resultado = arquivar_alertas(batch_size=2)
+        self.assertEqual(resultado["arquivados"], 4)
+        restantes = AlertaEnviado.objects.get()
+        self.assertEqual(restantes.mensagem, "30 dias")
+        self.assertEqual(AlertaEnviado.alunos.through.objects.count(), 1)
+
+        arquivados = list(ler_arquivo(os.path.join(settings.MEDIA_ROOT, resultado["ficheiro"])))
+        self.assertEqual([a["mensagem"] for a in arquivados], ["700 dias", "500 dias", "400 dias", "400 dias"])
+        self.assertEqual(arquivados[0]["alunos"], [self.aluno.pk])
+        self.assertEqual(arquivados[0]["encarregado_id"], self.encarregado.pk)
+
+    def test_arquivo_interrompido_a_meio_de_um_lote(self):
+        resultado = arquivar_alertas(batch_size=2)
+        caminho = os.path.join(settings.MEDIA_ROOT, resultado["ficheiro"])
+        # a escrita de um terceiro lote parou antes de o membro gzip ficar completo
+        with open(caminho, "ab") as ficheiro:
+            ficheiro.write(gzip.compress(b'{"id": 0, "mensagem": "por apagar"}\n' * 50)[:-20])
+        self.assertEqual(len(list(ler_arquivo(caminho))), 4)
+
+    def test_max_lotes_e_retoma(self):
+        self.assertEqual(arquivar_alertas(batch_size=1, max_lotes=2)["arquivados"], 2)
+        self.assertEqual(arquivar_alertas(batch_size=1)["arquivados"], 2)
+        self.assertEqual(arquivar_alertas(), {"arquivados": 0, "ficheiro": None})
+
+    def test_comando(self):
+        call_command("arquivar_alertas", "--meses", "15", stdout=open(os.devnull, "w"))
+        self.assertEqual(AlertaEnviado.objects.count(), 3)
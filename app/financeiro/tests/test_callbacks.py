@@ -0,0 +1,81 @@
+from io import StringIO
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, LiveServerTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from financeiro.callbacks import processar_callbacks
+from financeiro.models import Mensalidade, Pagamento, CallbackPagamento
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+URL = "/api/financeiro/callbacks/mpesa/"
+TOKEN = "segredo-de-teste"
+
+
+@override_settings(FINANCEIRO_CALLBACK_TOKEN=TOKEN)
+class CallbackPagamentoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        vencimento = date.today() + timedelta(days=5)
+        cls.mensalidade = Mensalidade.objects.create(
+            aluno=criar_aluno(criar_encarregado()), valor=Decimal("1500.00"), mes_referente=vencimento.replace(day=1),
+            data_vencimento=vencimento, data_limite=vencimento,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_CALLBACK_TOKEN=TOKEN)
+
+    def enviar(self, **payload):
+        return self.client.post(URL, payload, format="json")
+
+    def test_token_obrigatorio(self):
+        self.client.credentials(HTTP_X_CALLBACK_TOKEN="errado")
+        self.assertEqual(self.enviar(transaction_id="T1").status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_grava_e_ignora_duplicados(self):
+        with self.assertNumQueries(1):
+            response = self.enviar(input_TransactionID="MP1", input_Amount="1500.00")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.enviar(input_TransactionID="MP1", input_Amount="1500.00").status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(CallbackPagamento.objects.count(), 1)
+        self.assertFalse(Pagamento.objects.exists())
+
+    def test_pedido_invalido(self):
+        self.assertEqual(self.enviar(amount="10").status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post("/api/financeiro/callbacks/paypal/", {"transaction_id": "X"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_worker_cria_pagamentos(self):
+        self.enviar(transaction_id="MP1", amount="1500.00", msisdn="258840000001", reference="ALU000001")
+        self.enviar(transaction_id="MP2", amount="77.00", msisdn="258849999999", reference="?")
+        self.enviar(transaction_id="MP3", amount="abc")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(processar_callbacks(), {"processados": 1, "rejeitados": 2})
+
+        pagamento = Pagamento.objects.get()
+        self.assertEqual((pagamento.mensalidade, pagamento.metodo_pagamento), (self.mensalidade, "MPESA"))
+        self.assertIn("MP1", pagamento.observacao)
+        self.mensalidade.refresh_from_db()
+        self.assertEqual(self.mensalidade.status, "PAGO")
+        erros = dict(CallbackPagamento.objects.filter(estado="REJEITADO").values_list("transacao_id", "erro"))
+        self.assertEqual(erros, {"MP2": "Sem correspondencia", "MP3": "Valor invalido"})
+        self.assertEqual(processar_callbacks(), {"processados": 0, "rejeitados": 0})
+
+
+@override_settings(FINANCEIRO_CALLBACK_TOKEN=TOKEN)
+class SimuladorCallbacksTest(LiveServerTestCase):
+    def test_simulador(self):
+        saida = StringIO()
+        # o sqlite em memoria bloqueia escritas concorrentes entre threads
+        concorrencia = "1" if connection.vendor == "sqlite" else "4"
+        call_command(
+            "simular_callbacks", "--url", f"{self.live_server_url}{URL}", "--token", TOKEN,
+            "--quantidade", "150", "--concorrencia", concorrencia, "--duplicados", "0.2", stdout=saida,
+        )
+        # acima do limite anonimo global (100/hora): os callbacks nao podem ser limitados
+        self.assertIn("Estados: {202: 180}", saida.getvalue())
+        self.assertEqual(CallbackPagamento.objects.count(), 150)
@@ -0,0 +1,98 @@
+import os
+import tempfile
+from io import StringIO
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from financeiro.conciliacao import ler_extrato, conciliar
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+MEDIA_ROOT = tempfile.mkdtemp()
+HOJE = date.today()
+
+
+def extrato_csv():
+    d = HOJE.strftime("%d/%m/%Y")
+    return StringIO(
+        "Data;Descricao;Telefone;Credito;Id Transacao\n"
+        f"{d};Mensalidade ALU000001 marco;;1000,00;T1\n"
+        f"{d};Transferencia;+258 84 000 0002;1.200,00;T2\n"
+        f"{d};Pagamento;;1500,00;T3\n"
+        f"{d};Desconhecido;;999,00;T4\n"
+        f"{d};Comissao;;-50,00;T5\n"
+    )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ConciliacaoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        vencimento = HOJE + timedelta(days=5)
+        cls.mensalidades = {}
+        for n, valor in [(1, "1000.00"), (2, "1200.00"), (3, "1500.00"), (4, "1500.00")]:
+            cls.mensalidades[n] = Mensalidade.objects.create(
+                aluno=criar_aluno(criar_encarregado(n), n), valor=Decimal(valor),
+                mes_referente=vencimento.replace(day=1), data_vencimento=vencimento, data_limite=vencimento,
+            )
+
+    def test_ler_extrato_normaliza(self):
+        extrato = ler_extrato(extrato_csv(), "extrato.csv")
+        self.assertEqual(len(extrato), 4)  # o debito e ignorado
+        self.assertEqual(list(extrato["valor"]), [100000, 120000, 150000, 99900])
+        self.assertEqual(extrato.loc[1, "telefone"], "840000002")
+
+    def test_ler_extrato_datas_iso_e_separadores(self):
+        extrato = ler_extrato(StringIO(
+            "Date,Amount,Description\n"
+            "2026-10-01,\"1,200.00\",A\n"
+            "2026-10-01 14:30:00,1200.5,B\n"
+            "02/10/2026,\"1.234,56\",C\n"
+            "03/10/2026,\"1,200,000\",D\n"
+            "2026-10-01,\"1,200.00\",A\n"
+        ), "extrato.csv")
+        self.assertEqual(
+            [d.date() for d in extrato["data"]],
+            [date(2026, 10, 1), date(2026, 10, 1), date(2026, 10, 2), date(2026, 10, 3), date(2026, 10, 1)],
+        )
+        self.assertEqual(list(extrato["valor"]), [120000, 120050, 123456, 120000000, 120000])
+        # sem coluna de transacao: id pelo conteudo, estavel entre importacoes e distinto para repeticoes
+        transacoes = list(extrato["transacao"])
+        self.assertEqual(len(set(transacoes)), 5)
+        self.assertNotEqual(transacoes[0], "1")
+        self.assertEqual(transacoes[0].rsplit("-", 1)[0], transacoes[4].rsplit("-", 1)[0])
+        self.assertEqual(list(ler_extrato(StringIO(
+            "Date,Amount,Description\n2026-10-01,\"1,200.00\",A\n"
+        ), "extrato.csv")["transacao"]), transacoes[:1])
+
+    def test_conciliacao_em_passagens(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = conciliar(ler_extrato(extrato_csv(), "extrato.csv"))
+
+        self.assertEqual(resultado["criados"], 2)
+        criterios = dict(zip(resultado["conciliadas"]["transacao"], resultado["conciliadas"]["criterio"]))
+        self.assertEqual(criterios, {"T1": "referencia", "T2": "telefone"})
+        motivos = dict(zip(resultado["excecoes"]["transacao"], resultado["excecoes"]["motivo"]))
+        self.assertEqual(motivos, {"T3": "Varias mensalidades possiveis", "T4": "Sem correspondencia"})
+
+        m1 = Mensalidade.objects.get(pk=self.mensalidades[1].pk)
+        self.assertEqual((m1.status, m1.total_pago), ("PAGO", Decimal("1000.00")))
+        self.assertEqual(Pagamento.objects.get(mensalidade=m1).metodo_pagamento, "TRANSFERENCIA")
+
+        # reimportar o mesmo extrato nao duplica pagamentos
+        resultado = conciliar(ler_extrato(extrato_csv(), "extrato.csv"))
+        self.assertEqual(resultado["criados"], 0)
+        self.assertEqual(Pagamento.objects.count(), 2)
+        motivos = dict(zip(resultado["excecoes"]["transacao"], resultado["excecoes"]["motivo"]))
+        self.assertEqual(motivos["T1"], "Movimento ja importado")
+
+    def test_comando_grava_excecoes(self):
+        caminho = os.path.join(MEDIA_ROOT, "extrato.csv")
+        with open(caminho, "w") as ficheiro:
+            ficheiro.write(extrato_csv().getvalue())
+        saida = StringIO()
+        call_command("conciliar_extrato", caminho, "--simular", stdout=saida)
+        self.assertIn("2 conciliados, 0 pagamentos criados, 2 excecoes", saida.getvalue())
+        self.assertFalse(Pagamento.objects.exists())
+        self.assertTrue(os.listdir(os.path.join(MEDIA_ROOT, "conciliacao")))
@@ -0,0 +1,149 @@
+import asyncio
+import socket
+import threading
+import time
+import unittest
+from datetime import timedelta
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from financeiro.despacho import LimiteTaxaDominio, despachar
+from financeiro.models import AlertaEnviado
+from financeiro.tests.utils import criar_encarregado
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:  # dependencia de desenvolvimento
+    Controller = None
+
+
+class Caixa:
+    """Servidor SMTP de teste: guarda as mensagens, rejeita rejeitar@... e demora `atraso` por mensagem"""
+
+    def __init__(self, atraso=0.0):
+        self.atraso = atraso
+        self.mensagens = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("rejeitar@"):
+            return "550 Destinatario rejeitado"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.atraso)
+        self.mensagens.append(envelope)
+        return "250 OK"
+
+
+class LimiteTaxaDominioTest(unittest.TestCase):
+    def test_espaca_por_dominio(self):
+        async def enviar(limite, dominios):
+            inicio = asyncio.get_running_loop().time()
+            await asyncio.gather(*(limite.aguardar(d) for d in dominios))
+            return asyncio.get_running_loop().time() - inicio
+
+        self.assertGreaterEqual(asyncio.run(enviar(LimiteTaxaDominio(20), ["a.com"] * 5)), 0.19)
+        self.assertLess(asyncio.run(enviar(LimiteTaxaDominio(20), ["a.com", "b.com", "c.com"])), 0.05)
+        self.assertLess(asyncio.run(enviar(LimiteTaxaDominio(0), ["a.com"] * 50)), 0.05)
+
+
+class SmtpTesteMixin:
+    """Servidor SMTP local (aiosmtpd) numa porta livre, com EMAIL_PORT apontado para ele"""
+
+    def iniciar_smtp(self, atraso=0.0):
+        with socket.socket() as livre:
+            livre.bind(("127.0.0.1", 0))
+            porta = livre.getsockname()[1]
+        caixa = Caixa(atraso)
+        controlador = Controller(caixa, hostname="127.0.0.1", port=porta)
+        controlador.start()
+        self.addCleanup(controlador.stop)
+        configuracao = override_settings(EMAIL_PORT=porta)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        return caixa
+
+    def criar_alertas(self, emails):
+        encarregado = criar_encarregado()
+        return AlertaEnviado.objects.bulk_create([
+            AlertaEnviado(encarregado=encarregado, email=email, mensagem=f"Mensagem {n}", tipo="ATRASO", status="PENDENTE")
+            for n, email in enumerate(emails)
+        ])
+
+
+@unittest.skipIf(Controller is None, "aiosmtpd nao instalado")
+@override_settings(EMAIL_HOST="127.0.0.1", EMAIL_USE_TLS=False, EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD="")
+class DespachoTest(SmtpTesteMixin, TestCase):
+
+    def test_envia_e_grava_resultados(self):
+        caixa = self.iniciar_smtp()
+        self.criar_alertas([f"pai{n}@escola.co.mz" for n in range(20)] + ["rejeitar@escola.co.mz", ""])
+        AlertaEnviado.objects.filter(mensagem="Mensagem 0").update(status="ENVIADO")
+
+        with CaptureQueriesContext(connection) as queries:
+            total = async_to_sync(despachar)(batch_size=7, concorrencia=5, por_dominio=0)
+        # 3 lotes reservados (7, 7, 7) e um vazio
+        reservas = [q for q in queries.captured_queries if q["sql"].startswith("SELECT") and "LIMIT 7" in q["sql"]]
+        self.assertEqual(len(reservas), 4)
+        self.assertEqual(total, {"enviados": 19, "falhas": 2})
+        self.assertEqual(len(caixa.mensagens), 19)
+        self.assertEqual(AlertaEnviado.objects.filter(status="ENVIADO").count(), 20)
+        self.assertEqual(
+            set(AlertaEnviado.objects.filter(status="FALHA NO ENVIO").values_list("email", flat=True)),
+            {"rejeitar@escola.co.mz", ""},
+        )
+        self.assertFalse(AlertaEnviado.objects.filter(status__in=["PENDENTE", "A ENVIAR"]).exists())
+
+    def test_reservas_de_outro_despachante(self):
+        caixa = self.iniciar_smtp()
+        self.criar_alertas(["a@escola.co.mz", "b@escola.co.mz", "c@escola.co.mz"])
+        AlertaEnviado.objects.filter(email="a@escola.co.mz").update(status="A ENVIAR", data_atualizacao=timezone.now())
+        AlertaEnviado.objects.filter(email="b@escola.co.mz").update(
+            status="A ENVIAR", data_atualizacao=timezone.now() - timedelta(hours=2),
+        )
+        # a reserva recente e de um despachante em curso; a antiga, de um interrompido
+        total = async_to_sync(despachar)(concorrencia=2, por_dominio=0)
+        self.assertEqual(total, {"enviados": 2, "falhas": 0})
+        self.assertEqual({envelope.rcpt_tos[0] for envelope in caixa.mensagens}, {"b@escola.co.mz", "c@escola.co.mz"})
+        self.assertEqual(AlertaEnviado.objects.get(email="a@escola.co.mz").status, "A ENVIAR")
+
+    def test_envios_em_paralelo(self):
+        caixa = self.iniciar_smtp(atraso=0.2)
+        self.criar_alertas([f"pai{n}@dominio{n % 4}.com" for n in range(40)])
+        inicio = time.perf_counter()
+        call_command("despachar_alertas", "--concorrencia", "40", "--por-dominio", "0", stdout=open("/dev/null", "w"))
+        # em serie seriam pelo menos 8s (40 x 0.2s)
+        self.assertLess(time.perf_counter() - inicio, 3)
+        self.assertEqual(len(caixa.mensagens), 40)
+        self.assertEqual(AlertaEnviado.objects.filter(status="ENVIADO").count(), 40)
+
+
+@unittest.skipIf(Controller is None, "aiosmtpd nao instalado")
+@unittest.skipUnless(connection.vendor == "postgresql", "select_for_update(skip_locked) so em PostgreSQL")
+@override_settings(EMAIL_HOST="127.0.0.1", EMAIL_USE_TLS=False, EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD="")
+class DespachoConcorrenciaTest(SmtpTesteMixin, TransactionTestCase):
+    def test_despachantes_em_paralelo_nao_repetem_envios(self):
+        caixa = self.iniciar_smtp(atraso=0.01)
+        self.criar_alertas([f"pai{n}@dominio{n % 4}.com" for n in range(60)])
+        totais, barreira = [], threading.Barrier(3)
+
+        def despachante():
+            try:
+                barreira.wait()
+                totais.append(async_to_sync(despachar)(batch_size=5, concorrencia=4, por_dominio=0))
+            finally:
+                connections.close_all()
+
+        fios = [threading.Thread(target=despachante) for _ in range(3)]
+        for fio in fios:
+            fio.start()
+        for fio in fios:
+            fio.join()
+        self.assertEqual(sum(total["enviados"] for total in totais), 60)
+        self.assertEqual(len(caixa.mensagens), 60)
+        self.assertEqual(len({envelope.rcpt_tos[0] for envelope in caixa.mensagens}), 60)
+        self.assertEqual(AlertaEnviado.objects.filter(status="ENVIADO").count(), 60)
@@ -0,0 +1,96 @@
+import csv
+from io import BytesIO
+from datetime import date, datetime
+from decimal import Decimal
+from django.test import TestCase
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from financeiro.exportacao import gerar_xlsx
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+
+class ExportacaoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.encarregado = criar_encarregado()
+        cls.aluno1 = criar_aluno(cls.encarregado, 1)
+        cls.aluno2 = criar_aluno(cls.encarregado, 2)
+        for n, aluno in enumerate((cls.aluno1, cls.aluno2), start=1):
+            for mes in (1, 2, 3):
+                mensalidade = Mensalidade.objects.create(
+                    aluno=aluno, valor=Decimal("1000.00"), mes_referente=date(2026, mes, 1),
+                    data_vencimento=date(2026, mes, 10), data_limite=date(2026, mes, 15),
+                )
+                Pagamento.objects.create(
+                    mensalidade=mensalidade, valor=Decimal("400.00"),
+                    metodo_pagamento="MPESA" if mes == 2 else "DINHEIRO",
+                )
+
+    def setUp(self):
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.encarregado.user).access_token}")
+
+    def ler_csv(self, resposta):
+        return list(csv.DictReader(b"".join(resposta.streaming_content).decode().splitlines()))
+
+    def test_pagamentos_csv_com_filtros(self):
+        resposta = self.cliente.get("/api/financeiro/pagamentos/exportar/", {"metodo_pagamento": "MPESA"})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('filename="pagamentos.csv"', resposta["Content-Disposition"])
+        linhas = self.ler_csv(resposta)
+        self.assertEqual(len(linhas), 2)
+        self.assertEqual({linha["metodo_pagamento"] for linha in linhas}, {"MPESA"})
+        self.assertEqual({linha["aluno_nome"] for linha in linhas}, {"Aluno 1", "Aluno 2"})
+
+        resposta = self.cliente.get("/api/financeiro/pagamentos/exportar/", {"mensalidade__aluno": self.aluno1.pk})
+        self.assertEqual(len(self.ler_csv(resposta)), 3)
+
+    def test_mensalidades_xlsx(self):
+        resposta = self.cliente.get(
+            "/api/financeiro/mensalidades/exportar/",
+            {"formato": "xlsx", "aluno": self.aluno2.pk, "ordering": "mes_referente"},
+        )
+        self.assertEqual(resposta.status_code, 200)
+        folha = load_workbook(BytesIO(b"".join(resposta.streaming_content))).active
+        linhas = list(folha.values)
+        self.assertEqual(linhas[0][:3], ("id", "referencia", "mes_referente"))
+        self.assertEqual(len(linhas), 4)
+        cabecalho = linhas[0]
+        primeira = dict(zip(cabecalho, linhas[1]))
+        self.assertEqual(primeira["aluno_nome"], "Aluno 2")
+        self.assertEqual(primeira["valor_devido"], 600)
+        self.assertEqual(primeira["mes_referente"].date(), date(2026, 1, 1))
+
+    def test_formato_invalido(self):
+        resposta = self.cliente.get("/api/financeiro/mensalidades/exportar/", {"formato": "pdf"})
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_xlsx_em_streaming(self):
+        lidas = []
+
+        def linhas():
+            for n in range(1200):
+                lidas.append(n)
+                yield {
+                    "n": n, "valor": Decimal("10.50"), "pago": n % 2 == 0, "dia": date(2026, 1, 1),
+                    "quando": timezone.make_aware(datetime(2026, 1, 1, 12, 30)), "nota": None if n else "a < b & c\x01",
+                }
+
+        partes = gerar_xlsx(linhas(), ["n", "valor", "pago", "dia", "quando", "nota"], "Teste")
+        # o inicio do ficheiro sai antes de ser lida qualquer linha, e o resto por blocos
+        inicio = next(partes)
+        self.assertTrue(inicio.startswith(b"PK"))
+        self.assertEqual(lidas, [])
+        resto = list(partes)
+        self.assertGreater(len(resto), 2)
+
+        folha = load_workbook(BytesIO(inicio + b"".join(resto))).active
+        self.assertEqual(folha.title, "Teste")
+        valores = list(folha.values)
+        self.assertEqual(len(valores), 1201)
+        self.assertEqual(valores[1], (0, 10.5, True, datetime(2026, 1, 1), datetime(2026, 1, 1, 12, 30), "a < b & c"))
+        self.assertEqual(valores[2][5], None)
+        self.assertEqual(valores[-1][0], 1199)
@@ -0,0 +1,91 @@
+import unittest
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from financeiro.extrato import extrato, descodificar_cursor
+from financeiro.models import Mensalidade, Pagamento, MovimentoConta
+from financeiro.razao import saldo
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+
+class ExtratoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.encarregado = criar_encarregado()
+        hoje = date.today()
+        for n in (1, 2):
+            aluno = criar_aluno(cls.encarregado, n)
+            for meses in range(3):
+                vencimento = hoje - timedelta(days=30 * meses)
+                mensalidade = Mensalidade.objects.create(
+                    aluno=aluno, valor=Decimal("1000.00"), mes_referente=vencimento.replace(day=1),
+                    data_vencimento=vencimento + timedelta(days=20), data_limite=vencimento + timedelta(days=25),
+                )
+                Pagamento.objects.create(mensalidade=mensalidade, valor=Decimal("400.00") * n)
+        # outro encarregado, fora do extrato
+        outro = criar_encarregado(2)
+        Mensalidade.objects.create(
+            aluno=criar_aluno(outro, 3), valor=Decimal("999.00"), mes_referente=hoje.replace(day=1),
+            data_vencimento=hoje, data_limite=hoje,
+        )
+        cls.outro = outro
+
+    def todas_as_paginas(self, limite):
+        linhas, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                pagina, proximo = extrato(self.encarregado.pk, cursor, limite)
+            linhas.extend(pagina)
+            if not proximo:
+                return linhas
+            cursor = descodificar_cursor(proximo)
+
+    def test_saldo_corrente_por_data(self):
+        linhas = self.todas_as_paginas(limite=4)
+        self.assertEqual(len(linhas), 12)
+        self.assertEqual(linhas, sorted(linhas, key=lambda linha: (linha["data"], linha["id"])))
+        acumulado = Decimal("0.00")
+        for linha in linhas:
+            acumulado += linha["valor"]
+            self.assertEqual(linha["saldo_corrente"], acumulado)
+        self.assertEqual(acumulado, Decimal("6000.00") - Decimal("3600.00"))
+        self.assertEqual({linha["aluno_nome"] for linha in linhas}, {"Aluno 1", "Aluno 2"})
+        self.assertEqual(self.todas_as_paginas(limite=50), linhas)
+
+    def test_mensalidade_apagada_continua_no_extrato(self):
+        Mensalidade.objects.filter(aluno__nome="Aluno 1").first().delete()
+        linhas = self.todas_as_paginas(limite=5)
+        self.assertEqual(len(linhas), MovimentoConta.objects.filter(encarregado_id=self.encarregado.pk).count())
+        self.assertEqual(linhas[-1]["saldo_corrente"], saldo(encarregado=self.encarregado.pk))
+        self.assertIn(None, {linha["mes_referente"] for linha in linhas})
+
+    def test_api(self):
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.encarregado.user).access_token}")
+        url, ids = f"/api/financeiro/movimentos/extrato/?encarregado={self.encarregado.pk}&page_size=5", []
+        while url:
+            resposta = cliente.get(url)
+            self.assertEqual(resposta.status_code, 200)
+            ids.extend(linha["id"] for linha in resposta.data["results"])
+            url = resposta.data["next"]
+        self.assertEqual(ids, [linha["id"] for linha in extrato(self.encarregado.pk, limite=50)[0]])
+
+        self.assertEqual(cliente.get(f"/api/financeiro/movimentos/extrato/?encarregado={self.outro.pk}").status_code, 403)
+        resposta = cliente.get(f"/api/financeiro/movimentos/extrato/?encarregado={self.encarregado.pk}&cursor=x")
+        self.assertEqual(resposta.status_code, 400)
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "planos do PostgreSQL")
+    def test_total_ate_ao_cursor_calculado_uma_vez(self):
+        _, proximo = extrato(self.encarregado.pk, limite=4)
+        with CaptureQueriesContext(connection) as queries:
+            extrato(self.encarregado.pk, descodificar_cursor(proximo), limite=4)
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN " + queries.captured_queries[0]["sql"])
+            plano = "\n".join(linha[0] for linha in cursor.fetchall())
+        # a soma ate ao cursor e um InitPlan; os SubPlans por linha sao so os lookups de aluno/mensalidade
+        self.assertIn("InitPlan", plano)
+        self.assertEqual(plano.count("on financeiro_movimentoconta"), 2)
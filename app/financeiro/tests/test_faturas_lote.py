@@ -0,0 +1,73 @@
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core import mail
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from financeiro.models import Fatura, EventoOutbox
+from financeiro.outbox import despachar_outbox
+from financeiro.services import liquidar_faturas
+from financeiro.tests.utils import criar_encarregado, tasks_eager
+
+MEDIA_ROOT = tempfile.mkdtemp()
+URL = "/api/financeiro/faturas/"
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, FINANCEIRO_RECIBOS_PROCESSOS=1)
+class FaturasLoteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.encarregado = criar_encarregado()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        tasks_eager(self)
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.encarregado.user).access_token}")
+
+    def emitir(self, quantidade):
+        vencimento = (date.today() + timedelta(days=30)).isoformat()
+        faturas = [
+            {"descricao": f"Servico {n}", "valor": "2500.00", "data_vencimento": vencimento, "email_destinatario": f"cliente{n}@test.com"}
+            for n in range(quantidade)
+        ]
+        return self.cliente.post(f"{URL}emitir/", {"faturas": faturas}, format="json")
+
+    def test_emitir_em_lote(self):
+        resposta = self.emitir(3)
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(resposta.data["emitidas"], 3)
+        self.assertEqual(Fatura.objects.filter(status="PENDENTE").count(), 3)
+
+        invalida = {"descricao": "X", "valor": "10.00", "data_vencimento": "2000-01-01", "email_destinatario": "x@test.com"}
+        resposta = self.cliente.post(f"{URL}emitir/", {"faturas": [invalida]}, format="json")
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(Fatura.objects.count(), 3)
+
+    def test_liquidar_captura_transicoes(self):
+        self.emitir(3)
+        ids = sorted(Fatura.objects.values_list("id", flat=True))
+        Fatura.objects.filter(pk=ids[0]).update(status="PAGO")
+
+        resposta = self.cliente.post(f"{URL}liquidar/", {"faturas": ids}, format="json")
+        self.assertEqual(resposta.data, {"pagas": 2, "faturas": ids[1:]})
+        self.assertEqual(Fatura.objects.filter(status="PAGO", data_pagamento__isnull=False).count(), 2)
+        self.assertEqual(EventoOutbox.objects.get().args, ["fatura", ids[1:]])
+        self.assertEqual(liquidar_faturas(ids), [])
+
+        despachar_outbox()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(Fatura.objects.filter(recibo_gerado=True).count(), 2)
+
+    def test_save_nao_rele_o_status(self):
+        self.emitir(1)
+        fatura = Fatura.objects.get()
+        fatura.descricao = "Alterada"
+        with self.assertNumQueries(1):
+            fatura.save()
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from django.core import mail
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.models import Cargo
+from financeiro.models import Salario, EventoOutbox
+from financeiro.outbox import despachar_outbox
+from financeiro.services import gerar_folha_salarios, pagar_salarios
+from financeiro.tests.utils import tasks_eager
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+MAIO = date(2026, 5, 1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, FINANCEIRO_RECIBOS_PROCESSOS=1)
+class FolhaSalariosTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cargos = {
+            nome: Cargo.objects.create(nome=nome, salario_padrao=Decimal(valor))
+            for nome, valor in (("FUNCIONARIO", "8000.00"), ("MOTORISTA", "12000.00"), ("ADMINISTRADOR", "0.00"), ("ENCARREGADO", "0.00"))
+        }
+        cls.funcionario = User.objects.create_user(email="f@test.com", nome="Funcionario", role=cargos["FUNCIONARIO"], password="Senhacommais8")
+        cls.motorista = User.objects.create_user(
+            email="m@test.com", nome="Motorista", role=cargos["MOTORISTA"], password="Senhacommais8", salario=Decimal("15000.00"),
+        )
+        cls.admin_sem_salario = User.objects.create_user(email="a@test.com", nome="Admin", role=cargos["ADMINISTRADOR"], password="Senhacommais8")
+        User.objects.create_user(email="e@test.com", nome="Encarregado", role=cargos["ENCARREGADO"], password="Senhacommais8")
+        User.objects.create_user(email="i@test.com", nome="Inativo", role=cargos["FUNCIONARIO"], password="Senhacommais8", is_active=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        tasks_eager(self)
+
+    def test_gerar_folha_idempotente(self):
+        # um SELECT e um INSERT (mais SAVEPOINT/RELEASE da transacao)
+        with self.assertNumQueries(4):
+            resultado = gerar_folha_salarios(2026, 5)
+        self.assertEqual(resultado, {"criados": 2, "ignorados": 0, "sem_valor": [self.admin_sem_salario.pk]})
+        valores = dict(Salario.objects.filter(mes_referente=MAIO).values_list("funcionario_id", "valor"))
+        self.assertEqual(valores, {self.funcionario.pk: Decimal("8000.00"), self.motorista.pk: Decimal("15000.00")})
+
+        self.assertEqual(gerar_folha_salarios(2026, 5)["ignorados"], 2)
+        self.assertEqual(Salario.objects.count(), 2)
+
+    def test_salario_unico_por_mes(self):
+        Salario.objects.create(funcionario=self.funcionario, valor=Decimal("8000.00"), mes_referente=MAIO)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Salario.objects.create(funcionario=self.funcionario, valor=Decimal("8000.00"), mes_referente=MAIO)
+        # uma execucao concorrente que ja passou a verificacao nao falha nem duplica
+        Salario.objects.bulk_create(
+            [Salario(funcionario=self.funcionario, valor=Decimal("8000.00"), mes_referente=MAIO)], ignore_conflicts=True,
+        )
+        self.assertEqual(Salario.objects.filter(funcionario=self.funcionario).count(), 1)
+
+    def test_pagar_em_lote_e_recibos(self):
+        gerar_folha_salarios(2026, 5)
+        ids = pagar_salarios(Salario.objects.filter(mes_referente=MAIO))
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(Salario.objects.filter(status="PAGO", data_pagamento__isnull=False).count(), 2)
+        evento = EventoOutbox.objects.get()
+        self.assertEqual(evento.tarefa, "financeiro.tasks.enviar_recibos_lote")
+        self.assertEqual(pagar_salarios(Salario.objects.all()), [])
+
+        despachar_outbox()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual({m.to[0] for m in mail.outbox}, {"f@test.com", "m@test.com"})
+        self.assertEqual(Salario.objects.filter(recibo_gerado=True).count(), 2)
+        for salario in Salario.objects.all():
+            self.assertTrue(os.path.exists(os.path.join(MEDIA_ROOT, "recibos", "salario", f"{salario.pk // 1000:05d}", f"salario-{salario.pk}.pdf")))
+
+    def test_api_e_comando(self):
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.funcionario).access_token}")
+        resposta = cliente.post("/api/financeiro/salarios/gerar-folha/", {"ano": 2026, "mes": 5}, format="json")
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(resposta.data["criados"], 2)
+
+        resposta = cliente.post("/api/financeiro/salarios/pagar/", {}, format="json")
+        self.assertEqual(resposta.status_code, 400)
+        resposta = cliente.post("/api/financeiro/salarios/pagar/", {"ano": 2026, "mes": 5}, format="json")
+        self.assertEqual(resposta.data["pagos"], 2)
+
+        saida = StringIO()
+        call_command("gerar_folha_salarios", "--ano", "2026", "--mes", "6", stdout=saida)
+        self.assertIn("2 salarios criados", saida.getvalue())
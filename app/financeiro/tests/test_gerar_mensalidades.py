@@ -0,0 +1,47 @@
+from io import StringIO
+from datetime import date
+from decimal import Decimal
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from financeiro.models import Mensalidade
+from financeiro.services import gerar_mensalidades, calcular_datas
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+
+@override_settings(FINANCEIRO_DIA_VENCIMENTO=10, FINANCEIRO_DIA_LIMITE=15)
+class GerarMensalidadesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        encarregado = criar_encarregado()
+        cls.aluno1 = criar_aluno(encarregado, 1, mensalidade=Decimal("1500.00"))
+        cls.aluno2 = criar_aluno(encarregado, 2, mensalidade=Decimal("2000.00"))
+        criar_aluno(encarregado, 3, ativo=False)
+
+    def test_calcular_datas(self):
+        self.assertEqual(
+            calcular_datas(2026, 2),
+            (date(2026, 2, 1), date(2026, 2, 10), date(2026, 2, 15)),
+        )
+
+    def test_gera_mes_para_alunos_ativos(self):
+        resultado = gerar_mensalidades(2026, [3])
+        self.assertEqual(resultado, {"criadas": 2, "ignoradas": 0})
+        mensalidade = Mensalidade.objects.get(aluno=self.aluno2)
+        self.assertEqual(mensalidade.valor, Decimal("2000.00"))
+        self.assertEqual(mensalidade.mes_referente, date(2026, 3, 1))
+        self.assertEqual(mensalidade.data_vencimento, date(2026, 3, 10))
+
+    def test_reexecucao_e_idempotente(self):
+        Mensalidade.objects.create(
+            aluno=self.aluno1, valor=Decimal("900.00"), mes_referente=date(2026, 3, 1),
+            data_vencimento=date(2026, 3, 5), data_limite=date(2026, 3, 8),
+        )
+        self.assertEqual(gerar_mensalidades(2026, [3]), {"criadas": 1, "ignoradas": 1})
+        self.assertEqual(gerar_mensalidades(2026, [3]), {"criadas": 0, "ignoradas": 2})
+        self.assertEqual(Mensalidade.objects.get(aluno=self.aluno1).valor, Decimal("900.00"))
+
+    def test_comando_gera_ano_inteiro(self):
+        out = StringIO()
+        call_command("gerar_mensalidades", ano=2026, stdout=out)
+        self.assertEqual(Mensalidade.objects.count(), 24)
+        self.assertIn("24 mensalidades criadas", out.getvalue())
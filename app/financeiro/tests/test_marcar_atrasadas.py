@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.test import TestCase
+from django.db.models.signals import post_save
+from financeiro.models import Mensalidade, Fatura
+from financeiro.services import marcar_atrasadas
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+
+class MarcarAtrasadasTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        encarregado = criar_encarregado()
+        ontem = date.today() - timedelta(days=1)
+        amanha = date.today() + timedelta(days=1)
+        cls.vencidas = []
+        for n, (vencimento, status) in enumerate([
+            (ontem, "PENDENTE"), (ontem, "PENDENTE"), (ontem, "PAGO PARCIAL"), (amanha, "PENDENTE"),
+        ], start=1):
+            mensalidade = Mensalidade.objects.create(
+                aluno=criar_aluno(encarregado, n), valor=Decimal("1000.00"), mes_referente=ontem.replace(day=1),
+                data_vencimento=vencimento, data_limite=vencimento, status=status,
+            )
+            if vencimento == ontem and status == "PENDENTE":
+                cls.vencidas.append(mensalidade.pk)
+        cls.fatura_vencida = Fatura.objects.create(
+            descricao="Combustivel", valor=Decimal("500.00"), data_emissao=ontem,
+            data_vencimento=ontem, email_destinatario="fornecedor@test.com",
+        )
+        Fatura.objects.create(
+            descricao="Seguro", valor=Decimal("500.00"), data_emissao=ontem,
+            data_vencimento=amanha, email_destinatario="fornecedor@test.com",
+        )
+
+    def test_marca_em_lote_sem_post_save(self):
+        chamadas = []
+
+        def receptor(sender, **kwargs):
+            chamadas.append(sender)
+
+        post_save.connect(receptor)
+        try:
+            resultado = marcar_atrasadas(batch_size=1)
+        finally:
+            post_save.disconnect(receptor)
+
+        self.assertEqual(sorted(resultado["mensalidades"]), sorted(self.vencidas))
+        self.assertEqual(resultado["faturas"], [self.fatura_vencida.pk])
+        self.assertEqual(chamadas, [])
+        self.assertEqual(
+            sorted(Mensalidade.objects.filter(status="ATRASADO").values_list("pk", flat=True)),
+            sorted(self.vencidas),
+        )
+        self.assertEqual(Fatura.objects.filter(status="ATRASADO").count(), 1)
+
+    def test_segunda_execucao_nao_altera_nada(self):
+        marcar_atrasadas()
+        self.assertEqual(marcar_atrasadas(), {"mensalidades": [], "faturas": []})
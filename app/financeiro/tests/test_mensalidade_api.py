@@ -0,0 +1,72 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+
+class MensalidadeAPIQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.encarregado = criar_encarregado()
+        cls.alunos = [criar_aluno(cls.encarregado, n) for n in range(1, 7)]
+
+    def setUp(self):
+        self.client = APIClient()
+        refresh = RefreshToken.for_user(self.encarregado.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def criar_mensalidades(self, alunos):
+        vencimento = date.today() - timedelta(days=12)
+        for aluno in alunos:
+            mensalidade = Mensalidade.objects.create(
+                aluno=aluno, valor=Decimal("1000.00"), mes_referente=vencimento.replace(day=1),
+                data_vencimento=vencimento, data_limite=vencimento,
+            )
+            Pagamento.objects.create(mensalidade=mensalidade, valor=Decimal("100.00"))
+            Pagamento.objects.create(mensalidade=mensalidade, valor=Decimal("50.00"))
+
+    def contar_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response
+
+    def assertQueriesConstantes(self, url, **campos):
+        self.criar_mensalidades(self.alunos[:2])
+        Mensalidade.objects.update(**campos)
+        poucas, _ = self.contar_queries(url)
+        self.criar_mensalidades(self.alunos[2:])
+        Mensalidade.objects.update(**campos)
+        muitas, response = self.contar_queries(url)
+        self.assertEqual(poucas, muitas)
+        return response
+
+    def test_listagem_com_numero_constante_de_queries(self):
+        response = self.assertQueriesConstantes("/api/financeiro/mensalidades/", obs="")
+        self.assertEqual(response.data["count"], 6)
+
+    def test_acao_atrasadas_com_numero_constante_de_queries(self):
+        response = self.assertQueriesConstantes("/api/financeiro/mensalidades/atrasadas/", status="ATRASADO")
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(Decimal(response.data[0]["valor_atualizado"]), Decimal("1200.00"))
+
+    def test_calculos_sql_iguais_as_properties(self):
+        self.criar_mensalidades(self.alunos[:1])
+        Mensalidade.objects.update(status="ATRASADO")
+        anotada = Mensalidade.objects.com_calculos().get()
+        python = Mensalidade.objects.get()
+        self.assertEqual(anotada.dias_atraso, 12)
+        self.assertEqual(anotada.dias_atraso, python.dias_atraso)
+        self.assertEqual(anotada.valor_atualizado, python.valor_atualizado)
+        self.assertEqual(anotada.valor_atualizado, Decimal("1200.00"))
+
+        _, response = self.contar_queries(f"/api/financeiro/mensalidades/{anotada.pk}/")
+        self.assertEqual(Decimal(response.data["valor_atualizado"]), Decimal("1200.00"))
+        self.assertEqual(Decimal(response.data["total_pago"]), Decimal("150.00"))
+        self.assertEqual(len(response.data["pagamentos"]), 2)
@@ -0,0 +1,61 @@
+import time
+from unittest import mock
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from financeiro import notificacoes
+from financeiro.models import AlertaEnviado
+from financeiro.tasks import enviar_alertas_lote
+from financeiro.tests.utils import criar_encarregado
+
+
+class BackendComFalhas(EmailBackend):
+    """locmem que rejeita destinatarios @falha.test"""
+
+    def send_messages(self, messages):
+        if any(r.endswith("@falha.test") for m in messages for r in m.to):
+            raise ConnectionError("destinatario rejeitado")
+        return super().send_messages(messages)
+
+
+class EnvioAlertasLoteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        encarregado = criar_encarregado()
+        emails = ["a@test.com", "b@test.com", "", "c@falha.test", "d@test.com"]
+        cls.alertas = [
+            AlertaEnviado.objects.create(encarregado=encarregado, email=email, mensagem=f"Alerta {i}", tipo="ATRASO", status="PENDENTE")
+            for i, email in enumerate(emails)
+        ]
+        cls.ids = [a.pk for a in cls.alertas]
+
+    def estados(self):
+        return dict(AlertaEnviado.objects.filter(pk__in=self.ids).values_list("email", "status"))
+
+    @override_settings(EMAIL_BACKEND="financeiro.tests.test_notificacoes.BackendComFalhas")
+    def test_uma_ligacao_e_um_update_por_lote(self):
+        with mock.patch.object(notificacoes, "get_connection", wraps=notificacoes.get_connection) as conexao:
+            with self.assertNumQueries(4):  # 2 lotes x (SELECT + UPDATE)
+                resultado = notificacoes.enviar_alertas(self.ids, batch_size=3, por_segundo=0)
+
+        conexao.assert_called_once()
+        self.assertEqual(resultado, {"enviados": 3, "falhas": 2})
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(self.estados(), {
+            "a@test.com": "ENVIADO", "b@test.com": "ENVIADO", "": "FALHA NO ENVIO",
+            "c@falha.test": "FALHA NO ENVIO", "d@test.com": "ENVIADO",
+        })
+
+    def test_task_com_limite_de_taxa(self):
+        inicio = time.monotonic()
+        with self.settings(FINANCEIRO_EMAILS_POR_SEGUNDO=50):
+            enviar_alertas_lote([self.alertas[0].pk, self.alertas[1].pk, self.alertas[4].pk])
+        self.assertGreaterEqual(time.monotonic() - inicio, 2 / 50)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].subject, "Alerta de Pagamento em atraso")
+
+    @override_settings(EMAIL_BACKEND="django.core.mail.backends.console.EmailBackend")
+    def test_backend_console(self):
+        with mock.patch("sys.stdout"):
+            resultado = notificacoes.enviar_alertas([self.alertas[0].pk], por_segundo=0)
+        self.assertEqual(resultado["enviados"], 1)
@@ -0,0 +1,68 @@
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+from django.core import mail
+from django.db import transaction
+from django.test import TestCase, override_settings
+from financeiro.models import Fatura, EventoOutbox
+from financeiro.outbox import despachar_outbox
+from financeiro.tasks import enviar_recibos_individual
+from financeiro.tests.utils import tasks_eager
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class OutboxTest(TestCase):
+    def setUp(self):
+        tasks_eager(self)
+
+    def criar_fatura_paga(self):
+        return Fatura.objects.create(
+            descricao="Servico de transporte", valor=Decimal("1550.00"), data_vencimento=date.today(),
+            email_destinatario="cliente@test.com", status="PAGO",
+        )
+
+    def test_escrita_grava_evento_sem_enviar(self):
+        with mock.patch.object(enviar_recibos_individual, "delay") as delay:
+            fatura = self.criar_fatura_paga()
+        delay.assert_not_called()
+        evento = EventoOutbox.objects.get()
+        self.assertEqual(evento.tarefa, "financeiro.tasks.enviar_recibos_individual")
+        self.assertEqual(evento.args, ["fatura", fatura.pk])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_rollback_descarta_evento(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.criar_fatura_paga()
+                raise RuntimeError
+        self.assertFalse(EventoOutbox.objects.exists())
+
+    def test_chave_evita_duplicados(self):
+        EventoOutbox.objects.registar("financeiro.tasks.enviar_resumos_atraso", chave="x")
+        EventoOutbox.objects.registar("financeiro.tasks.enviar_resumos_atraso", chave="x")
+        self.assertEqual(EventoOutbox.objects.count(), 1)
+
+    def test_relay_despacha_e_marca_processado(self):
+        self.criar_fatura_paga()
+        EventoOutbox.objects.registar("financeiro.tasks.nao_existe")
+
+        self.assertEqual(despachar_outbox(), {"enviados": 1, "falhas": 0})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(EventoOutbox.objects.pendentes().exists())
+        self.assertEqual(EventoOutbox.objects.get(tarefa="financeiro.tasks.nao_existe").erro, "Task desconhecida")
+
+        despachar_outbox()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_falha_do_broker_mantem_pendente(self):
+        self.criar_fatura_paga()
+        with mock.patch.object(enviar_recibos_individual, "apply_async", side_effect=ConnectionError("broker offline")):
+            self.assertEqual(despachar_outbox(), {"enviados": 0, "falhas": 1})
+        evento = EventoOutbox.objects.get()
+        self.assertIsNone(evento.processado_em)
+        self.assertEqual(evento.tentativas, 1)
+        self.assertIn("broker offline", evento.erro)
+
+        despachar_outbox()
+        self.assertEqual(len(mail.outbox), 1)
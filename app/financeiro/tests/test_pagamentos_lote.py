@@ -0,0 +1,76 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+URL = "/api/financeiro/pagamentos/lote/"
+
+
+class PagamentosLoteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.encarregado = criar_encarregado()
+        vencimento = date.today() + timedelta(days=5)
+        cls.mensalidades = [
+            Mensalidade.objects.create(
+                aluno=criar_aluno(cls.encarregado, n), valor=Decimal("1000.00"), mes_referente=vencimento.replace(day=1),
+                data_vencimento=vencimento, data_limite=vencimento,
+            )
+            for n in (1, 2)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        refresh = RefreshToken.for_user(self.encarregado.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def test_resultados_por_item(self):
+        m1, m2 = self.mensalidades
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(URL, {"pagamentos": [
+                {"mensalidade": m1.pk, "valor": "600.00"},
+                {"mensalidade": m1.pk, "valor": "400.00", "metodo_pagamento": "TRANSFERENCIA"},
+                {"mensalidade": m2.pk, "valor": "300.00"},
+                {"mensalidade": m2.pk, "valor": "800.00"},
+                {"mensalidade": m2.pk, "valor": "-1"},
+                {"mensalidade": 999999, "valor": "10.00"},
+            ]}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data["criados"], 3)
+        estados = [r["status"] for r in response.data["resultados"]]
+        self.assertEqual(estados, ["criado", "criado", "criado", "rejeitado", "rejeitado", "rejeitado"])
+        self.assertIn("valor", response.data["resultados"][3]["erros"])
+        self.assertIn("mensalidade", response.data["resultados"][5]["erros"])
+
+        m1.refresh_from_db()
+        m2.refresh_from_db()
+        self.assertEqual((m1.status, m1.total_pago, m1.valor_devido), ("PAGO", Decimal("1000.00"), Decimal("0.00")))
+        self.assertIsNotNone(m1.data_pagamento)
+        self.assertEqual((m2.status, m2.total_pago), ("PAGO PARCIAL", Decimal("300.00")))
+        self.assertEqual(Pagamento.objects.count(), 3)
+
+    def test_queries_nao_dependem_do_tamanho(self):
+        itens = [{"mensalidade": m.pk, "valor": "5.00"} for m in self.mensalidades for _ in range(100)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(URL, {"pagamentos": itens}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Pagamento.objects.count(), 200)
+        # inclui a sincronizacao do livro razao (numero fixo de queries)
+        self.assertLess(len(queries), 18)
+        self.assertEqual(Mensalidade.objects.get(pk=self.mensalidades[0].pk).total_pago, Decimal("500.00"))
+
+    def test_lote_todo_rejeitado(self):
+        response = self.client.post(URL, {"pagamentos": [{"mensalidade": self.mensalidades[0].pk, "valor": "5000.00"}]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Pagamento.objects.exists())
+
+    def test_lote_vazio(self):
+        response = self.client.post(URL, {"pagamentos": []}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+
+class CursorPaginacaoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.encarregado = criar_encarregado()
+        aluno = criar_aluno(cls.encarregado)
+        mensalidade = Mensalidade.objects.create(
+            aluno=aluno, valor=Decimal("100000.00"), mes_referente=date.today().replace(day=1),
+            data_vencimento=date.today() + timedelta(days=10), data_limite=date.today() + timedelta(days=15),
+        )
+        agora = timezone.now()
+        # varios pagamentos com a mesma data para exercitar o desempate pelo id
+        Pagamento.objects.bulk_create([
+            Pagamento(mensalidade=mensalidade, valor=Decimal("10.00"), data_pagamento=agora - timedelta(hours=n // 3))
+            for n in range(25)
+        ])
+
+    def setUp(self):
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.encarregado.user).access_token}")
+
+    def test_percorre_todo_o_historico_sem_count(self):
+        url, ids, paginas = "/api/financeiro/pagamentos/?page_size=7", [], 0
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                resposta = self.cliente.get(url)
+            self.assertEqual(resposta.status_code, 200)
+            self.assertNotIn("count", resposta.data)
+            self.assertFalse(any("COUNT(" in q["sql"].upper() for q in queries.captured_queries))
+            ids.extend(p["id"] for p in resposta.data["results"])
+            url, paginas = resposta.data["next"], paginas + 1
+
+        self.assertEqual(paginas, 4)
+        esperado = list(Pagamento.objects.order_by("-data_pagamento", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, esperado)
+
+    def test_ordenacao_fora_do_cursor_e_ignorada(self):
+        resposta = self.cliente.get("/api/financeiro/pagamentos/?ordering=valor&page_size=30")
+        self.assertEqual(resposta.status_code, 200)
+        esperado = list(Pagamento.objects.order_by("-data_pagamento", "-id").values_list("id", flat=True))
+        self.assertEqual([p["id"] for p in resposta.data["results"]], esperado)
+
+    def test_alertas_usam_cursor(self):
+        resposta = self.cliente.get("/api/financeiro/alertas/")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(set(resposta.data), {"next", "previous", "results"})
@@ -0,0 +1,92 @@
+import unittest
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from financeiro import particoes
+from financeiro.models import Mensalidade, Pagamento, AlertaEnviado
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+
+class NomesParticoesTest(TestCase):
+    def test_inicio_mes_de_data_e_datetime(self):
+        self.assertEqual(particoes.inicio_mes(date(2024, 2, 29)), timezone.make_aware(datetime(2024, 2, 1)))
+        self.assertEqual(
+            particoes.inicio_mes(timezone.make_aware(datetime(2024, 12, 31, 23, 59))),
+            timezone.make_aware(datetime(2024, 12, 1)),
+        )
+
+    def test_nome_particao(self):
+        self.assertEqual(particoes.nome_particao("financeiro_pagamento", date(2024, 3, 1)), "financeiro_pagamento_p202403")
+
+    @unittest.skipIf(connection.vendor == "postgresql", "so fora do PostgreSQL")
+    def test_sem_postgresql(self):
+        self.assertEqual(particoes.manter(), {})
+        with self.assertRaises(CommandError):
+            call_command("particoes_mensais")
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "particionamento declarativo so em PostgreSQL")
+class ConversaoParticoesTest(TestCase):
+    def setUp(self):
+        self.encarregado = criar_encarregado()
+        self.aluno = criar_aluno(self.encarregado)
+        self.mensalidade = Mensalidade.objects.create(
+            aluno=self.aluno, valor=Decimal("1000.00"), mes_referente=date.today().replace(day=1),
+            data_vencimento=date.today() + timedelta(days=10), data_limite=date.today() + timedelta(days=15),
+        )
+        self.agora = timezone.now()
+        self.antigo = Pagamento.objects.create(
+            mensalidade=self.mensalidade, valor=Decimal("100.00"), data_pagamento=self.agora - timedelta(days=400),
+        )
+        alerta = AlertaEnviado.objects.create(encarregado=self.encarregado, email="e@x.com", mensagem="m")
+        alerta.alunos.add(self.aluno)
+
+    def test_converter_manter_e_desanexar(self):
+        AlertaEnviado.objects.update(enviado_em=self.agora - timedelta(days=400))
+        call_command("particoes_mensais", "--converter", "pagamento", "alerta", "--meses-futuros", "2")
+        tabela = Pagamento._meta.db_table
+        self.assertTrue(particoes.particionada(tabela))
+        self.assertTrue(particoes.particionada(AlertaEnviado._meta.db_table))
+        nomes = [nome for nome, _ in particoes.particoes(tabela)]
+        self.assertIn(particoes.nome_particao(tabela, particoes.inicio_mes(self.agora + timedelta(days=62))), nomes)
+
+        # o ORM continua a funcionar sobre a tabela particionada (dados copiados, sequencia mantida)
+        novo = Pagamento.objects.create(mensalidade=self.mensalidade, valor=Decimal("50.00"))
+        self.assertGreater(novo.pk, self.antigo.pk)
+        self.assertEqual(Pagamento.objects.filter(mensalidade=self.mensalidade).count(), 2)
+        self.assertEqual(AlertaEnviado.objects.get().alunos.get(), self.aluno)
+
+        # idempotente: nada a criar; com retencao, so a particao do alerta antigo sai da tabela
+        # (os pagamentos entram nos totais das mensalidades)
+        self.assertEqual(particoes.manter(meses_futuros=2)[tabela]["criadas"], [])
+        tabela_alertas = AlertaEnviado._meta.db_table
+        resultado = particoes.manter(meses_futuros=2, reter_meses=6)
+        self.assertEqual(resultado[tabela]["desanexadas"], [])
+        self.assertTrue(Pagamento.objects.filter(pk=self.antigo.pk).exists())
+        self.assertIn(
+            particoes.nome_particao(tabela_alertas, particoes.inicio_mes(self.agora - timedelta(days=400))),
+            resultado[tabela_alertas]["desanexadas"],
+        )
+        self.assertFalse(AlertaEnviado.objects.exists())
+
+    def test_linhas_na_particao_default_passam_para_a_nova(self):
+        particoes.converter("pagamento", meses_futuros=1)
+        tabela = Pagamento._meta.db_table
+        futuro = Pagamento.objects.create(
+            mensalidade=self.mensalidade, valor=Decimal("75.00"), data_pagamento=self.agora + timedelta(days=150),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {tabela}_default")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+        criadas = particoes.manter(meses_futuros=6)[tabela]["criadas"]
+        self.assertIn(particoes.nome_particao(tabela, particoes.inicio_mes(futuro.data_pagamento)), criadas)
+        self.assertEqual(particoes.manter(meses_futuros=6)[tabela]["criadas"], [])
+        self.assertEqual(Pagamento.objects.get(pk=futuro.pk).valor, Decimal("75.00"))
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {tabela}_default")
+            self.assertEqual(cursor.fetchone()[0], 0)
@@ -0,0 +1,82 @@
+"""Regressao de indices: as queries dos managers nao podem cair em Seq Scan sobre tabelas grandes.
+So corre em PostgreSQL (o plano depende do planeador e das estatisticas do ANALYZE)."""
+import unittest
+from datetime import date, timedelta
+from decimal import Decimal
+from dateutil.relativedelta import relativedelta
+from django.db import connection
+from django.test import TestCase
+from alunos.models import Aluno
+from financeiro.models import Mensalidade, Pagamento, Fatura
+from financeiro.tests.planos import varrimentos_sequenciais
+from financeiro.tests.utils import criar_encarregado
+
+LIMIAR_LINHAS = 1000
+ALUNOS = 600
+MESES = 36
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "EXPLAIN so e verificado em PostgreSQL")
+class PlanosConsultaTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        hoje = date.today()
+        cls.mes_atual = hoje.replace(day=1)
+        encarregado = criar_encarregado()
+        alunos = Aluno.objects.bulk_create([
+            Aluno(
+                nome=f"Aluno {n}", data_nascimento=date(2015, 1, 1), nrBI=f"PLN{n:06d}", encarregado=encarregado,
+                escola_dest="Escola", classe="3", mensalidade=Decimal("1500.00"),
+            )
+            for n in range(ALUNOS)
+        ])
+
+        # a grande maioria paga; so os dois ultimos meses em aberto
+        mensalidades = []
+        for recuo in range(MESES):
+            mes = cls.mes_atual - relativedelta(months=recuo)
+            status = "PAGO" if recuo > 1 else ("ATRASADO" if recuo == 1 else "PENDENTE")
+            mensalidades.extend(
+                Mensalidade(
+                    aluno=aluno, valor=Decimal("1500.00"), mes_referente=mes, status=status,
+                    data_vencimento=mes.replace(day=10), data_limite=mes.replace(day=15),
+                    total_pago=Decimal("1500.00") if status == "PAGO" else Decimal("0.00"),
+                )
+                for aluno in alunos
+            )
+        mensalidades = Mensalidade.objects.bulk_create(mensalidades, batch_size=5000)
+        Pagamento.objects.bulk_create([
+            Pagamento(mensalidade=m, valor=m.valor, data_pagamento=m.data_vencimento.replace(day=5))
+            for m in mensalidades if m.status == "PAGO"
+        ], batch_size=5000)
+        Fatura.objects.bulk_create([
+            Fatura(
+                descricao=f"Fatura {n}", valor=Decimal("2000.00"), email_destinatario="f@test.com",
+                data_emissao=hoje - timedelta(days=n % 1000), data_vencimento=hoje - timedelta(days=n % 1000) + timedelta(days=30),
+                status="PENDENTE" if n % 1000 < 40 else "PAGO",
+            )
+            for n in range(10000)
+        ], batch_size=5000)
+
+        with connection.cursor() as cursor:
+            for modelo in (Mensalidade, Pagamento, Fatura):
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(modelo._meta.db_table)}")
+
+    def consultas(self):
+        hoje = date.today()
+        inicio = self.mes_atual - relativedelta(months=6)
+        return {
+            "Mensalidade.atrasadas": Mensalidade.objects.atrasadas(),
+            "Mensalidade.pendentes": Mensalidade.objects.pendentes(),
+            "Mensalidade.de_mes": Mensalidade.objects.de_mes(inicio.year, inicio.month),
+            "Mensalidade em aberto vencidas": Mensalidade.objects.exclude(status="PAGO").filter(data_vencimento__lte=hoje),
+            "Fatura.vencidas": Fatura.objects.vencidas(),
+            "Fatura.pendentes": Fatura.objects.pendentes(),
+            "Fatura.do_periodo": Fatura.objects.do_periodo(hoje - timedelta(days=7), hoje),
+            "Pagamento.de_periodo": Pagamento.objects.de_periodo(inicio, inicio + relativedelta(months=1)),
+        }
+
+    def test_sem_seq_scan_em_tabelas_grandes(self):
+        for nome, queryset in self.consultas().items():
+            with self.subTest(consulta=nome):
+                self.assertEqual(varrimentos_sequenciais(queryset, LIMIAR_LINHAS), [])
@@ -0,0 +1,149 @@
+import threading
+import unittest
+from io import StringIO
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from financeiro.models import Mensalidade, Pagamento, MovimentoConta, SaldoConta
+from financeiro.razao import fechar_saldos, lancar_multas, saldo
+from financeiro.services import gerar_mensalidades
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+
+class LivroRazaoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.encarregado = criar_encarregado()
+        cls.aluno1 = criar_aluno(cls.encarregado, 1)
+        cls.aluno2 = criar_aluno(cls.encarregado, 2)
+
+    def criar_mensalidade(self, aluno, vencimento, valor="1000.00"):
+        return Mensalidade.objects.create(
+            aluno=aluno, valor=Decimal(valor), mes_referente=vencimento.replace(day=1),
+            data_vencimento=vencimento, data_limite=vencimento,
+        )
+
+    def movimentos(self, **filtro):
+        return list(MovimentoConta.objects.filter(**filtro).values_list("tipo", "natureza", "valor"))
+
+    def test_mensalidade_e_pagamentos(self):
+        mensalidade = self.criar_mensalidade(self.aluno1, date.today() + timedelta(days=5))
+        pagamento = Pagamento.objects.create(mensalidade=mensalidade, valor=Decimal("400.00"))
+        self.assertEqual(saldo(aluno=self.aluno1.pk), Decimal("600.00"))
+
+        pagamento = Pagamento.objects.get(pk=pagamento.pk)
+        pagamento.valor = Decimal("300.00")
+        pagamento.save()
+        pagamento.delete()
+        self.assertEqual(self.movimentos(), [
+            ("MENSALIDADE", "LANCAMENTO", Decimal("1000.00")),
+            ("PAGAMENTO", "LANCAMENTO", Decimal("-400.00")),
+            ("PAGAMENTO", "AJUSTE", Decimal("100.00")),
+            ("PAGAMENTO", "ESTORNO", Decimal("300.00")),
+        ])
+        self.assertEqual(saldo(encarregado=self.encarregado.pk), Decimal("1000.00"))
+
+    def test_so_de_insercao(self):
+        self.criar_mensalidade(self.aluno1, date.today())
+        movimento = MovimentoConta.objects.get()
+        with self.assertRaises(ValidationError):
+            movimento.save()
+        with self.assertRaises(ValidationError):
+            MovimentoConta.objects.update(valor=0)
+        with self.assertRaises(ValidationError):
+            MovimentoConta.objects.all().delete()
+
+    def test_multa_acumulada_e_paga(self):
+        mensalidade = self.criar_mensalidade(self.aluno1, date.today() - timedelta(days=12))
+        Mensalidade.objects.filter(pk=mensalidade.pk).update(status="ATRASADO")
+        lancar_multas()
+        lancar_multas()
+        self.assertEqual(self.movimentos(tipo="MULTA"), [("MULTA", "LANCAMENTO", Decimal("200.00"))])
+
+        Pagamento.objects.create(mensalidade=mensalidade, valor=Decimal("1200.00"))
+        mensalidade.refresh_from_db()
+        self.assertEqual(mensalidade.status, "PAGO")
+        self.assertEqual(saldo(aluno=self.aluno1.pk), Decimal("0.00"))
+        self.assertEqual(len(self.movimentos(tipo="MULTA")), 1)
+
+    def test_saldo_com_snapshots(self):
+        self.criar_mensalidade(self.aluno1, date.today())
+        self.criar_mensalidade(self.aluno2, date.today(), "500.00")
+        self.assertEqual(fechar_saldos(margem=timedelta(0)), 3)
+        self.assertEqual(fechar_saldos(margem=timedelta(0)), 0)
+
+        mensalidade = self.criar_mensalidade(self.aluno1, date.today() + timedelta(days=30))
+        Pagamento.objects.create(mensalidade=mensalidade, valor=Decimal("250.00"))
+        with self.assertNumQueries(2):
+            self.assertEqual(saldo(encarregado=self.encarregado.pk), Decimal("2250.00"))
+        self.assertEqual(fechar_saldos(margem=timedelta(0)), 2)
+        self.assertEqual(SaldoConta.objects.filter(aluno=self.aluno1).first().saldo, Decimal("1750.00"))
+        self.assertEqual(saldo(aluno=self.aluno2.pk), Decimal("500.00"))
+
+    def test_lote_e_comando_idempotentes(self):
+        gerar_mensalidades(2026, [3])
+        self.assertEqual(MovimentoConta.objects.filter(tipo="MENSALIDADE").count(), 2)
+        call_command("sincronizar_razao", stdout=StringIO())
+        call_command("sincronizar_razao", stdout=StringIO())
+        self.assertEqual(MovimentoConta.objects.filter(tipo="MENSALIDADE").count(), 2)
+        self.assertEqual(saldo(encarregado=self.encarregado.pk), Decimal("3000.00"))
+
+    def test_api_so_mostra_as_contas_do_encarregado(self):
+        self.criar_mensalidade(self.aluno1, date.today())
+        outro = criar_encarregado(2)
+        aluno_outro = criar_aluno(outro, 3)
+        self.criar_mensalidade(aluno_outro, date.today())
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.encarregado.user).access_token}")
+
+        resposta = cliente.get("/api/financeiro/movimentos/")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual({linha["encarregado"] for linha in resposta.data["results"]}, {self.encarregado.pk})
+        resposta = cliente.get(f"/api/financeiro/movimentos/?encarregado={outro.pk}")
+        self.assertEqual(resposta.data["results"], [])
+
+        self.assertEqual(cliente.get(f"/api/financeiro/movimentos/saldo/?aluno={self.aluno1.pk}").status_code, 200)
+        self.assertEqual(cliente.get(f"/api/financeiro/movimentos/saldo/?encarregado={self.encarregado.pk}").status_code, 200)
+        self.assertEqual(cliente.get(f"/api/financeiro/movimentos/saldo/?aluno={aluno_outro.pk}").status_code, 403)
+        self.assertEqual(cliente.get(f"/api/financeiro/movimentos/saldo/?encarregado={outro.pk}").status_code, 403)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "snapshots de transacoes do PostgreSQL")
+class FechoSaldosConcorrenciaTest(TransactionTestCase):
+    def test_nao_salta_movimentos_de_transacoes_abertas(self):
+        encarregado = criar_encarregado()
+        aluno = criar_aluno(encarregado)
+        inserido, confirmar = threading.Event(), threading.Event()
+
+        def transacao_lenta():
+            try:
+                with transaction.atomic():
+                    Mensalidade.objects.create(
+                        aluno=aluno, valor=Decimal("700.00"), mes_referente=(date.today().replace(day=1) - timedelta(days=1)).replace(day=1),
+                        data_vencimento=date.today(), data_limite=date.today(),
+                    )
+                    inserido.set()
+                    confirmar.wait(10)
+            finally:
+                connections.close_all()
+
+        fio = threading.Thread(target=transacao_lenta)
+        fio.start()
+        inserido.wait(10)
+        # id maior, ja confirmado, enquanto o menor continua por confirmar
+        Mensalidade.objects.create(
+            aluno=aluno, valor=Decimal("1000.00"), mes_referente=date.today().replace(day=1),
+            data_vencimento=date.today(), data_limite=date.today(),
+        )
+        self.assertEqual(fechar_saldos(margem=timedelta(0), espera=0), 0)
+
+        confirmar.set()
+        fio.join()
+        self.assertEqual(fechar_saldos(margem=timedelta(0), espera=0), 2)
+        self.assertEqual(SaldoConta.objects.get(aluno=aluno).saldo, Decimal("1700.00"))
+        self.assertEqual(saldo(encarregado=encarregado.pk), Decimal("1700.00"))
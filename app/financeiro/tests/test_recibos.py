@@ -0,0 +1,86 @@
+import os
+import tempfile
+from io import StringIO
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from financeiro.models import Mensalidade, Pagamento, Fatura
+from financeiro.recibos import caminho_recibo, gerar_recibos
+from financeiro import tasks
+from financeiro.tasks import enviar_recibos_individual
+from financeiro.tests.utils import criar_encarregado, criar_aluno, tasks_eager
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecibosTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.aluno = criar_aluno(criar_encarregado())
+        cls.mensalidade = Mensalidade.objects.create(
+            aluno=cls.aluno, valor=Decimal("1500.00"), mes_referente=date(2026, 3, 1),
+            data_vencimento=date(2026, 3, 10), data_limite=date(2026, 3, 15),
+        )
+        cls.pagamentos = [
+            Pagamento.objects.create(mensalidade=cls.mensalidade, valor=Decimal("500.00")) for _ in range(2)
+        ]
+
+    def test_caminho_deterministico(self):
+        self.assertEqual(caminho_recibo("pagamento", 1234), os.path.join("recibos", "pagamento", "00001", "pagamento-1234.pdf"))
+
+    def test_gera_pdfs_em_serie(self):
+        ids = [p.pk for p in self.pagamentos]
+        caminhos = gerar_recibos("pagamento", ids, processos=1)
+
+        self.assertEqual(len(caminhos), 2)
+        for pk, caminho in zip(sorted(ids), sorted(caminhos)):
+            self.assertEqual(caminho, os.path.join(MEDIA_ROOT, caminho_recibo("pagamento", pk)))
+            with open(caminho, "rb") as ficheiro:
+                self.assertEqual(ficheiro.read(5), b"%PDF-")
+        self.mensalidade.refresh_from_db()
+        self.assertTrue(self.mensalidade.recibo_gerado)
+
+    def test_tipo_invalido(self):
+        with self.assertRaises(ValueError):
+            gerar_recibos("outro", [1])
+
+    def test_envio_individual_em_anexo(self):
+        fatura = Fatura.objects.create(
+            descricao="Combustivel", valor=Decimal("2000.00"), data_vencimento=date.today(),
+            email_destinatario="fornecedor@test.com",
+        )
+        enviar_recibos_individual("fatura", fatura.pk)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["fornecedor@test.com"])
+        nome, conteudo, tipo = mail.outbox[0].attachments[0]
+        self.assertEqual(nome, f"fatura-{fatura.pk}.pdf")
+        self.assertTrue(conteudo.startswith(b"%PDF-"))
+
+    def test_comando(self):
+        saida = StringIO()
+        call_command("gerar_recibos", "pagamento", "--mes", "2026-03", "--processos", "1", stdout=saida)
+        self.assertIn("2 recibos gerados", saida.getvalue())
+
+    @override_settings(FINANCEIRO_RECIBOS_PARTE=2)
+    def test_lote_celery_dividido_em_tasks(self):
+        tasks_eager(self)
+        ids = [p.pk for p in self.pagamentos] + [
+            Pagamento.objects.create(mensalidade=self.mensalidade, valor=Decimal("100.00")).pk for _ in range(3)
+        ]
+        with mock.patch.object(tasks, "gerar_recibos", wraps=gerar_recibos) as gerar:
+            self.assertEqual(tasks.gerar_recibos_lote("pagamento", ids), 3)
+        # uma task por parte, cada uma em serie no seu worker
+        self.assertEqual([c.args[1] for c in gerar.call_args_list], [ids[0:2], ids[2:4], ids[4:5]])
+        self.assertTrue(all(c.kwargs == {"processos": 1} for c in gerar.call_args_list))
+        for pk in ids:
+            self.assertTrue(os.path.exists(os.path.join(MEDIA_ROOT, caminho_recibo("pagamento", pk))))
+
+        with mock.patch.object(tasks, "gerar_recibos", wraps=gerar_recibos) as gerar:
+            self.assertIn("3 tasks", tasks.enviar_recibos_lote("pagamento", ids))
+        self.assertEqual(gerar.call_count, 3)
+        self.assertEqual(len(mail.outbox), 5)
@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+from decimal import Decimal
+import pandas as pd
+from django.test import TestCase
+from financeiro.conciliacao import conciliar
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.referencias import (
+    digito_controlo, referencia_mensalidade, referencia_familia, descodificar, valida, FAMILIA,
+)
+from financeiro.services import gerar_mensalidades
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+MARCO = date(2026, 3, 1)
+
+
+class ReferenciasTest(TestCase):
+    def test_digito_luhn(self):
+        self.assertEqual(digito_controlo("7992739871"), "3")
+        referencia = referencia_mensalidade(42, MARCO)
+        self.assertTrue(referencia.startswith("1422603"))
+        self.assertTrue(valida(referencia))
+        errada = referencia[:-1] + str((int(referencia[-1]) + 1) % 10)
+        self.assertFalse(valida(errada))
+        self.assertIsNone(descodificar(errada))
+
+    def test_descodificar(self):
+        self.assertEqual(descodificar(referencia_familia(7, MARCO)), (FAMILIA, 7, MARCO))
+        self.assertIsNone(descodificar("abc"))
+
+
+class ReferenciasMensalidadeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.encarregado = criar_encarregado()
+        cls.aluno1 = criar_aluno(cls.encarregado, 1, mensalidade=Decimal("1000.00"))
+        cls.aluno2 = criar_aluno(cls.encarregado, 2, mensalidade=Decimal("800.00"))
+
+    def criar(self, aluno, mes=MARCO):
+        vencimento = date.today() + timedelta(days=5)
+        return Mensalidade.objects.create(
+            aluno=aluno, valor=aluno.mensalidade, mes_referente=mes, data_vencimento=vencimento, data_limite=vencimento,
+        )
+
+    def test_gerada_ao_criar_e_em_lote(self):
+        self.assertEqual(self.criar(self.aluno1).referencia, referencia_mensalidade(self.aluno1.pk, MARCO))
+        gerar_mensalidades(2026, [4])
+        referencias = set(Mensalidade.objects.filter(mes_referente=date(2026, 4, 1)).values_list("referencia", flat=True))
+        self.assertEqual(referencias, {referencia_mensalidade(a.pk, date(2026, 4, 1)) for a in (self.aluno1, self.aluno2)})
+
+    def test_regenerada_ao_mudar_aluno_ou_mes(self):
+        mensalidade = Mensalidade.objects.get(pk=self.criar(self.aluno1).pk)
+        mensalidade.mes_referente = date(2026, 4, 1)
+        mensalidade.save()
+        self.assertEqual(mensalidade.referencia, referencia_mensalidade(self.aluno1.pk, date(2026, 4, 1)))
+
+        mensalidade = Mensalidade.objects.get(pk=mensalidade.pk)
+        mensalidade.aluno = self.aluno2
+        mensalidade.save(update_fields=["aluno"])
+        mensalidade.refresh_from_db()
+        self.assertEqual(mensalidade.referencia, referencia_mensalidade(self.aluno2.pk, date(2026, 4, 1)))
+        self.assertEqual(list(Mensalidade.objects.da_referencia(mensalidade.referencia)), [mensalidade])
+        # a referencia antiga fica livre para a mensalidade que ela codifica
+        self.assertEqual(self.criar(self.aluno1).referencia, referencia_mensalidade(self.aluno1.pk, MARCO))
+
+    def test_procura_por_referencia(self):
+        m1, m2 = self.criar(self.aluno1), self.criar(self.aluno2)
+        with self.assertNumQueries(1):
+            self.assertEqual(list(Mensalidade.objects.da_referencia(m1.referencia)), [m1])
+        familia = referencia_familia(self.encarregado.pk, MARCO)
+        self.assertEqual(set(Mensalidade.objects.da_referencia(familia)), {m1, m2})
+        self.assertFalse(Mensalidade.objects.da_referencia("123").exists())
+
+    def test_conciliacao_por_codigo(self):
+        m1, m2 = self.criar(self.aluno1), self.criar(self.aluno2)
+        self.criar(self.aluno1, date(2026, 4, 1))
+        hoje = pd.Timestamp(date.today())
+        extrato = pd.DataFrame({
+            "transacao": ["T1", "T2", "T3"],
+            "data": [hoje] * 3,
+            "valor": pd.array([50000, 180000, 180000], dtype="Int64"),
+            "referencia": [
+                f"PAG {m1.referencia}",
+                f"FAMILIA {referencia_familia(self.encarregado.pk, MARCO)}",
+                f"FAMILIA {referencia_familia(self.encarregado.pk, date(2026, 4, 1))}",
+            ],
+            "telefone": [""] * 3,
+        })
+
+        resultado = conciliar(extrato, dias=0)
+        # T2 ja nao liquida a familia (T1 pagou parte de m1) e T3 nao corresponde ao total de abril
+        self.assertEqual(resultado["criados"], 1)
+        self.assertEqual(list(resultado["excecoes"]["transacao"]), ["T2", "T3"])
+        self.assertEqual(Pagamento.objects.get().valor, Decimal("500.00"))
+
+        resultado = conciliar(extrato.iloc[[1]].assign(transacao="T4", valor=pd.array([130000], dtype="Int64")), dias=0)
+        self.assertEqual(resultado["criados"], 2)
+        m1.refresh_from_db()
+        m2.refresh_from_db()
+        self.assertEqual((m1.status, m2.status), ("PAGO", "PAGO"))
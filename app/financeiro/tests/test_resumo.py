@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.resumo import calcular_resumo
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+URL = "/api/financeiro/resumo/"
+
+
+class ResumoFinanceiroTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.encarregado = criar_encarregado(1)
+        cls.aluno1 = criar_aluno(cls.encarregado, 1)
+        cls.aluno2 = criar_aluno(criar_encarregado(2), 2)
+        hoje = date.today()
+        ontem = hoje - timedelta(days=1)
+        for aluno, vencimento in [(cls.aluno1, ontem), (cls.aluno2, hoje + timedelta(days=5))]:
+            Mensalidade.objects.create(
+                aluno=aluno, valor=Decimal("1000.00"), mes_referente=hoje.replace(day=1),
+                data_vencimento=vencimento, data_limite=vencimento,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        refresh = RefreshToken.for_user(self.encarregado.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def test_uma_query_por_modelo(self):
+        with self.assertNumQueries(4):
+            resumo = calcular_resumo()
+        self.assertEqual(resumo["mensalidade"]["total"], 2)
+        self.assertEqual(resumo["mensalidade"]["atrasadas"], 1)
+        self.assertEqual(resumo["mensalidade"]["pendentes"], 1)
+        self.assertEqual(resumo["mensalidade"]["valor_devido"], Decimal("2000.00"))
+
+    def test_filtro_por_encarregado(self):
+        with self.assertNumQueries(2):
+            resumo = calcular_resumo(encarregado=self.encarregado.pk)
+        self.assertEqual(resumo["mensalidade"]["total"], 1)
+        self.assertNotIn("salarios", resumo)
+
+    def test_endpoint_usa_cache_e_invalida_ao_escrever(self):
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["pagamento"]["total"], 0)
+
+        with self.assertNumQueries(1):  # apenas a autenticacao JWT
+            self.client.get(URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pagamento.objects.create(
+                mensalidade=Mensalidade.objects.get(aluno=self.aluno2), valor=Decimal("300.00")
+            )
+        response = self.client.get(URL)
+        self.assertEqual(response.data["pagamento"]["total"], 1)
+        self.assertEqual(response.data["pagamento"]["valor_recebido"], Decimal("300.00"))
+
+    def test_filtro_invalido(self):
+        response = self.client.get(URL, {"inicio": "2026-05-01", "fim": "2026-01-01"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
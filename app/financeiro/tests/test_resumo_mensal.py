@@ -0,0 +1,117 @@
+import threading
+import unittest
+from io import StringIO
+from datetime import date
+from decimal import Decimal
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from financeiro.models import Mensalidade, Pagamento, ResumoMensal
+from financeiro.relatorios import relatorio_mensal, atualizar_resumo_mensal, reconstruir_resumo_mensal
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+MARCO = date(2026, 3, 1)
+ABRIL = date(2026, 4, 1)
+
+
+class ResumoMensalTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        encarregado = criar_encarregado()
+        cls.aluno1 = criar_aluno(encarregado, 1)
+        cls.aluno2 = criar_aluno(encarregado, 2, escola_dest="Escola Secundaria")
+
+    def criar_mensalidade(self, aluno, mes, valor="1000.00"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Mensalidade.objects.create(
+                aluno=aluno, valor=Decimal(valor), mes_referente=mes,
+                data_vencimento=mes.replace(day=10), data_limite=mes.replace(day=15),
+            )
+
+    def test_atualizacao_incremental(self):
+        marco = self.criar_mensalidade(self.aluno1, MARCO)
+        self.criar_mensalidade(self.aluno2, MARCO, "800.00")
+        self.criar_mensalidade(self.aluno1, ABRIL)
+        self.assertEqual(ResumoMensal.objects.count(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pagamento.objects.create(mensalidade=marco, valor=Decimal("1000.00"))
+
+        linha = ResumoMensal.objects.get(mes_referente=MARCO, escola="Escola Primaria Central")
+        self.assertEqual(linha.recebido, Decimal("1000.00"))
+        self.assertEqual(linha.em_aberto, Decimal("0.00"))
+        self.assertEqual(linha.quantidade_pagas, 1)
+
+        with self.assertNumQueries(1):
+            relatorio = relatorio_mensal()
+        self.assertEqual([r["mes_referente"] for r in relatorio], [ABRIL, MARCO])
+        self.assertEqual(relatorio[1]["faturado"], Decimal("1800.00"))
+        self.assertEqual(relatorio[1]["em_aberto"], Decimal("800.00"))
+
+        por_escola = relatorio_mensal(inicio=MARCO, fim=MARCO, agrupar_por="escola")
+        self.assertEqual(len(por_escola), 2)
+
+    def test_comando_reconstroi(self):
+        self.criar_mensalidade(self.aluno1, MARCO)
+        Mensalidade.objects.update(status="ATRASADO")
+        ResumoMensal.objects.all().delete()
+        call_command("reconstruir_resumo_mensal", stdout=StringIO())
+        linha = ResumoMensal.objects.get()
+        self.assertEqual(linha.quantidade_atrasadas, 1)
+        self.assertEqual(linha.atrasado, Decimal("1000.00"))
+
+    def test_mudanca_de_grupo_atualiza_linha_antiga(self):
+        mensalidade = Mensalidade.objects.get(pk=self.criar_mensalidade(self.aluno1, MARCO).pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            mensalidade.mes_referente = ABRIL
+            mensalidade.save()
+        self.assertEqual(list(ResumoMensal.objects.values_list("mes_referente", flat=True)), [ABRIL])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.aluno1.escola_dest = "Escola Nova"
+            self.aluno1.save()
+        self.assertEqual(list(ResumoMensal.objects.values_list("escola", "quantidade")), [("Escola Nova", 1)])
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "advisory locks so em PostgreSQL")
+class ResumoMensalConcorrenciaTest(TransactionTestCase):
+    def setUp(self):
+        self.aluno = criar_aluno(criar_encarregado())
+        Mensalidade.objects.create(
+            aluno=self.aluno, valor=Decimal("1000.00"), mes_referente=MARCO,
+            data_vencimento=MARCO.replace(day=10), data_limite=MARCO.replace(day=15),
+        )
+        ResumoMensal.objects.all().delete()
+
+    def em_paralelo(self, funcoes):
+        """Corre as funcoes ao mesmo tempo, cada uma na sua ligacao; devolve os erros"""
+        erros, barreira = [], threading.Barrier(len(funcoes))
+
+        def correr(funcao):
+            try:
+                barreira.wait()
+                funcao()
+            except Exception as erro:
+                erros.append(erro)
+            finally:
+                connections.close_all()
+
+        fios = [threading.Thread(target=correr, args=(funcao,)) for funcao in funcoes]
+        for fio in fios:
+            fio.start()
+        for fio in fios:
+            fio.join()
+        return erros
+
+    def atualizar(self):
+        atualizar_resumo_mensal(MARCO, self.aluno.rota_id, self.aluno.escola_dest)
+
+    def test_atualizacoes_concorrentes_do_mesmo_grupo(self):
+        self.assertEqual(self.em_paralelo([self.atualizar] * 8), [])
+        self.assertEqual(ResumoMensal.objects.get().faturado, Decimal("1000.00"))
+
+    def test_reconstrucao_concorrente_com_atualizacoes(self):
+        for _ in range(5):
+            funcoes = [self.atualizar, lambda: reconstruir_resumo_mensal([MARCO])] * 4
+            self.assertEqual(self.em_paralelo(funcoes), [])
+            self.assertEqual(ResumoMensal.objects.get().faturado, Decimal("1000.00"))
@@ -0,0 +1,71 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core import mail
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from financeiro.models import Mensalidade, AlertaEnviado
+from financeiro.notificacoes import criar_resumos_atraso
+from financeiro.tasks import enviar_resumos_atraso
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+
+class ResumosAtrasoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.encarregado = criar_encarregado(1)
+        cls.alunos = [criar_aluno(cls.encarregado, n) for n in (1, 2, 3)]
+        em_dia = criar_aluno(criar_encarregado(2), 4)
+
+        vencida = date.today() - timedelta(days=20)
+        for aluno in cls.alunos:
+            Mensalidade.objects.create(
+                aluno=aluno, valor=Decimal("1000.00"), mes_referente=vencida.replace(day=1),
+                data_vencimento=vencida, data_limite=vencida, status="ATRASADO",
+            )
+        futura = date.today() + timedelta(days=10)
+        Mensalidade.objects.create(
+            aluno=em_dia, valor=Decimal("1000.00"), mes_referente=futura.replace(day=1),
+            data_vencimento=futura, data_limite=futura,
+        )
+
+    def test_um_alerta_por_encarregado(self):
+        resultado = enviar_resumos_atraso()
+
+        self.assertEqual(resultado, {"enviados": 1, "falhas": 0})
+        alerta = AlertaEnviado.objects.get()
+        self.assertEqual(alerta.encarregado, self.encarregado)
+        self.assertEqual(alerta.status, "ENVIADO")
+        self.assertEqual(set(alerta.alunos.all()), set(self.alunos))
+        self.assertEqual(len(mail.outbox), 1)
+        for aluno in self.alunos:
+            self.assertIn(aluno.nome, mail.outbox[0].body)
+        self.assertIn("Total em divida", mail.outbox[0].body)
+
+    def test_janela_evita_repeticao(self):
+        self.assertEqual(len(criar_resumos_atraso()), 1)
+        self.assertEqual(criar_resumos_atraso(), [])
+        self.assertEqual(len(criar_resumos_atraso(janela=timedelta(0))), 1)
+
+    def test_alerta_de_ontem_nao_bloqueia_o_de_hoje(self):
+        # o beat corre a cada 24h: o alerta do dia anterior tem sempre um pouco menos de 24h
+        criar_resumos_atraso()
+        AlertaEnviado.objects.update(enviado_em=timezone.now() - timedelta(hours=23, minutes=59))
+        self.assertEqual(len(criar_resumos_atraso()), 1)
+
+    def test_queries_nao_dependem_do_numero_de_encarregados(self):
+        with CaptureQueriesContext(connection) as um:
+            self.assertEqual(len(criar_resumos_atraso()), 1)
+        AlertaEnviado.objects.all().delete()
+        vencida = date.today() - timedelta(days=20)
+        for n in (5, 6, 7):
+            Mensalidade.objects.create(
+                aluno=criar_aluno(criar_encarregado(n), n), valor=Decimal("1000.00"), mes_referente=vencida.replace(day=1),
+                data_vencimento=vencida, data_limite=vencida, status="ATRASADO",
+            )
+        with CaptureQueriesContext(connection) as quatro:
+            alertas = criar_resumos_atraso()
+        self.assertEqual(len(alertas), 4)
+        self.assertEqual(len(quatro), len(um))
+        self.assertEqual(AlertaEnviado.alunos.through.objects.filter(alertaenviado_id__in=alertas).count(), 6)
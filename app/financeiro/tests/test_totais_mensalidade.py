@@ -0,0 +1,50 @@
+from io import StringIO
+from datetime import date, timedelta
+from decimal import Decimal
+from django.test import TestCase
+from django.core.management import call_command
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.tests.utils import criar_encarregado, criar_aluno
+
+
+class TotaisMensalidadeTest(TestCase):
+    def setUp(self):
+        aluno = criar_aluno(criar_encarregado())
+        futuro = date.today() + timedelta(days=10)
+        self.mensalidade = Mensalidade.objects.create(
+            aluno=aluno, valor=Decimal("1000.00"), mes_referente=date.today().replace(day=1),
+            data_vencimento=futuro, data_limite=futuro,
+        )
+
+    def assertTotais(self, total_pago, valor_devido, status):
+        self.mensalidade.refresh_from_db()
+        self.assertEqual(self.mensalidade.total_pago, Decimal(total_pago))
+        self.assertEqual(self.mensalidade.valor_devido, Decimal(valor_devido))
+        self.assertEqual(self.mensalidade.status, status)
+
+    def test_criar_editar_e_apagar_pagamento(self):
+        self.assertTotais("0.00", "1000.00", "PENDENTE")
+
+        pagamento = Pagamento.objects.create(mensalidade=self.mensalidade, valor=Decimal("400.00"))
+        self.assertTotais("400.00", "600.00", "PAGO PARCIAL")
+
+        pagamento = Pagamento.objects.get(pk=pagamento.pk)
+        pagamento.valor = Decimal("1000.00")
+        pagamento.save()
+        self.assertTotais("1000.00", "0.00", "PAGO")
+
+        pagamento.delete()
+        self.assertTotais("0.00", "1000.00", "PENDENTE")
+
+    def test_alterar_valor_recalcula_valor_devido(self):
+        Pagamento.objects.create(mensalidade=self.mensalidade, valor=Decimal("400.00"))
+        mensalidade = Mensalidade.objects.get(pk=self.mensalidade.pk)
+        mensalidade.valor = Decimal("1200.00")
+        mensalidade.save()
+        self.assertTotais("400.00", "800.00", "PAGO PARCIAL")
+
+    def test_comando_reconstroi_totais(self):
+        Pagamento.objects.create(mensalidade=self.mensalidade, valor=Decimal("250.00"))
+        Mensalidade.objects.update(total_pago=0, valor_devido=0)
+        call_command("recalcular_totais_mensalidades", batch_size=1, stdout=StringIO())
+        self.assertTotais("250.00", "750.00", "PAGO PARCIAL")
@@ -0,0 +1,41 @@
+"""Funcoes auxiliares para criar dados nos testes do financeiro"""
+from datetime import date
+from decimal import Decimal
+from celery import current_app
+from core.models import Cargo
+from alunos.models import Aluno, Encarregado
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+
+def criar_encarregado(n=1):
+    cargo, _ = Cargo.objects.get_or_create(nome="ENCARREGADO", defaults={"salario_padrao": Decimal("0.00")})
+    user = User.objects.create_user(
+        email=f"encarregado{n}@test.com",
+        nome=f"Encarregado {n}",
+        role=cargo,
+        password="Senhacommais8",
+    )
+    return Encarregado.objects.create(user=user, telefone=f"+25884{n:07d}", nrBI=f"ENC{n:06d}")
+
+
+def criar_aluno(encarregado, n=1, mensalidade=Decimal("1500.00"), **extra):
+    dados = dict(
+        nome=f"Aluno {n}",
+        data_nascimento=date(2015, 1, 1),
+        nrBI=f"ALU{n:06d}",
+        encarregado=encarregado,
+        escola_dest="Escola Primaria Central",
+        classe="3",
+        mensalidade=mensalidade,
+    )
+    dados.update(extra)
+    return Aluno.objects.create(**dados)
+
+
+def tasks_eager(caso):
+    """Corre as tasks celery no proprio processo durante o teste (o relay do outbox envia-as ao broker)"""
+    anterior = current_app.conf.task_always_eager
+    current_app.conf.task_always_eager = True
+    caso.addCleanup(setattr, current_app.conf, "task_always_eager", anterior)
@@ -6,7 +6,11 @@ from financeiro.views import (
     SalarioViewSet,
     FaturaViewSet,
     AlertaEnviadoViewSet,
-    # FinceiroResumoViewSet,
+    FinceiroResumoViewSet,
+    RelatorioMensalViewSet,
+    AntiguidadeSaldosViewSet,
+    MovimentoContaViewSet,
+    CallbackPagamentoView,
 )
 
 router = DefaultRouter()
@@ -15,8 +19,12 @@ router.register(r"pagamentos", PagamentoViewSet)
 router.register(r"salarios", SalarioViewSet)
 router.register(r"faturas", FaturaViewSet)
 router.register(r"alertas", AlertaEnviadoViewSet)
-# router.register(r"resumo", FinceiroResumoViewSet)
+router.register(r"resumo", FinceiroResumoViewSet, basename="resumo")
+router.register(r"relatorio-mensal", RelatorioMensalViewSet, basename="relatorio-mensal")
+router.register(r"antiguidade-saldos", AntiguidadeSaldosViewSet, basename="antiguidade-saldos")
+router.register(r"movimentos", MovimentoContaViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('callbacks/<str:fornecedor>/', CallbackPagamentoView.as_view(), name='callback-pagamento'),
 ]
@@ -1,21 +1,85 @@
 # financeiro/views.py
+from datetime import date
 from rest_framework.decorators import action
-from rest_framework import viewsets, permissions, decorators, response
-from financeiro.tasks import enviar_alerta_email
-from financeiro.models import Mensalidade, Pagamento, Salario, Fatura, AlertaEnviado
+from rest_framework import viewsets, views, permissions, decorators, response, status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.utils.urls import replace_query_param
+from financeiro.tasks import enviar_alerta_email, enviar_alertas_lote
+from financeiro.resumo import obter_resumo
+from financeiro.relatorios import relatorio_mensal
+from financeiro.antiguidade import antiguidade_saldos, colunas as colunas_antiguidade
+from financeiro.exportacao import resposta_streaming
+from financeiro.services import registar_pagamentos, gerar_folha_salarios, pagar_salarios, emitir_faturas, liquidar_faturas
+from financeiro.callbacks import extrair
+from financeiro.permissions import TokenCallback
+from financeiro.razao import saldo
+from financeiro.extrato import extrato
+from django.db.models import F
+from core.pagination import CursorPaginacao
+from alunos.models import Aluno
+from financeiro.models import Mensalidade, Pagamento, Salario, Fatura, AlertaEnviado, CallbackPagamento, MovimentoConta, FORNECEDORES_CARTEIRA
 from financeiro.serializers import (
     MensalidadeSerializer,
     PagamentoSerializer,
+    PagamentoLoteSerializer,
+    PagamentoLoteItemSerializer,
     SalarioSerializer,
     FaturaSerializer,
     AlertaEnviadoSerializer,
+    ResumoFiltroSerializer,
+    RelatorioMensalFiltroSerializer,
+    AntiguidadeSaldosFiltroSerializer,
+    ExportacaoFiltroSerializer,
+    FolhaSalariosSerializer,
+    PagarSalariosSerializer,
+    FaturaLoteSerializer,
+    LiquidarFaturasSerializer,
+    MovimentoContaSerializer,
+    SaldoContaFiltroSerializer,
+    ExtratoFiltroSerializer,
 )
 
 
-class MensalidadeViewSet(viewsets.ModelViewSet):
+class ExportacaoMixin:
+    """Acao `exportar`: CSV/XLSX do queryset com os mesmos filtros da listagem, lido em chunks
+    (cursor do lado do servidor no Postgres) e sem paginacao"""
+    # (campos do modelo, expressoes nomeadas) das colunas exportadas
+    campos_exportacao = ((), {})
+    nome_exportacao = "exportacao"
+
+    @decorators.action(detail=False, methods=["get"])
+    def exportar(self, request):
+        filtros = ExportacaoFiltroSerializer(data=request.query_params)
+        filtros.is_valid(raise_exception=True)
+        campos, expressoes = self.campos_exportacao
+        linhas = (
+            self.filter_queryset(self.get_queryset()).select_related(None).prefetch_related(None)
+            .values(*campos, **expressoes).iterator(chunk_size=2000)
+        )
+        return resposta_streaming(linhas, [*campos, *expressoes], filtros.validated_data["formato"], self.nome_exportacao)
+
+
+class MensalidadeViewSet(ExportacaoMixin, viewsets.ModelViewSet):
     queryset = Mensalidade.objects.all()
     serializer_class = MensalidadeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filterset_fields = ['status', 'aluno', 'aluno__encarregado', 'mes_referente', 'recibo_gerado']
+    search_fields = ['aluno__nome', 'aluno__nrBI', 'referencia']
+    ordering_fields = ['mes_referente', 'data_vencimento', 'valor', 'valor_devido']
+    campos_exportacao = (
+        ('id', 'referencia', 'mes_referente', 'data_vencimento', 'data_limite', 'valor', 'total_pago', 'valor_devido', 'status'),
+        {
+            'aluno_nome': F('aluno__nome'),
+            'aluno_bi': F('aluno__nrBI'),
+            'dias_em_atraso': F('_dias_atraso'),
+            'valor_com_multa': F('_valor_atualizado'),
+        },
+    )
+    nome_exportacao = "mensalidades"
+
+    def get_queryset(self):
+        # com_calculos usa a data de hoje, por isso e montado a cada request
+        return Mensalidade.objects.com_calculos()
 
     def perform_update(self, serializer):
         instance = serializer.save()
@@ -23,29 +87,84 @@ class MensalidadeViewSet(viewsets.ModelViewSet):
 
     @decorators.action(detail=False, methods=["get"])
     def pendentes(self, request):
-        qs = Mensalidade.objects.pendentes()
-        return response.Response(MensalidadeSerializer(qs, many=True).data)
+        qs = self.get_queryset().pendentes()
+        return response.Response(self.get_serializer(qs, many=True).data)
 
     @decorators.action(detail=False, methods=["get"])
     def atrasadas(self, request):
-        qs = Mensalidade.objects.atrasadas()
-        return response.Response(MensalidadeSerializer(qs, many=True).data)
+        qs = self.get_queryset().atrasadas()
+        return response.Response(self.get_serializer(qs, many=True).data)
 
     @decorators.action(detail=False, methods=["get"])
     def pagas(self, request):
-        qs = Mensalidade.objects.pagas()
-        return response.Response(MensalidadeSerializer(qs, many=True).data)
+        qs = self.get_queryset().pagas()
+        return response.Response(self.get_serializer(qs, many=True).data)
 
 
-class PagamentoViewSet(viewsets.ModelViewSet):
+class PagamentoViewSet(ExportacaoMixin, viewsets.ModelViewSet):
     queryset = Pagamento.objects.all()
     serializer_class = PagamentoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CursorPaginacao
+    ordering = ['-data_pagamento', '-id']
+    filterset_fields = {
+        'metodo_pagamento': ['exact'],
+        'mensalidade': ['exact'],
+        'mensalidade__aluno': ['exact'],
+        'data_pagamento': ['date__gte', 'date__lte'],
+    }
+    search_fields = ['observacao', 'mensalidade__aluno__nome', 'mensalidade__referencia']
+    # so a coluna do cursor: ordenar por outra (ex: valor) estragava a paginacao por cursor
+    ordering_fields = ['data_pagamento']
+    campos_exportacao = (
+        ('id', 'data_pagamento', 'valor', 'metodo_pagamento', 'observacao'),
+        {
+            'mensalidade_referencia': F('mensalidade__referencia'),
+            'mes_referente': F('mensalidade__mes_referente'),
+            'aluno_nome': F('mensalidade__aluno__nome'),
+            'aluno_bi': F('mensalidade__aluno__nrBI'),
+        },
+    )
+    nome_exportacao = "pagamentos"
 
     def perform_create(self, serializer):
         pagamento = serializer.save()
         pagamento.mensalidade.atualizar_status()
 
+    @decorators.action(detail=False, methods=["post"])
+    def lote(self, request):
+        """Regista varios pagamentos numa transacao e devolve o resultado de cada item"""
+        lote = PagamentoLoteSerializer(data=request.data)
+        lote.is_valid(raise_exception=True)
+
+        resultados, validos = [], []
+        for indice, dados in enumerate(lote.validated_data["pagamentos"]):
+            item = PagamentoLoteItemSerializer(data=dados)
+            if item.is_valid():
+                validos.append((indice, item.validated_data))
+                resultados.append(None)
+            else:
+                resultados.append({"indice": indice, "status": "rejeitado", "erros": item.errors})
+
+        registados = registar_pagamentos([dados for _, dados in validos]) if validos else []
+        for (indice, _), resultado in zip(validos, registados):
+            if resultado["status"] == "criado":
+                resultado = {"indice": indice, "status": "criado", "pagamento": PagamentoSerializer(resultado["pagamento"]).data}
+            else:
+                resultado = {"indice": indice, **resultado}
+            resultados[indice] = resultado
+
+        criados = sum(r["status"] == "criado" for r in resultados)
+        if criados == len(resultados):
+            codigo = status.HTTP_201_CREATED
+        elif criados:
+            codigo = status.HTTP_207_MULTI_STATUS
+        else:
+            codigo = status.HTTP_400_BAD_REQUEST
+        return response.Response(
+            {"criados": criados, "rejeitados": len(resultados) - criados, "resultados": resultados}, status=codigo
+        )
+
 
 class SalarioViewSet(viewsets.ModelViewSet):
     queryset = Salario.objects.all()
@@ -62,6 +181,28 @@ class SalarioViewSet(viewsets.ModelViewSet):
         qs = Salario.objects.pendentes()
         return response.Response(SalarioSerializer(qs, many=True).data)
 
+    @decorators.action(detail=False, methods=["post"], url_path="gerar-folha")
+    def gerar_folha(self, request):
+        """Gera em lote os salarios do mes de todos os funcionarios (idempotente)"""
+        dados = FolhaSalariosSerializer(data=request.data)
+        dados.is_valid(raise_exception=True)
+        resultado = gerar_folha_salarios(dados.validated_data["ano"], dados.validated_data["mes"])
+        return response.Response(resultado, status=status.HTTP_201_CREATED if resultado["criados"] else status.HTTP_200_OK)
+
+    @decorators.action(detail=False, methods=["post"])
+    def pagar(self, request):
+        """Marca os salarios como pagos num UPDATE e agenda os recibos num unico lote"""
+        dados = PagarSalariosSerializer(data=request.data)
+        dados.is_valid(raise_exception=True)
+        dados = dados.validated_data
+        salarios = Salario.objects.all()
+        if "salarios" in dados:
+            salarios = salarios.filter(pk__in=dados["salarios"])
+        if "ano" in dados and "mes" in dados:
+            salarios = salarios.filter(mes_referente=date(dados["ano"], dados["mes"], 1))
+        pagos = pagar_salarios(salarios, dados.get("data_pagamento"))
+        return response.Response({"pagos": len(pagos), "salarios": pagos})
+
 
 class FaturaViewSet(viewsets.ModelViewSet):
     queryset = Fatura.objects.all()
@@ -83,11 +224,30 @@ class FaturaViewSet(viewsets.ModelViewSet):
         qs = Fatura.objects.pendentes()
         return response.Response(FaturaSerializer(qs, many=True).data)
 
+    @decorators.action(detail=False, methods=["post"])
+    def emitir(self, request):
+        """Emite um lote de faturas pendentes num unico INSERT"""
+        lote = FaturaLoteSerializer(data=request.data)
+        lote.is_valid(raise_exception=True)
+        faturas = emitir_faturas(lote.validated_data["faturas"])
+        return response.Response({"emitidas": len(faturas)}, status=status.HTTP_201_CREATED)
+
+    @decorators.action(detail=False, methods=["post"])
+    def liquidar(self, request):
+        """Marca as faturas como pagas num UPDATE e agenda os recibos num unico lote"""
+        dados = LiquidarFaturasSerializer(data=request.data)
+        dados.is_valid(raise_exception=True)
+        pagas = liquidar_faturas(dados.validated_data["faturas"], dados.validated_data.get("data_pagamento"))
+        return response.Response({"pagas": len(pagas), "faturas": pagas})
+
 
 class AlertaEnviadoViewSet(viewsets.ModelViewSet):
     queryset = AlertaEnviado.objects.all()
     serializer_class = AlertaEnviadoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CursorPaginacao
+    ordering = ['-enviado_em', '-id']
+    ordering_fields = ['enviado_em']
 
     @decorators.action(detail=False, methods=["get"])
     def enviados(self, request):
@@ -106,61 +266,119 @@ class AlertaEnviadoViewSet(viewsets.ModelViewSet):
 
     @decorators.action(detail=False, methods=["post"])
     def reprocessar(self, request):
-        falhos = AlertaEnviado.objects.filter(status="FALHO NO ENVIO")
-        reprocessados = []
-        for alerta in falhos:
-            enviar_alerta_email.delay(alerta.pk)
-            reprocessados.append(alerta.pk)
+        reprocessados = list(AlertaEnviado.objects.falhos().values_list("pk", flat=True))
+        if reprocessados:
+            enviar_alertas_lote.delay(reprocessados)
         return response.Response({"mensagem": f"{len(reprocessados)} alertas reprocessados", "ids": reprocessados})
 
 
 class FinceiroResumoViewSet(viewsets.ViewSet):
-    Permission_classes = [permissions.IsAuthenticated]
-
-    @action(detail=False, methods=["get"])
-    def resumo(self, request):
-        # total de mensalidades
-        total_mensalidade = Mensalidade.objects.count()
-        total_mensalidade_pagas = Mensalidade.objects.pagas().count()
-        total_mensalidade_pendentes = Mensalidade.objects.pendentes().count()
-        total_mensalidade_atrasadas = Mensalidade.objects.atrasadas().count()
-
-        # Totais de pagamentos
-        total_pagamento = Pagamento.objects.count()
-        valor_recebido = sum(p.valor for p in Pagamento.objects.all())
-
-        # Totais de salarios
-        total_salarios = Salario.objects.count()
-        salarios_pagos = Salario.objects.pagos().count()
-        salarios_pendentes = Salario.objects.pendentes().count()
-
-        # Totais de faturas
-        total_faturas = Fatura.objects.count()
-        faturas_pagas = Fatura.objects.pagas.count()
-        fatutas_vencidas = Fatura.objects.vencidas().count()
-
-        return Response({
-            "mensalidade":{
-                "total": total_mensalidade,
-                "pagas": total_mensalidade_pagas,
-                "pendentes": total_mensalidade_pendentes,
-                "atrasadas": total_mensalidade_atrasadas,
-            },
-            "pagamento": {
-                "total": total_pagamento,
-                "valor_recebido": valor_recebido,
-            },
-            "salarios": {
-                "total": total_salarios,
-                "pagos": salarios_pagos,
-                "pendentes": salarios_pendentes,
-            },
-            "fatura": {
-                "total": total_faturas,
-                "pagas": faturas_pagas,
-                "vencidas": fatutas_vencidas,
-            }
-        })
+    """Resumo do financeiro para o dashboard (uma agregacao por modelo, servido da cache)"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        filtros = ResumoFiltroSerializer(data=request.query_params)
+        filtros.is_valid(raise_exception=True)
+        return response.Response(obter_resumo(**filtros.validated_data))
+
+
+class RelatorioMensalViewSet(viewsets.ViewSet):
+    """Faturado, recebido, em aberto e atrasado por mes (lido de ResumoMensal)"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        filtros = RelatorioMensalFiltroSerializer(data=request.query_params)
+        filtros.is_valid(raise_exception=True)
+        return response.Response(relatorio_mensal(**filtros.validated_data))
+
+
+class AntiguidadeSaldosViewSet(viewsets.ViewSet):
+    """Saldos em divida por faixa de dias de atraso, calculados numa query e enviados em streaming"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        filtros = AntiguidadeSaldosFiltroSerializer(data=request.query_params)
+        filtros.is_valid(raise_exception=True)
+        dados = dict(filtros.validated_data)
+        formato = dados.pop("formato")
+        linhas = antiguidade_saldos(**dados).iterator(chunk_size=2000)
+        return resposta_streaming(linhas, colunas_antiguidade(dados["agrupar_por"]), formato, "antiguidade-saldos")
+
+
+class MovimentoContaViewSet(viewsets.ReadOnlyModelViewSet):
+    """Livro razao (so leitura): debitos e creditos de cada aluno/encarregado"""
+    queryset = MovimentoConta.objects.all()
+    serializer_class = MovimentoContaSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filterset_fields = ['aluno', 'encarregado', 'mensalidade', 'pagamento', 'tipo', 'natureza']
+
+    def encarregado_do_utilizador(self):
+        """Id do encarregado do utilizador (None se nao for encarregado); o staff ve todas as contas"""
+        return getattr(getattr(self.request.user, "perfil_encarregado", None), "pk", None)
+
+    def get_queryset(self):
+        # um encarregado so ve os movimentos da sua conta e dos seus alunos
+        queryset = super().get_queryset()
+        if self.request.user.is_staff:
+            return queryset
+        encarregado = self.encarregado_do_utilizador()
+        return queryset.filter(encarregado_id=encarregado) if encarregado else queryset.none()
+
+    @decorators.action(detail=False, methods=["get"])
+    def saldo(self, request):
+        """Saldo atual de um aluno ou encarregado (ultimo snapshot + movimentos posteriores).
+        Um encarregado so ve o seu saldo e o dos seus alunos."""
+        filtros = SaldoContaFiltroSerializer(data=request.query_params)
+        filtros.is_valid(raise_exception=True)
+        if not request.user.is_staff:
+            encarregado = self.encarregado_do_utilizador()
+            if "aluno" in filtros.validated_data:
+                permitido = encarregado and Aluno.objects.filter(pk=filtros.validated_data["aluno"], encarregado_id=encarregado).exists()
+            else:
+                permitido = encarregado and filtros.validated_data["encarregado"] == encarregado
+            if not permitido:
+                raise PermissionDenied("Sem permissao para o saldo desta conta.")
+        return response.Response({**filtros.validated_data, "saldo": saldo(**filtros.validated_data)})
+
+    @decorators.action(detail=False, methods=["get"])
+    def extrato(self, request):
+        """Extrato do encarregado (todos os alunos) por data, com saldo corrente; paginado por cursor.
+        Um encarregado so ve o seu proprio extrato."""
+        filtros = ExtratoFiltroSerializer(data=request.query_params)
+        filtros.is_valid(raise_exception=True)
+        encarregado = filtros.validated_data["encarregado"]
+        if not request.user.is_staff and self.encarregado_do_utilizador() != encarregado:
+            raise PermissionDenied("Sem permissao para o extrato deste encarregado.")
+
+        linhas, proximo = extrato(encarregado, filtros.validated_data.get("cursor"), filtros.validated_data["page_size"])
+        seguinte = replace_query_param(request.build_absolute_uri(), "cursor", proximo) if proximo else None
+        return response.Response({"encarregado": encarregado, "next": seguinte, "results": linhas})
+
+
+class CallbackPagamentoView(views.APIView):
+    """Recebe os callbacks de pagamento (M-Pesa, e-Mola). So grava o payload na tabela de staging
+    (um INSERT, duplicados ignorados pelo id da transacao) e responde; os pagamentos sao
+    criados em lote pela task processar_callbacks_pagamento."""
+    authentication_classes = []
+    permission_classes = [TokenCallback]
+    # o token do fornecedor e a protecao; o limite anonimo global (100/hora) descartaria callbacks
+    throttle_classes = []
+
+    def post(self, request, fornecedor):
+        fornecedor = fornecedor.upper()
+        if fornecedor not in dict(FORNECEDORES_CARTEIRA):
+            return response.Response({"erro": "Fornecedor desconhecido"}, status=status.HTTP_404_NOT_FOUND)
+        if not isinstance(request.data, dict):
+            return response.Response({"erro": "Payload invalido"}, status=status.HTTP_400_BAD_REQUEST)
+        transacao = extrair(request.data, "transacao")
+        if not transacao:
+            return response.Response({"erro": "Id da transacao em falta"}, status=status.HTTP_400_BAD_REQUEST)
+
+        CallbackPagamento.objects.bulk_create(
+            [CallbackPagamento(fornecedor=fornecedor, transacao_id=str(transacao)[:100], payload=request.data)],
+            ignore_conflicts=True,
+        )
+        return response.Response({"recebido": True, "transacao_id": str(transacao)}, status=status.HTTP_202_ACCEPTED)
 
 
 